@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Generates synthetic OBJ/MTL/texture sets for benchmarking. The model is a rippled grid split into
+a number of material groups, each material referencing one of the generated PNG textures.
+
+Usage:
+
+python -m benchmarks.generate <OUT_DIR> [--faces 1000 100000] [--materials 4] [--texture_size 512]
+"""
+import os
+import zlib
+import struct
+import argparse
+from os.path import join, exists
+import numpy as np
+
+
+# The number of faces written at once, bounds the memory used for 10M face models
+DEFAULT_CHUNK_SIZE = 1 << 18
+
+
+def write_png(out_file, size, seed=0):
+    """
+    Writes a size x size RGB PNG with a pattern which depends on the seed, without needing Pillow.
+    """
+    y, x = np.mgrid[0:size, 0:size]
+    pixels = np.empty((size, size, 3), dtype=np.uint8)
+    pixels[:, :, 0] = (x * 255 // max(size - 1, 1) + seed * 40) % 256
+    pixels[:, :, 1] = (y * 255 // max(size - 1, 1) + seed * 90) % 256
+    pixels[:, :, 2] = np.where(((x // 32) + (y // 32)) % 2 == 0, 220, 40)
+
+    # Each row starts with the filter type, 0 is no filter
+    raw = np.concatenate((np.zeros((size, 1), dtype=np.uint8), pixels.reshape(size, -1)), axis=1).tobytes()
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    with open(out_file, 'wb') as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">2I5B", size, size, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 6)))
+        f.write(chunk(b"IEND", b""))
+
+    return out_file
+
+
+def grid_size(faces):
+    # A grid of columns x rows quads has two triangles per quad
+    quads = max(1, -(-faces // 2))
+    columns = max(1, int(np.ceil(np.sqrt(quads))))
+    rows = max(1, -(-quads // columns))
+    return columns, rows
+
+
+def generate_obj(out_file, faces, materials=1, mtl_name=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Writes a rippled grid with exactly the number of triangles given, split into equal material groups.
+
+    Args:
+    - out_file          : the OBJ file to write
+    - faces             : the number of triangles
+    - materials         : the number of usemtl groups
+    - mtl_name          : the MTL file referenced with mtllib
+    - chunk_size        : the number of vertices/faces formatted at once
+    """
+    columns, rows = grid_size(faces)
+    with open(out_file, 'w') as f:
+        f.write(f"# Synthetic benchmark model, {faces} faces, {materials} materials\n")
+        if mtl_name is not None:
+            f.write(f"mtllib {mtl_name}\n")
+
+        # Vertices, texture coordinates and normals share the same indices
+        vertex_count = (columns + 1) * (rows + 1)
+        for start in range(0, vertex_count, chunk_size):
+            index = np.arange(start, min(start + chunk_size, vertex_count))
+            u = (index % (columns + 1)) / columns
+            v = (index // (columns + 1)) / rows
+            height = 0.05 * np.sin(u * 12.0) * np.cos(v * 12.0)
+            positions = np.stack((u * 100 - 50, v * 100 - 50, height * 100), axis=1)
+            dx = 0.6 * np.cos(u * 12.0) * np.cos(v * 12.0)
+            dy = -0.6 * np.sin(u * 12.0) * np.sin(v * 12.0)
+            normals = np.stack((-dx, -dy, np.ones_like(dx)), axis=1)
+            normals /= np.linalg.norm(normals, axis=1)[:, None]
+
+            f.write(("v %.5f %.5f %.5f\n" * len(index)) % tuple(positions.ravel()))
+            f.write(("vt %.5f %.5f\n" * len(index)) % tuple(np.stack((u, v), axis=1).ravel()))
+            f.write(("vn %.4f %.4f %.4f\n" * len(index)) % tuple(normals.ravel()))
+
+        # Two triangles per quad, the material changes every faces / materials triangles
+        per_material = -(-faces // materials)
+        for start in range(0, faces, chunk_size):
+            triangle = np.arange(start, min(start + chunk_size, faces))
+            quad = triangle // 2
+            corner = quad % columns + (quad // columns) * (columns + 1) + 1
+            second = (triangle % 2).astype(bool)
+            a = corner
+            b = np.where(second, corner + columns + 2, corner + 1)
+            c = np.where(second, corner + columns + 1, corner + columns + 2)
+            corners = np.repeat(np.stack((a, b, c), axis=1), 3, axis=1)
+
+            # Split the chunk where a new material starts
+            splits = sorted(set([0] + list(np.flatnonzero(triangle % per_material == 0))))
+            for i, end in zip(splits, splits[1:] + [len(triangle)]):
+                if triangle[i] % per_material == 0:
+                    f.write(f"usemtl material_{triangle[i] // per_material}\n")
+                f.write(("f %d/%d/%d %d/%d/%d %d/%d/%d\n" * (end - i)) % tuple(corners[i:end].ravel()))
+
+    return out_file
+
+
+def generate_mtl(out_file, materials, texture_names):
+    """
+    Writes a MTL file where material i uses texture i modulo the number of textures.
+    """
+    with open(out_file, 'w') as f:
+        for i in range(materials):
+            f.write(f"newmtl material_{i}\n")
+            f.write("Ka 1.000 1.000 1.000\nKd 0.800 0.800 0.800\nKs 0.200 0.200 0.200\nNs 20\nd 1.0\n")
+            if texture_names:
+                f.write(f"map_Kd {texture_names[i % len(texture_names)]}\n")
+            f.write("\n")
+
+    return out_file
+
+
+def generate_model(out_dir, faces, materials=1, texture_size=512, textures=None):
+    """
+    Generates (or reuses) the OBJ, MTL and textures of a model in out_dir and returns their paths.
+
+    Args:
+    - out_dir           : the directory to write the model to
+    - faces             : the number of triangles
+    - materials         : the number of materials
+    - texture_size      : the width and height of the textures, 0 for none
+    - textures          : the number of textures, defaults to one per material
+    """
+    if not exists(out_dir):
+        os.makedirs(out_dir)
+
+    textures = materials if textures is None else textures
+    textures = textures if texture_size > 0 else 0
+    stem = f"model_{faces}_{materials}_{textures}_{texture_size}"
+    texture_names = [f"{stem}_texture_{i}.png" for i in range(textures)]
+    model = {"obj_file": join(out_dir, stem + ".obj"),
+             "mtl_file": join(out_dir, stem + ".mtl"),
+             "texture_files": [join(out_dir, name) for name in texture_names]}
+
+    # Generated models are kept between runs as the large ones take a while to write
+    for i, texture_file in enumerate(model["texture_files"]):
+        if not exists(texture_file):
+            write_png(texture_file, texture_size, seed=i)
+    if not exists(model["mtl_file"]):
+        generate_mtl(model["mtl_file"], materials, texture_names)
+    if not exists(model["obj_file"]):
+        temp_file = model["obj_file"] + ".tmp"
+        generate_obj(temp_file, faces, materials, stem + ".mtl")
+        os.replace(temp_file, model["obj_file"])
+
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="OBJ-to-HTML-Generate", description="Generates synthetic OBJ/MTL/texture sets for benchmarking.")
+    parser.add_argument('out_dir', type=str,
+                        help='The directory to write the models to.')
+    parser.add_argument('--faces', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                        help='The number of triangles of each model.')
+    parser.add_argument('--materials', type=int, default=4,
+                        help='The number of materials of each model.')
+    parser.add_argument('--textures', type=int, default=None,
+                        help='The number of textures, defaults to one per material.')
+    parser.add_argument('--texture_size', type=int, default=512,
+                        help='The width and height of the textures, 0 for no textures.')
+    args = parser.parse_args()
+
+    for faces in args.faces:
+        model = generate_model(args.out_dir, faces, args.materials, args.texture_size, args.textures)
+        print(f"{model['obj_file']}  {os.path.getsize(model['obj_file']) / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
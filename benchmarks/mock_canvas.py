@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+A local stand-in for the Canvas file upload API. It follows the same three steps as Canvas:
+
+1. POST /api/v1/users/self/files/ (or /api/v1/courses/<n>/files/) returns an upload_url and upload_params
+2. POST <upload_url> with the multipart file returns the url of the file and a location to confirm
+3. POST <location> confirms the upload
+
+Every request is delayed by the latency and uploads are read no faster than the bandwidth, so upload
+performance can be measured without a Canvas instance. The prefix to pass to file_to_link is server.url.
+
+Usage:
+
+python -m benchmarks.mock_canvas [--port 8000] [--latency 0.05] [--bandwidth 10000000]
+"""
+import re
+import json
+import time
+import itertools
+import threading
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockCanvasHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        return
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        # Read the body no faster than the bandwidth allows
+        length = int(self.headers.get("Content-Length", 0))
+        bandwidth = self.server.bandwidth
+        block_size = 1 << 16
+        start = time.perf_counter()
+        received = 0
+        while received < length:
+            received += len(self.rfile.read(min(block_size, length - received)))
+            if bandwidth:
+                ahead = received / bandwidth - (time.perf_counter() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+        return received
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        path = self.path.split("?")[0]
+        received = self._read_body()
+        self.server.record(path, received)
+
+        # Step 1: Canvas returns where to upload the file to
+        if re.fullmatch(r"/api/v1/(users/self|courses/\d+)/files/", path):
+            file_id = self.server.next_id()
+            self._send_json(200, {"upload_url": f"{self.server.url}/upload/{file_id}",
+                                  "upload_params": {"key": str(file_id)}})
+
+        # Step 2: The file itself
+        elif re.fullmatch(r"/upload/\d+", path):
+            file_id = path.rsplit("/", 1)[1]
+            self._send_json(201, {"id": int(file_id),
+                                  "url": f"{self.server.url}/files/{file_id}/download",
+                                  "location": f"{self.server.url}/api/v1/files/{file_id}/create_success"})
+
+        # Step 3: Confirming the upload
+        elif re.fullmatch(r"/api/v1/files/\d+/create_success", path):
+            self._send_json(200, {"id": int(path.split("/")[4])})
+
+        else:
+            self._send_json(404, {"errors": [{"message": "Not found"}]})
+
+    def do_HEAD(self):
+        # Used to validate cached links
+        time.sleep(self.server.latency)
+        self.server.record(self.path, 0)
+        self.send_response(200 if self.path.startswith("/files/") else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class MockCanvasServer(ThreadingHTTPServer):
+    """
+    Serves the mock Canvas API on localhost in a background thread.
+
+    Args:
+    - latency           : the seconds each request is delayed by
+    - bandwidth         : the bytes per second uploads are read at, None for unlimited
+    - port              : the port to listen on, 0 for any free port
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, bandwidth=None, port=0):
+        super().__init__(("127.0.0.1", port), MockCanvasHandler)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_received = 0
+        self.thread = None
+
+    def next_id(self):
+        with self.lock:
+            return next(self.ids)
+
+    def record(self, path, received):
+        with self.lock:
+            self.requests += 1
+            self.bytes_received += received
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes_received = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="Mock-Canvas", description="Serves a local stand-in for the Canvas file upload API.")
+    parser.add_argument('--port', type=int, default=8000,
+                        help='The port to listen on.')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='The seconds each request is delayed by.')
+    parser.add_argument('--bandwidth', type=float, default=None,
+                        help='The bytes per second uploads are read at, unlimited by default.')
+    args = parser.parse_args()
+
+    server = MockCanvasServer(args.latency, args.bandwidth, args.port)
+    print(f"Mock Canvas listening on {server.url}, use --prefix {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
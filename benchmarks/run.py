@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Benchmarks obj_to_html on synthetic models, timing each of its stages from its trace spans, with the
+Canvas uploads sent to a local mock server. Every case runs in a fresh process so the peak RSS is that of the case alone.
+Results are written as JSON and can be compared against an earlier run to catch regressions.
+
+Usage:
+
+python -m benchmarks.run [--faces 1000 10000 100000 1000000 10000000] [--formats obj glb bin chunks] [--latency 0.02] [--bandwidth BYTES_PER_SECOND] [--output results.json] [--baseline baseline.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from os.path import join, exists, getsize, splitext, basename
+import numpy as np
+from benchmarks.generate import generate_model
+from benchmarks.mock_canvas import MockCanvasServer
+from obj2html.parser.obj_parser import obj_to_html
+from obj2html.utils.cli_utils import add_conversion_arguments, validate_conversion_args
+from obj2html.utils.trace_utils import enable_tracing, disable_tracing
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Metrics where a larger value in a new run is a regression
+REGRESSION_METRICS = ("total_seconds", "peak_rss_mb", "output_bytes")
+
+# The spans of obj_to_html reported as stages, in the order they run
+STAGES = ("template_load", "optimize_textures", "inspect", "build_bvh", "convert_geometry", "convert_chunks", "hash_names",
+          "write_runtime", "upload", "inline_geometry", "build_context", "render", "write")
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+
+def case_args(model, output_format, settings, server_url, out_file):
+    """
+    Returns the obj_to_html arguments of one case, parsed like the command line would.
+    """
+    obj_file = model["obj_file"]
+    argv = [obj_file, out_file, splitext(basename(obj_file))[0], "-f", output_format,
+            "--template_file", settings["template_file"], "--min_camera", "2", "--max_camera", "1000", "-z", "250"]
+    if exists(model["mtl_file"]):
+        argv += ["-m", model["mtl_file"]]
+    if settings["quantize"] and output_format in ("bin", "chunks"):
+        argv += ["--quantize"]
+
+    # Upload everything to the mock Canvas server, without the cache so every file is sent
+    if server_url is not None:
+        argv += ["--auto_convert", "--access_token", "benchmark", "--directory", "benchmark", "-p", server_url,
+                 "--upload_workers", str(settings["upload_workers"]), "--no_cache"]
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('obj_file')
+    parser.add_argument('output')
+    parser.add_argument('title')
+    add_conversion_arguments(parser)
+    args = parser.parse_args(argv)
+    validate_conversion_args(parser, args)
+    return args
+
+
+def run_case(model, output_format, settings, server_url, out_dir):
+    """
+    Runs obj_to_html for one model and output format, returning the time of each of its stages and
+    the bytes of every file the page loads.
+    """
+    stem = splitext(basename(model["obj_file"]))[0]
+    case_dir = join(out_dir, f"{stem}_{output_format}")
+    shutil.rmtree(case_dir, ignore_errors=True)
+    os.makedirs(case_dir)
+    args = case_args(model, output_format, settings, server_url, join(case_dir, f"{stem}.html"))
+
+    tracer = enable_tracing()
+    try:
+        obj_to_html(args)
+    finally:
+        disable_tracing()
+
+    # The stages are the spans of obj_to_html, the total is the call itself
+    totals = tracer.summary()
+    stages = {name: totals[name][1] for name in STAGES if name in totals}
+
+    # The page loads the files written next to it and, unless they were converted, the OBJ, MTL and textures
+    loaded = [join(root, name) for root, _, names in os.walk(case_dir) for name in names]
+    if output_format == "obj":
+        loaded.append(model["obj_file"])
+    if output_format != "glb" and exists(model["mtl_file"]):
+        loaded += [model["mtl_file"]] + model["texture_files"]
+
+    return {"stages": stages,
+            "total_seconds": totals["obj_to_html"][1],
+            "peak_rss_mb": peak_rss_mb(),
+            "output_bytes": sum(getsize(f) for f in loaded)}
+
+
+def run_isolated(model, output_format, settings, server_url, out_dir):
+    # A fresh process per case so the peak RSS is not carried over from the previous case
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(run_case, model, output_format, settings, server_url, out_dir).result()
+
+
+def run_benchmarks(args):
+    """
+    Runs every model size and format, returning the results document.
+    """
+    data_dir = join(args.work_dir, "models")
+    out_dir = join(args.work_dir, "output")
+    if not exists(out_dir):
+        os.makedirs(out_dir)
+
+    settings = {"template_file": args.template_file,
+                "upload_workers": args.upload_workers,
+                "quantize": (16, 8, 12) if args.quantize else None}
+    server = None if args.no_upload else MockCanvasServer(args.latency, args.bandwidth).start()
+
+    results = []
+    try:
+        for faces in args.faces:
+            start = time.perf_counter()
+            model = generate_model(data_dir, faces, args.materials, args.texture_size, args.textures)
+            print(f"Generated {faces} faces in {time.perf_counter() - start:.3f}s")
+            input_bytes = sum(getsize(f) for f in [model["obj_file"], model["mtl_file"]] + model["texture_files"])
+
+            for output_format in args.formats:
+                runs = []
+                for _ in range(args.repeat):
+                    if server is not None:
+                        server.reset_stats()
+                    run = run_isolated(model, output_format, settings, server.url if server else None, out_dir)
+                    if server is not None:
+                        run["requests"] = server.requests
+                        run["uploaded_bytes"] = server.bytes_received
+                    runs.append(run)
+
+                # The fastest run of each stage is kept, it is the least affected by noise
+                stages = {name: min(run["stages"][name] for run in runs) for name in runs[0]["stages"]}
+                total_seconds = min(run["total_seconds"] for run in runs)
+                result = {"faces": faces,
+                          "materials": args.materials,
+                          "format": output_format,
+                          "stages": stages,
+                          "total_seconds": total_seconds,
+                          "faces_per_second": faces / max(total_seconds, 1e-9),
+                          "input_bytes": input_bytes,
+                          "output_bytes": runs[0]["output_bytes"],
+                          "peak_rss_mb": max(run["peak_rss_mb"] or 0 for run in runs) or None}
+                if server is not None:
+                    result["requests"] = runs[0]["requests"]
+                    result["uploaded_bytes"] = runs[0]["uploaded_bytes"]
+                    result["upload_mb_per_second"] = runs[0]["uploaded_bytes"] / 1e6 / max(stages["upload"], 1e-9)
+                results.append(result)
+                print_result(result)
+    finally:
+        if server is not None:
+            server.stop()
+
+    return {"environment": {"python": platform.python_version(),
+                            "platform": platform.platform(),
+                            "numpy": np.__version__,
+                            "cpus": os.cpu_count(),
+                            "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "settings": {"latency": args.latency,
+                         "bandwidth": args.bandwidth,
+                         "upload_workers": args.upload_workers,
+                         "texture_size": args.texture_size,
+                         "quantize": args.quantize,
+                         "repeat": args.repeat},
+            "results": results}
+
+
+def print_result(result):
+    stages = "  ".join(f"{name} {seconds:.3f}s" for name, seconds in result["stages"].items())
+    rss = f"{result['peak_rss_mb']:.1f} MB" if result["peak_rss_mb"] is not None else "n/a"
+    print(f"{result['faces']:>10} faces  {result['format']:<6}  total {result['total_seconds']:.3f}s  {stages}  "
+          f"peak RSS {rss}  output {result['output_bytes'] / 1e6:.2f} MB")
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a message for each metric which is worse than the baseline by more than the tolerance.
+    """
+    previous = {(r["faces"], r["materials"], r["format"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        old = previous.get((result["faces"], result["materials"], result["format"]))
+        if old is None:
+            continue
+        for metric in REGRESSION_METRICS:
+            if old.get(metric) and result.get(metric) and result[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{result['faces']} faces {result['format']}: {metric} {old[metric]:.4g} -> {result[metric]:.4g} "
+                                   f"(+{100 * (result[metric] / old[metric] - 1):.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="OBJ-to-HTML-Benchmark", description="Benchmarks obj_to_html on synthetic models against a mock Canvas server.")
+
+    # Model Settings
+    model_group = parser.add_argument_group("Models", "The synthetic models to benchmark.")
+    model_group.add_argument('--faces', type=int, nargs='+', default=[1000, 10000, 100000, 1000000, 10000000],
+                        help='The number of triangles of each model, from 1K to 10M by default.')
+    model_group.add_argument('--materials', type=int, default=4,
+                        help='The number of materials of each model.')
+    model_group.add_argument('--textures', type=int, default=None,
+                        help='The number of textures, defaults to one per material.')
+    model_group.add_argument('--texture_size', type=int, default=512,
+                        help='The width and height of the textures, 0 for no textures.')
+    model_group.add_argument('-f', '--formats', type=str, nargs='+', default=["obj", "glb", "bin"], choices=["obj", "glb", "bin", "chunks"],
+                        help='The output formats to benchmark.')
+    model_group.add_argument('--quantize', action='store_true',
+                        help='Quantize the bin and chunks geometry.')
+    model_group.add_argument('--template_file', type=str, default="./templates/default.html",
+                        help='The template file for the HTML.')
+
+    # Upload Settings
+    upload_group = parser.add_argument_group("Mock Canvas", "The local server the uploads are sent to.")
+    upload_group.add_argument('--no_upload', action='store_true',
+                        help='Skip the upload stage.')
+    upload_group.add_argument('--latency', type=float, default=0.02,
+                        help='The seconds each request to the mock server is delayed by.')
+    upload_group.add_argument('--bandwidth', type=float, default=None,
+                        help='The bytes per second the mock server reads uploads at, unlimited by default.')
+    upload_group.add_argument('--upload_workers', type=int, default=8,
+                        help='The number of files uploaded at once.')
+
+    # Output Settings
+    output_group = parser.add_argument_group("Results", "Where results are written and compared.")
+    output_group.add_argument('--work_dir', type=str, default=join(tempfile.gettempdir(), "obj2html_benchmarks"),
+                        help='Where the generated models and outputs are kept between runs.')
+    output_group.add_argument('--repeat', type=int, default=1,
+                        help='The number of times each case is run, the fastest time of each stage is kept.')
+    output_group.add_argument('-o', '--output', type=str, default="benchmark_results.json",
+                        help='The JSON file to write the results to.')
+    output_group.add_argument('--baseline', type=str, default=None,
+                        help='A previous results file, the run fails if a case is slower, larger or uses more memory.')
+    output_group.add_argument('--tolerance', type=float, default=0.1,
+                        help='The fraction a metric may grow by before it counts as a regression.')
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+
+    results = run_benchmarks(args)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+OBJ To HTML Batch Converter:
+----------------------------
+Converts a whole directory (or glob) of OBJ files, or every row of a CSV/JSON manifest, to HTML in one run.
+The template is only read once and the conversions are spread over a process pool sized to the number of cores.
+
+Usage:
+
+python -m obj2html.obj2html_batch <DIRECTORY|GLOB|MANIFEST> [--output_dir OUTPUT_DIR] [--workers WORKERS] [--z_pos Z_POS] [--min_camera MIN_CAMERA] [--max_camera MAX_CAMERA]
+
+Example:
+                  python -m obj2html.obj2html_batch "models/**/*.obj" --output_dir out/
+                  python -m obj2html.obj2html_batch models.csv --output_dir out/
+
+The manifest columns are: obj_file (or obj), mtl_file (or mtl), texture, title, output, min_camera, max_camera and z_pos.
+Any column left empty falls back to the command line setting.
+"""
+import sys
+import time
+import argparse
+from obj2html.utils.cli_utils import add_conversion_arguments, validate_conversion_args
+from obj2html.utils.batch_utils import collect_jobs, run_batch, print_summary
+
+
+def main():
+    parser = argparse.ArgumentParser(prog = "OBJ-to-HTML-Batch", description="Converts a directory, glob or manifest of OBJ files to HTML files in parallel.")
+
+    # Required Arguments
+    parser.add_argument('source', metavar="source", type=str,
+                        help='A directory, a glob of OBJ files or a CSV/JSON manifest.')
+
+    # Batch Settings
+    batch_group = parser.add_argument_group(
+        "Batch Options [OPTIONAL]",
+        "Settings for how the batch is run.")
+    batch_group.add_argument('-o', '--output_dir', type=str, default="out/",
+                        help='The directory for HTML files of jobs without an output set.')
+    batch_group.add_argument('-w', '--workers', type=int, default=None,
+                        help='The number of processes to use, defaults to the number of cores.')
+
+    add_conversion_arguments(parser, batch=True)
+
+    args = parser.parse_args()
+    validate_conversion_args(parser, args)
+
+    jobs = collect_jobs(args.source)
+    if len(jobs) == 0:
+        parser.error(f'No OBJ files found for {args.source}')
+
+    # The remaining arguments are the defaults for every job
+    output_dir = args.output_dir
+    workers = args.workers
+    del args.source, args.output_dir, args.workers
+
+    start = time.perf_counter()
+    try:
+        results = run_batch(jobs, args, output_dir, workers)
+    except ValueError as e:
+        parser.error(str(e))
+    print_summary(results, time.perf_counter() - start)
+
+    if not all(r["ok"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
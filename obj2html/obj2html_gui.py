@@ -15,7 +15,6 @@ Example:
 """
 import argparse
 from gooey import Gooey, GooeyParser
-import jinja2
 
 import os
 import sys
@@ -23,6 +22,9 @@ project_dir = os.path.dirname(os.path.realpath("__file__"))
 sys.path.insert(0, project_dir)
 
 from obj2html.parser.obj_parser import obj_to_html
+from obj2html.utils.canvas_utils import load_token, save_token
+from obj2html.utils.cli_utils import add_conversion_arguments, validate_conversion_args
+from obj2html.utils.trace_utils import enable_tracing, write_trace, run_profiled
 
 @Gooey(menu=[{'name': 'Help', 'items': [{
     'type': 'AboutDialog',
@@ -60,44 +62,7 @@ def main():
     parser.add_argument('title', type=str,
                         help='The title for the HTML file.')
 
-    # Optional View Settings
-    view_options_group = parser.add_argument_group(
-        "View Options [OPTIONAL]",
-        "Optional view settings which should be configured to correctly display the OBJ file.")
-    view_options_group.add_argument('--min_camera', type=float, default=2, widget="DecimalField", gooey_options={'min': 0, 'max': 10000},
-                        help='The minimum distance for camera view.')
-    view_options_group.add_argument('--max_camera', type=float, default=1000, widget="DecimalField", gooey_options={'min': 0, 'max': 100000},
-                        help='The maximum distance for camera view.')
-    view_options_group.add_argument('-z', '--z_pos', type=float, default=250, widget="DecimalField", gooey_options={'min': 0, 'max': 100000},
-                        help='The Z coordinate to display the camera.')
-    view_options_group.add_argument('--template_file', type=str, default="./templates/default.html", widget="FileChooser",
-                        help='The template file for the HTML.')
-
-    # Texture, Material and Other 3D Settings
-    three_dim_settings_group = parser.add_argument_group(
-        "3D Options [OPTIONAL]",
-        "3D Settings and parameters including whether to use texture or material files.")
-    three_dim_settings_group.add_argument('-T', '--texture', type=str, default=None, widget="FileChooser",
-                        help='The texture file for the object.')
-    three_dim_settings_group.add_argument('-m', '--mtl_file', type=str, default=None, widget="FileChooser",
-                                          help='The texture file for the object. NOTE: You must provide the relative (to the file)/absolute paths of the texture files within the mtl file.')
-
-    # Auto Conversion Settings
-    auto_convert_group = parser.add_argument_group(
-        "Canvas auto-convert [OPTIONAL]",
-        "Provide the ability to auto-convert and upload links to Canvas for use in pages.")
-    auto_convert_group.add_argument('--auto_convert', action='store_true',
-                        help='Whether to auto convert the links to Canvas files.')
-    auto_convert_group.add_argument('--save_token', action='store_true',
-                        help='Whether to save the token for later use.')
-    auto_convert_group.add_argument('--access_token', metavar="access_token", widget="PasswordField",
-                        type=str, default=None, help='The access token generated in canvas settings. LEAVE EMPTY TO LOAD TOKEN FROM SAVED DIRECTORY.')
-    auto_convert_group.add_argument('--directory', metavar="directory",
-                        type=str, default="", help='The directory to upload to on Canvas.')
-    auto_convert_group.add_argument('--course_number', metavar="c", type=int,
-                                    help='OPTIONAL: The course number of the canvas link.', default=None)
-    auto_convert_group.add_argument('-p', '--prefix', type=str,
-                        help='The canvas infrastructure to use e.g. canvas.sydney.edu.au', default="canvas.sydney.edu.au")
+    add_conversion_arguments(parser, gui=True)
 
     args = parser.parse_args()
 
@@ -109,10 +74,21 @@ def main():
     if args.auto_convert and args.access_token is not None and args.save_token:
         save_token(args.access_token, args.prefix)
 
+    validate_conversion_args(parser, args)
 
-    # Render Jinja2 environment
-    environment = jinja2.Environment()
-    obj_to_html(args, environment)
+    # Record the spans of each stage if a trace was requested
+    tracer = enable_tracing() if args.trace is not None else None
+
+    # Render with the shared engine, compiled templates are cached on disk
+    if args.profile:
+        reports = run_profiled(obj_to_html, args)
+    else:
+        reports = obj_to_html(args)
+    for report in reports:
+        print(report)
+
+    if tracer is not None:
+        write_trace(tracer, args.trace)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,41 @@
+"""
+OBJ To HTML Inspect:
+--------------------
+Prints the counts, bounding box, centroid, materials and estimated GPU memory of OBJ files, and the
+camera settings the converter frames them with. The file is scanned a range at a time so this is
+quick and uses little memory even for very large models.
+
+Usage:
+
+python -m obj2html.obj2html_inspect <OBJECT_FILE> [<OBJECT_FILE> ...] [--json] [--no_cache]
+"""
+import json
+import argparse
+from obj2html.parser.obj_inspect import cached_inspect, camera_framing, format_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(prog = "OBJ-to-HTML-Inspect", description="Prints the statistics of OBJ files and the camera settings which frame them.")
+    parser.add_argument('obj_files', metavar="obj_file", type=str, nargs='+',
+                        help='The OBJ files to inspect.')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the statistics and camera settings as JSON.')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='Scan the files even if the same contents were inspected before.')
+    args = parser.parse_args()
+
+    results = {}
+    for obj_file in args.obj_files:
+        stats = cached_inspect(obj_file, use_cache=not args.no_cache)
+        framing = camera_framing(stats)
+        if args.json:
+            results[obj_file] = {"stats": stats._asdict(), "camera": framing._asdict()}
+        else:
+            print(format_stats(obj_file, stats, framing))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
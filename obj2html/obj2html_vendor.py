@@ -0,0 +1,27 @@
+"""
+OBJ To HTML Vendor:
+-------------------
+Maintainer script which refreshes the pinned three.js modules (and their license) vendored into the
+package in obj2html/vendor/three. The vendored files are committed and shipped with the package, so pages
+made with --bundle inline them without any network access. Run it when THREE_VERSION changes and commit
+the result.
+
+Usage:
+
+python -m obj2html.obj2html_vendor [--vendor_dir VENDOR_DIR]
+"""
+import argparse
+from obj2html.utils.bundle_utils import fetch_vendor, get_vendor_dir, THREE_VERSION
+
+
+def main():
+    parser = argparse.ArgumentParser(prog = "OBJ-to-HTML-Vendor", description=f"Refreshes the vendored three.js {THREE_VERSION} modules used by the viewer for offline bundles.")
+    parser.add_argument('--vendor_dir', type=str, default=get_vendor_dir(),
+                        help='The directory to download the modules to.')
+    args = parser.parse_args()
+
+    fetch_vendor(args.vendor_dir)
+
+
+if __name__ == "__main__":
+    main()
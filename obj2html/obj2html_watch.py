@@ -0,0 +1,68 @@
+"""
+OBJ To HTML Watch Mode:
+-----------------------
+Converts a directory (or glob) of OBJ files, or every row of a CSV/JSON manifest, and then keeps watching their inputs.
+Each output HTML records its OBJ, MTL, the textures referenced in the MTL and the template, and is only rebuilt
+(and only its changed files re-uploaded) when the contents of one of those inputs change.
+
+Usage:
+
+python -m obj2html.obj2html_watch <DIRECTORY|GLOB|MANIFEST> [--output_dir OUTPUT_DIR] [--interval INTERVAL] [--debounce DEBOUNCE] [--z_pos Z_POS] [--min_camera MIN_CAMERA] [--max_camera MAX_CAMERA]
+
+Example:
+                  python -m obj2html.obj2html_watch models/ --output_dir out/
+                  python -m obj2html.obj2html_watch models/tree.obj --output_dir out/ --auto_convert --access_token TOKEN
+"""
+import argparse
+from obj2html.utils.cli_utils import add_conversion_arguments, validate_conversion_args
+from obj2html.utils.batch_utils import collect_jobs, job_to_args, check_outputs
+from obj2html.utils.watch_utils import watch, DEFAULT_INTERVAL, DEFAULT_DEBOUNCE
+
+
+def main():
+    parser = argparse.ArgumentParser(prog = "OBJ-to-HTML-Watch", description="Converts a directory, glob or manifest of OBJ files to HTML files and rebuilds them when their inputs change.")
+
+    # Required Arguments
+    parser.add_argument('source', metavar="source", type=str,
+                        help='A directory, a glob of OBJ files or a CSV/JSON manifest.')
+
+    # Watch Settings
+    watch_group = parser.add_argument_group(
+        "Watch Options [OPTIONAL]",
+        "Settings for how the inputs are watched.")
+    watch_group.add_argument('-o', '--output_dir', type=str, default="out/",
+                        help='The directory for HTML files of jobs without an output set.')
+    watch_group.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help='The seconds between checking the inputs for changes.')
+    watch_group.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE,
+                        help='The seconds without further changes before a burst of saves is rebuilt.')
+
+    add_conversion_arguments(parser, batch=True)
+
+    args = parser.parse_args()
+    validate_conversion_args(parser, args)
+
+    jobs = collect_jobs(args.source)
+    if len(jobs) == 0:
+        parser.error(f'No OBJ files found for {args.source}')
+
+    # The remaining arguments are the defaults for every job
+    output_dir = args.output_dir
+    interval = args.interval
+    debounce = args.debounce
+    del args.source, args.output_dir, args.interval, args.debounce
+
+    all_args = [job_to_args(job, args, output_dir) for job in jobs]
+    try:
+        check_outputs(all_args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        watch(all_args, interval, debounce)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+
+
+if __name__ == "__main__":
+    main()
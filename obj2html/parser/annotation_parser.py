@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Reads the annotations shown over the model: labelled points with a description and optionally
+where the camera moves to when the annotation is selected.
+
+JSON files hold a list (or {"annotations": [...]}) of objects:
+
+    {"title": "Handle", "description": "...", "position": [x, y, z], "camPos": [x, y, z], "lookAt": [x, y, z]}
+
+CSV files have a header row with the columns title, description, x, y, z and optionally
+cam_x, cam_y, cam_z, look_x, look_y and look_z.
+"""
+import csv
+import json
+from collections import namedtuple
+import numpy as np
+from obj2html.parser.geometry_bvh import closest_point
+
+
+# A labelled point, the camera position and target are None when not given
+Annotation = namedtuple("Annotation", ["title", "description", "position", "camera", "look_at"])
+
+# Alternative names accepted for the JSON keys
+JSON_ALIASES = {"label": "title", "text": "description", "camera": "camPos", "cam_pos": "camPos", "look_at": "lookAt"}
+
+# How far from the surface the camera is placed when it is not given, as a fraction of the model size
+CAMERA_DISTANCE = 0.5
+
+
+def _vector(value, name, number):
+    try:
+        vector = [float(v) for v in value]
+    except (TypeError, ValueError):
+        raise ValueError(f"Annotation {number} has an invalid {name}: {value}")
+    if len(vector) != 3:
+        raise ValueError(f"Annotation {number} needs 3 coordinates for its {name}: {value}")
+    return vector
+
+
+def _optional_vector(row, columns, name, number):
+    values = [row.get(column) for column in columns]
+    if all(value is None or value == "" for value in values):
+        return None
+    return _vector(values, name, number)
+
+
+def load_annotations(annotations_file):
+    """
+    Reads the annotations from a JSON or CSV file.
+
+    Args:
+    - annotations_file  : path to the .json or .csv file
+    """
+    annotations = []
+    if annotations_file.lower().endswith(".json"):
+        with open(annotations_file, 'r', encoding='utf-8') as f:
+            rows = json.load(f)
+        if isinstance(rows, dict):
+            rows = rows.get("annotations", [])
+        for number, row in enumerate(rows, 1):
+            row = {JSON_ALIASES.get(key, key): value for key, value in row.items()}
+            position = row.get("position", [row.get("x"), row.get("y"), row.get("z")])
+            annotations.append(Annotation(str(row.get("title", number)),
+                                          str(row.get("description", "")),
+                                          _vector(position, "position", number),
+                                          _vector(row["camPos"], "camPos", number) if row.get("camPos") is not None else None,
+                                          _vector(row["lookAt"], "lookAt", number) if row.get("lookAt") is not None else None))
+    else:
+        with open(annotations_file, 'r', newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        for number, row in enumerate(rows, 1):
+            row = {key.strip().lower(): value for key, value in row.items() if key is not None}
+            annotations.append(Annotation(row.get("title") or str(number),
+                                          row.get("description") or "",
+                                          _vector([row.get("x"), row.get("y"), row.get("z")], "position", number),
+                                          _optional_vector(row, ("cam_x", "cam_y", "cam_z"), "camera", number),
+                                          _optional_vector(row, ("look_x", "look_y", "look_z"), "look at", number)))
+
+    return annotations
+
+
+def snap_annotations(annotations, bvh):
+    """
+    Moves each annotation onto the nearest point of the surface. Annotations without a camera
+    are looked at from along the normal of the surface.
+
+    Args:
+    - annotations       : the list of Annotation
+    - bvh               : the BVH of the model
+    """
+    # The diagonal of the root box, a flat axis has a scale of 1 but no extent
+    extent = (bvh.bounds[0, 3:].astype(np.float64) - bvh.bounds[0, :3]) * np.asarray(bvh.scale)
+    size = float(np.linalg.norm(extent)) or 1.0
+    snapped = []
+    for annotation in annotations:
+        surface = closest_point(bvh, annotation.position)
+        position = [round(float(v), 6) for v in surface.point]
+        camera = annotation.camera
+        if camera is None:
+            camera = [round(float(v), 6) for v in surface.point + surface.normal * size * CAMERA_DISTANCE]
+        if surface.distance > 0.01 * size:
+            print(f"WARNING: Annotation '{annotation.title}' is {surface.distance:.4g} from the surface, it was moved onto it.")
+        snapped.append(annotation._replace(position=position, camera=camera, look_at=annotation.look_at or position))
+    return snapped
+
+
+def annotation_entries(annotations):
+    """
+    Returns the annotations as the list of objects the page reads.
+    """
+    return [{"title": a.title,
+             "description": a.description,
+             "position": a.position,
+             "camPos": a.camera,
+             "lookAt": a.look_at if a.look_at is not None else a.position} for a in annotations]
+
+
+def annotations_json(annotations):
+    """
+    Returns the annotations as the JSON the page reads, a </script> in the text cannot end the script.
+    """
+    return json.dumps(annotation_entries(annotations)).replace("</", "<\\/")
+
+
+# Shows the annotations and picks the model with the BVH, included in the page only when they are used
+ANNOTATIONS_JS = """
+      // showing the annotations given with --annotations, each has a numbered label at its position,
+      // a description shown once it is selected and a button in the panel which moves the camera to it
+      function setupAnnotations( data, bvhUrl ) {
+          const list = document.createElement( 'ul' );
+          document.getElementById( 'annotationsPanel' ).appendChild( list );
+          data.forEach( function ( entry, i ) {
+              const annotation = {
+                  title: entry.title,
+                  position: new THREE.Vector3().fromArray( entry.position ),
+                  camPos: entry.camPos ? new THREE.Vector3().fromArray( entry.camPos ) : null,
+                  lookAt: new THREE.Vector3().fromArray( entry.lookAt )
+              };
+
+              const label = document.createElement( 'div' );
+              label.className = 'annotationLabel';
+              label.textContent = ( i + 1 ).toString();
+              if ( entry.description ) {
+                  const description = document.createElement( 'div' );
+                  description.className = 'annotationDescription';
+                  description.textContent = entry.description;
+                  label.appendChild( description );
+                  annotation.descriptionDomElement = description;
+              }
+              const marker = new CSS2DObject( label );
+              marker.position.copy( annotation.position );
+              scene.add( marker );
+              annotationMarkers.push( marker );
+
+              const button = document.createElement( 'button' );
+              button.className = 'annotationButton';
+              button.textContent = ( i + 1 ) + ': ' + entry.title;
+              button.addEventListener( 'click', function () {
+                  gotoAnnotation( annotation );
+              } );
+              const item = document.createElement( 'li' );
+              item.appendChild( button );
+              list.appendChild( item );
+              annotations.push( annotation );
+          } );
+
+          frameCallbacks.push( function () {
+              TWEEN.update();
+              labelRenderer.render( scene, camera );
+          } );
+
+          if ( bvhUrl ) loadBVH( bvhUrl, enablePicking );
+      }
+
+      // a click on the model logs the point as an annotation entry to paste into the annotations
+      // file, and labels behind the model are faded, both pick with the BVH
+      function enablePicking( bvh ) {
+          const raycaster = new THREE.Raycaster();
+          const pointer = new THREE.Vector2();
+          let down = null;
+          renderer.domElement.addEventListener( 'pointerdown', function ( event ) {
+              down = [ event.clientX, event.clientY ];
+          } );
+          renderer.domElement.addEventListener( 'pointerup', function ( event ) {
+              // Dragging the orbit controls is not a click
+              if ( down === null || Math.hypot( event.clientX - down[ 0 ], event.clientY - down[ 1 ] ) > 4 ) return;
+              pointer.set( event.clientX / window.innerWidth * 2 - 1, - event.clientY / window.innerHeight * 2 + 1 );
+              raycaster.setFromCamera( pointer, camera );
+              const hit = raycastBVH( bvh, raycaster.ray );
+              if ( hit === null ) return;
+              const round = vector => vector.toArray().map( v => + v.toFixed( 4 ) );
+              const entry = { title: '', description: '', position: round( hit.point ), camPos: round( camera.position ), lookAt: round( hit.point ) };
+              console.log( JSON.stringify( entry ) );
+              document.getElementById( 'completionBar' ).innerHTML = 'Picked ' + entry.position.join( ', ' );
+          } );
+
+          const ray = new THREE.Ray();
+          let lastCheck = 0;
+          frameCallbacks.push( function () {
+              const now = performance.now();
+              if ( now - lastCheck < 200 ) return;
+              lastCheck = now;
+              annotations.forEach( function ( annotation, i ) {
+                  const distance = camera.position.distanceTo( annotation.position );
+                  ray.origin.copy( camera.position );
+                  ray.direction.copy( annotation.position ).sub( camera.position ).normalize();
+                  const hidden = raycastBVH( bvh, ray, distance * 0.999 ) !== null;
+                  annotationMarkers[ i ].element.style.opacity = hidden ? '0.25' : '1';
+              } );
+          } );
+      }
+"""
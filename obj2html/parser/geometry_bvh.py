@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+A bounding volume hierarchy over the triangles of a mesh, built here rather than in the browser
+so the page can pick the surface in O(log n) instead of raycasting every triangle on every click.
+
+The BVH is written in the bin container (see geometry_export) on its own, with the positions
+quantized to 16 bits over the bounding box and the node bounds in the same quantized space. It
+does not depend on the format of the geometry, so it works for obj, glb, bin and chunks alike.
+
+The triangles are sorted along a Morton curve of their centroids, cut into leaves of a few
+triangles and paired into parents level by level, so the whole build is vectorized.
+"""
+import heapq
+from collections import namedtuple
+import numpy as np
+from obj2html.parser.geometry_encoding import quantize_range
+from obj2html.parser.geometry_export import write_sections
+
+
+# The number of triangles in a leaf
+DEFAULT_LEAF_SIZE = 8
+
+# Bits of each centroid coordinate in the Morton code
+_MORTON_BITS = 10
+
+# Nodes are (left, right) for a parent and (first triangle, -count) for a leaf, the root is node 0
+BVH = namedtuple("BVH", ["nodes", "bounds", "positions", "indices", "minimum", "scale"])
+
+# The nearest point on the surface and the normal of its triangle
+SurfacePoint = namedtuple("SurfacePoint", ["point", "normal", "distance"])
+
+
+def _spread_bits(values):
+    # Inserts two zero bits after each of the low 10 bits
+    values = values.astype(np.uint32) & 0x3FF
+    values = (values | (values << 16)) & 0x030000FF
+    values = (values | (values << 8)) & 0x0300F00F
+    values = (values | (values << 4)) & 0x030C30C3
+    values = (values | (values << 2)) & 0x09249249
+    return values
+
+
+def morton_codes(points):
+    """
+    Returns the 30 bit Morton code of each point, points are non-negative integers below 2^17.
+    """
+    cells = points >> (17 - _MORTON_BITS)
+    return (_spread_bits(cells[:, 0]) << 2) | (_spread_bits(cells[:, 1]) << 1) | _spread_bits(cells[:, 2])
+
+
+def build_bvh(mesh, leaf_size=DEFAULT_LEAF_SIZE):
+    """
+    Builds the BVH over the triangles of the mesh.
+
+    Args:
+    - mesh              : the Mesh, only the positions and indices are used
+    - leaf_size         : the number of triangles in each leaf
+    """
+    if mesh.triangle_count == 0:
+        raise ValueError("The mesh has no triangles to build a BVH over")
+    positions, minimum, scale = quantize_range(mesh.positions.astype(np.float64), 16)
+    positions = positions.astype(np.uint16)
+
+    # Sort the triangles along the Morton curve of their centroids
+    corners = positions[mesh.indices].astype(np.uint32)
+    lower, upper = corners.min(axis=1), corners.max(axis=1)
+    order = np.argsort(morton_codes(lower + upper), kind="stable")
+    indices, lower, upper = mesh.indices[order], lower[order], upper[order]
+
+    # Leaves are runs of consecutive triangles
+    triangle_count = len(indices)
+    starts = np.arange(0, triangle_count, leaf_size)
+    counts = np.minimum(leaf_size, triangle_count - starts)
+    links = [np.stack((starts, -counts), axis=1)]
+    level_lower = [np.minimum.reduceat(lower, starts, axis=0)]
+    level_upper = [np.maximum.reduceat(upper, starts, axis=0)]
+
+    # Pair neighbouring nodes into parents until one is left, an odd node out moves up as it is
+    current = np.arange(len(starts))
+    current_lower, current_upper = level_lower[0], level_upper[0]
+    next_id = len(starts)
+    while len(current) > 1:
+        pairs = len(current) // 2
+        parents = np.arange(next_id, next_id + pairs)
+        next_id += pairs
+        links.append(np.stack((current[0:2 * pairs:2], current[1:2 * pairs:2]), axis=1))
+        parent_lower = np.minimum(current_lower[0:2 * pairs:2], current_lower[1:2 * pairs:2])
+        parent_upper = np.maximum(current_upper[0:2 * pairs:2], current_upper[1:2 * pairs:2])
+        level_lower.append(parent_lower)
+        level_upper.append(parent_upper)
+        if len(current) % 2:
+            parents = np.append(parents, current[-1])
+            parent_lower = np.concatenate((parent_lower, current_lower[-1:]))
+            parent_upper = np.concatenate((parent_upper, current_upper[-1:]))
+        current, current_lower, current_upper = parents, parent_lower, parent_upper
+
+    # The root was made last, number the nodes backwards so it is node 0
+    node_count = next_id
+    links = np.concatenate(links)
+    is_parent = np.arange(node_count) >= len(starts)
+    links[is_parent] = node_count - 1 - links[is_parent]
+    nodes = links[::-1].astype(np.int32)
+    bounds = np.concatenate((np.concatenate(level_lower), np.concatenate(level_upper)), axis=1)[::-1].astype(np.uint16)
+
+    return BVH(np.ascontiguousarray(nodes), np.ascontiguousarray(bounds), positions, indices.astype(np.uint32),
+               minimum, scale)
+
+
+def write_bvh(bvh, out_file):
+    """
+    Writes the BVH in the bin container, loaded with loadBVH() in the page.
+    """
+    index_type = np.uint16 if len(bvh.positions) <= 0xFFFF else np.uint32
+    header = {"bvh": 1,
+              "nodeCount": len(bvh.nodes),
+              "vertexCount": len(bvh.positions),
+              "triangleCount": len(bvh.indices),
+              "min": [float(v) for v in bvh.minimum],
+              "scale": [float(v) for v in bvh.scale],
+              "bounds": {},
+              "nodes": {},
+              "position": {},
+              "index": {"type": np.dtype(index_type).name}}
+    return write_sections(out_file, header, [("bounds", bvh.bounds.astype("<u2")),
+                                             ("nodes", bvh.nodes.astype("<i4")),
+                                             ("position", bvh.positions.astype("<u2")),
+                                             ("index", bvh.indices.astype(np.dtype(index_type).newbyteorder("<")))])
+
+
+def _closest_on_segments(p, a, b):
+    # The closest point to p on each segment ab
+    ab = b - a
+    t = np.clip(((p - a) * ab).sum(axis=1) / np.maximum((ab * ab).sum(axis=1), 1e-300), 0.0, 1.0)
+    return a + t[:, None] * ab
+
+
+def closest_points_on_triangles(p, a, b, c):
+    """
+    Returns the closest point to p on each triangle abc, the projection onto the plane if it is
+    inside the triangle and otherwise the closest point on its edges.
+    """
+    normal = np.cross(b - a, c - a)
+    length = np.linalg.norm(normal, axis=1)
+    unit = normal / np.maximum(length, 1e-300)[:, None]
+    projected = p - ((p - a) * unit).sum(axis=1)[:, None] * unit
+
+    # Inside if the projection is on the same side of every edge as the normal
+    inside = length > 0
+    for start, end in ((a, b), (b, c), (c, a)):
+        inside &= (np.cross(end - start, projected - start) * normal).sum(axis=1) >= 0
+
+    edges = np.stack([_closest_on_segments(p, start, end) for start, end in ((a, b), (b, c), (c, a))], axis=1)
+    nearest_edge = edges[np.arange(len(a)), np.linalg.norm(edges - p, axis=2).argmin(axis=1)]
+    return np.where(inside[:, None], projected, nearest_edge), unit
+
+
+def closest_point(bvh, point):
+    """
+    Returns the SurfacePoint on the mesh nearest to the point, visiting the nodes nearest first.
+    """
+    point = np.asarray(point, dtype=np.float64)
+    minimum, scale = np.asarray(bvh.minimum), np.asarray(bvh.scale)
+
+    def box_distance(node):
+        lower = minimum + bvh.bounds[node, :3] * scale
+        upper = minimum + bvh.bounds[node, 3:] * scale
+        return float(np.linalg.norm(np.maximum(np.maximum(lower - point, point - upper), 0.0)))
+
+    best = SurfacePoint(None, None, np.inf)
+    queue = [(box_distance(0), 0)]
+    while queue:
+        distance, node = heapq.heappop(queue)
+        if distance >= best.distance:
+            break
+        first, second = (int(v) for v in bvh.nodes[node])
+        if second < 0:
+            corners = minimum + bvh.positions[bvh.indices[first:first - second]].astype(np.float64) * scale
+            points, normals = closest_points_on_triangles(point, corners[:, 0], corners[:, 1], corners[:, 2])
+            distances = np.linalg.norm(points - point, axis=1)
+            nearest = int(distances.argmin())
+            if distances[nearest] < best.distance:
+                best = SurfacePoint(points[nearest], normals[nearest], float(distances[nearest]))
+        else:
+            for child in (first, second):
+                heapq.heappush(queue, (box_distance(child), child))
+    return best
+
+
+# Loads the BVH and picks the surface with it, included in the page only when a BVH is written
+BVH_JS = """
+      // loading the BVH written by --annotations/--bvh, positions and bounds are quantized so
+      // rays are moved into the quantized space where their distances stay the same
+      function loadBVH( url, onLoad ) {
+          const fileLoader = new THREE.FileLoader();
+          fileLoader.setResponseType( 'arraybuffer' );
+          fileLoader.setCrossOrigin( '' );
+          fileLoader.load( url, function ( data ) {
+              const view = new DataView( data );
+              const headerLength = view.getUint32( 8, true );
+              const header = JSON.parse( new TextDecoder().decode( new Uint8Array( data, 12, headerLength ) ) );
+              const IndexArray = header.index.type === 'uint16' ? Uint16Array : Uint32Array;
+              onLoad( {
+                  min: header.min,
+                  scale: header.scale,
+                  bounds: new Uint16Array( data, header.bounds.byteOffset, header.nodeCount * 6 ),
+                  nodes: new Int32Array( data, header.nodes.byteOffset, header.nodeCount * 2 ),
+                  position: new Uint16Array( data, header.position.byteOffset, header.vertexCount * 3 ),
+                  index: new IndexArray( data, header.index.byteOffset, header.triangleCount * 3 )
+              } );
+          }, undefined, onError );
+      }
+
+      // the distance along the ray to the box of a node, Infinity if it is missed
+      function rayBox( bvh, node, origin, inverse, far ) {
+          let near = 0;
+          for ( let axis = 0; axis < 3; axis ++ ) {
+              let t0 = ( bvh.bounds[ node * 6 + axis ] - origin[ axis ] ) * inverse[ axis ];
+              let t1 = ( bvh.bounds[ node * 6 + axis + 3 ] - origin[ axis ] ) * inverse[ axis ];
+              if ( t0 > t1 ) [ t0, t1 ] = [ t1, t0 ];
+              if ( t0 > near ) near = t0;
+              if ( t1 < far ) far = t1;
+              if ( near > far ) return Infinity;
+          }
+          return near;
+      }
+
+      // Moller-Trumbore, the distance along the ray to the triangle or Infinity
+      function rayTriangle( bvh, triangle, origin, direction ) {
+          const p = bvh.position, i = bvh.index;
+          const a = i[ triangle * 3 ] * 3, b = i[ triangle * 3 + 1 ] * 3, c = i[ triangle * 3 + 2 ] * 3;
+          const e1x = p[ b ] - p[ a ], e1y = p[ b + 1 ] - p[ a + 1 ], e1z = p[ b + 2 ] - p[ a + 2 ];
+          const e2x = p[ c ] - p[ a ], e2y = p[ c + 1 ] - p[ a + 1 ], e2z = p[ c + 2 ] - p[ a + 2 ];
+          const px = direction[ 1 ] * e2z - direction[ 2 ] * e2y;
+          const py = direction[ 2 ] * e2x - direction[ 0 ] * e2z;
+          const pz = direction[ 0 ] * e2y - direction[ 1 ] * e2x;
+          const det = e1x * px + e1y * py + e1z * pz;
+          if ( Math.abs( det ) < 1e-12 ) return Infinity;
+          const tx = origin[ 0 ] - p[ a ], ty = origin[ 1 ] - p[ a + 1 ], tz = origin[ 2 ] - p[ a + 2 ];
+          const u = ( tx * px + ty * py + tz * pz ) / det;
+          if ( u < 0 || u > 1 ) return Infinity;
+          const qx = ty * e1z - tz * e1y, qy = tz * e1x - tx * e1z, qz = tx * e1y - ty * e1x;
+          const v = ( direction[ 0 ] * qx + direction[ 1 ] * qy + direction[ 2 ] * qz ) / det;
+          if ( v < 0 || u + v > 1 ) return Infinity;
+          const t = ( e2x * qx + e2y * qy + e2z * qz ) / det;
+          return t > 0 ? t : Infinity;
+      }
+
+      // the nearest hit of the ray on the model, visiting the nearer child first, or null
+      function raycastBVH( bvh, ray, far = Infinity ) {
+          const origin = [ 0, 1, 2 ].map( axis => ( ray.origin.getComponent( axis ) - bvh.min[ axis ] ) / bvh.scale[ axis ] );
+          const direction = [ 0, 1, 2 ].map( axis => ray.direction.getComponent( axis ) / bvh.scale[ axis ] );
+          const inverse = direction.map( d => 1 / d );
+          let best = far, bestTriangle = -1;
+          const stack = [ 0 ];
+          while ( stack.length > 0 ) {
+              const node = stack.pop();
+              if ( rayBox( bvh, node, origin, inverse, best ) === Infinity ) continue;
+              const first = bvh.nodes[ node * 2 ], second = bvh.nodes[ node * 2 + 1 ];
+              if ( second < 0 ) {
+                  for ( let triangle = first; triangle < first - second; triangle ++ ) {
+                      const t = rayTriangle( bvh, triangle, origin, direction );
+                      if ( t < best ) {
+                          best = t;
+                          bestTriangle = triangle;
+                      }
+                  }
+              } else if ( rayBox( bvh, first, origin, inverse, best ) <= rayBox( bvh, second, origin, inverse, best ) ) {
+                  stack.push( second, first );
+              } else {
+                  stack.push( first, second );
+              }
+          }
+          if ( bestTriangle < 0 ) return null;
+          return { distance: best, point: ray.at( best, new THREE.Vector3() ), triangle: bestTriangle };
+      }
+"""
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Splits a mesh into an octree of chunks for progressive loading. Leaves hold the full detail
+triangles and each parent holds a simplified copy of its children, made by vertex clustering,
+so the root is a coarse version of the whole model. Every chunk is written in the bin format and
+an index of their bounds, geometric error and children lets the viewer stream in the chunks
+nearest the camera, refining coarse to fine, and unload distant ones to bound memory.
+"""
+import os
+import json
+from collections import namedtuple
+from os.path import join, exists, basename, abspath
+import numpy as np
+from obj2html.parser.geometry_parser import Group
+from obj2html.parser.geometry_export import Mesh, load_mesh, write_buffers
+
+
+# The output format for chunked geometry
+CHUNKS_FORMAT = "chunks"
+
+# Defaults for the size of each chunk, the triangles the viewer keeps loaded and when it refines
+DEFAULT_CHUNK_TRIANGLES = 1 << 16
+DEFAULT_CHUNK_BUDGET = 1 << 22
+DEFAULT_PIXEL_ERROR = 2.0
+
+# Deeper nodes are not split, this stops runaway splitting of many triangles at the same place
+MAX_DEPTH = 12
+
+# Texture coordinates are clustered on a grid this many times coarser than the positions, so seams are kept
+_UV_GRID_FRACTION = 8
+
+# Part of a mesh, materials holds the material index of each triangle
+Part = namedtuple("Part", ["positions", "normals", "texcoords", "indices", "materials"])
+
+
+def _triangle_materials(mesh):
+    materials = np.zeros(mesh.triangle_count, dtype=np.int32)
+    for i, group in enumerate(mesh.groups):
+        materials[group.start:group.start + group.count] = i
+    return materials
+
+
+def _subset(part, triangles):
+    # The triangles given with only the vertices they use
+    used, inverse = np.unique(part.indices[triangles], return_inverse=True)
+    return Part(part.positions[used],
+                part.normals[used] if part.normals is not None else None,
+                part.texcoords[used] if part.texcoords is not None else None,
+                inverse.reshape(-1, 3).astype(np.uint32),
+                part.materials[triangles])
+
+
+def _concatenate(parts):
+    offsets = np.cumsum([0] + [len(p.positions) for p in parts[:-1]])
+    return Part(np.concatenate([p.positions for p in parts]),
+                np.concatenate([p.normals for p in parts]) if parts[0].normals is not None else None,
+                np.concatenate([p.texcoords for p in parts]) if parts[0].texcoords is not None else None,
+                np.concatenate([p.indices + np.uint32(offset) for p, offset in zip(parts, offsets)]),
+                np.concatenate([p.materials for p in parts]))
+
+
+def _cluster_key(cells):
+    # Packs integer grid cells (N, k) into one int64 key
+    cells = cells - cells.min(axis=0)
+    key = np.zeros(len(cells), dtype=np.int64)
+    for column in range(cells.shape[1]):
+        key = key * (int(cells[:, column].max()) + 1) + cells[:, column]
+    return key
+
+
+def decimate(part, cell_size, origin):
+    """
+    Simplifies the part by vertex clustering: every vertex in the same grid cell is merged into
+    their average and triangles which collapse are removed. Texture seams are kept.
+
+    Args:
+    - part              : the Part to simplify
+    - cell_size         : the size of a grid cell, which is the largest error introduced
+    - origin            : the corner of the grid
+    """
+    cells = np.floor((part.positions - origin) / cell_size).astype(np.int64)
+    if part.texcoords is not None:
+        resolution = float(np.ptp(part.positions, axis=0).max()) / cell_size
+        uv_grid = max(4, int(resolution) // _UV_GRID_FRACTION)
+        cells = np.concatenate((cells, np.floor(part.texcoords * uv_grid).astype(np.int64)), axis=1)
+    _, cluster = np.unique(_cluster_key(cells), return_inverse=True)
+    cluster = cluster.reshape(-1)
+    count = int(cluster.max()) + 1 if len(cluster) else 0
+    weights = np.bincount(cluster, minlength=count).astype(np.float64)
+
+    def average(values):
+        if values is None:
+            return None
+        columns = [np.bincount(cluster, weights=values[:, i], minlength=count) / weights for i in range(values.shape[1])]
+        return np.stack(columns, axis=1).astype(np.float32)
+
+    normals = average(part.normals)
+    if normals is not None:
+        normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, None]
+
+    # Drop the triangles which collapsed and the duplicates left by merging
+    indices = cluster[part.indices]
+    keep = (indices[:, 0] != indices[:, 1]) & (indices[:, 1] != indices[:, 2]) & (indices[:, 0] != indices[:, 2])
+    indices, materials = indices[keep], part.materials[keep]
+    corners = np.sort(indices, axis=1)
+    _, first = np.unique(np.concatenate((corners, materials[:, None].astype(np.int64)), axis=1), axis=0, return_index=True)
+    first.sort()
+
+    decimated = Part(average(part.positions), normals, average(part.texcoords), indices[first].astype(np.uint32), materials[first])
+    return _subset(decimated, np.arange(len(decimated.indices)))
+
+
+def simplify(part, max_triangles):
+    """
+    Decimates the part with a grid fine enough to keep as much detail as fits in max_triangles.
+    Returns the simplified part, never more than max_triangles, and the error, which is the cell size used.
+    """
+    lower = part.positions.min(axis=0)
+    extent = max(float(np.ptp(part.positions, axis=0).max()), 1e-12)
+
+    # Surfaces keep about two triangles for each grid cell they pass through
+    resolution = max(2, int(np.sqrt(max_triangles / 2)))
+    for _ in range(8):
+        cell_size = extent / resolution
+        simplified = decimate(part, cell_size, lower)
+        if len(simplified.indices) <= max_triangles or resolution == 2:
+            break
+        resolution = max(2, int(resolution * np.sqrt(max_triangles / len(simplified.indices)) * 0.95))
+
+    # A part of small triangles can collapse completely even on the finest grid, it is then kept as it is
+    if len(simplified.indices) == 0:
+        simplified, cell_size = part, 0.0
+
+    # When that or the coarsest grid is still too large only the largest triangles are kept, so a coarse
+    # level is never bigger than a chunk, and as any of the part may be missing its size is the error
+    if len(simplified.indices) > max_triangles:
+        corners = simplified.positions[simplified.indices]
+        areas = np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1)
+        largest = np.sort(np.argsort(-areas, kind="stable")[:max_triangles])
+        simplified, cell_size = _subset(simplified, largest), extent
+    return simplified, cell_size
+
+
+def _to_mesh(part, names):
+    # Triangles are ordered by material so each group is one draw call
+    order = np.argsort(part.materials, kind="stable")
+    counts = np.bincount(part.materials, minlength=len(names))
+    starts = np.cumsum(counts) - counts
+    groups = [Group(name, int(start), int(count)) for name, start, count in zip(names, starts, counts) if count > 0]
+    return Mesh(part.positions, part.normals, part.texcoords, part.indices[order], groups)
+
+
+class _OctreeWriter:
+    """
+    Builds the octree depth first, writing each chunk as soon as it is made. A node's simplified part
+    is kept until its parent is written, so besides the mesh the memory held is the parts of the
+    siblings along the current path, leaves as they are and parents of at most chunk_triangles.
+    """
+
+    def __init__(self, mesh, out_dir, chunk_triangles, quantization):
+        self.part = Part(mesh.positions, mesh.normals, mesh.texcoords, mesh.indices, _triangle_materials(mesh))
+        self.names = [group.name for group in mesh.groups]
+        self.centroids = mesh.positions[mesh.indices].mean(axis=1)
+        self.out_dir = out_dir
+        self.chunk_triangles = chunk_triangles
+        self.quantization = quantization
+        self.nodes = []
+
+    def build(self, triangles, origin, size, level):
+        node = {"id": len(self.nodes), "level": level, "children": []}
+        self.nodes.append(node)
+
+        if len(triangles) <= self.chunk_triangles or level >= MAX_DEPTH:
+            part = _subset(self.part, triangles)
+            error = 0.0
+        else:
+            # Split the triangles between the eight octants by their centroid
+            half = size / 2
+            octants = ((self.centroids[triangles] >= origin + half) * np.array([1, 2, 4])).sum(axis=1)
+            parts = []
+            error = 0.0
+            for octant in range(8):
+                selected = triangles[octants == octant]
+                if len(selected) == 0:
+                    continue
+                offset = np.array([(octant >> axis) & 1 for axis in range(3)]) * half
+                child, child_part, child_error = self.build(selected, origin + offset, half, level + 1)
+                node["children"].append(child["id"])
+                parts.append(child_part)
+                error = max(error, child_error)
+
+            # The parent is a simplified copy of its children
+            part, cell_size = simplify(_concatenate(parts), self.chunk_triangles)
+            error = max(error, cell_size)
+
+        self.write(node, part, error)
+        return node, part, error
+
+    def write(self, node, part, error):
+        # Named after the directory so chunks of different models can share an upload folder
+        node["file"] = f"{basename(abspath(self.out_dir))}_{node['id']}.bin"
+        write_buffers(_to_mesh(part, self.names), join(self.out_dir, node["file"]), self.quantization)
+
+        lower, upper = part.positions.min(axis=0), part.positions.max(axis=0)
+        node["center"] = [round(float(v), 6) for v in (lower + upper) / 2]
+        node["radius"] = round(float(np.linalg.norm(upper - lower) / 2), 6)
+        node["error"] = round(float(error), 6)
+        node["triangles"] = len(part.indices)
+
+
+def write_chunks(mesh, out_dir, chunk_triangles=DEFAULT_CHUNK_TRIANGLES, quantization=None):
+    """
+    Writes the mesh as an octree of bin chunks into out_dir and returns the chunk index.
+
+    Args:
+    - mesh              : the Mesh to split
+    - out_dir           : the directory to write the chunks and index.json to
+    - chunk_triangles   : the most triangles in one chunk
+    - quantization      : the Quantization to encode each chunk with, None to write floats
+    """
+    if mesh.triangle_count == 0:
+        raise ValueError("The mesh has no triangles to split into chunks")
+    if not exists(out_dir):
+        os.makedirs(out_dir)
+
+    lower = mesh.positions.min(axis=0)
+    size = max(float(np.ptp(mesh.positions, axis=0).max()), 1e-12)
+
+    writer = _OctreeWriter(mesh, out_dir, chunk_triangles, quantization)
+    writer.build(np.arange(mesh.triangle_count), lower, size, 0)
+
+    index = {"version": 1,
+             "root": 0,
+             "triangles": mesh.triangle_count,
+             "nodes": writer.nodes}
+    with open(join(out_dir, "index.json"), 'w') as f:
+        json.dump(index, f)
+    return index
+
+
+def format_chunks(index):
+    """
+    Formats a chunk index as one line with the number of chunks and levels and the size of the coarsest.
+    """
+    nodes = index["nodes"]
+    leaves = sum(1 for node in nodes if len(node["children"]) == 0)
+    return (f"Wrote {len(nodes)} chunks ({leaves} full detail), {max(node['level'] for node in nodes) + 1} levels, "
+            f"the coarsest has {nodes[index['root']]['triangles']} of {index['triangles']} triangles")
+
+
+def convert_chunks(obj_file, out_dir, chunk_triangles=DEFAULT_CHUNK_TRIANGLES, quantization=None, optimization=None):
+    """
+    Parses the OBJ file, optimized if optimization is given, and writes it as an octree of chunks.
+    Returns the chunk index and the OptimizationReport, or None when it was not optimized.
+    """
+    mesh, report = load_mesh(obj_file, optimization)
+    return write_chunks(mesh, out_dir, chunk_triangles, quantization), report
+
+
+# Streams the chunks into the viewer, included in the page only when chunks are used
+CHUNKS_JS = """
+      // streaming the octree chunks written by --output_format chunks. A chunk is replaced by its
+      // finer children once its error would cover more than index.pixelError pixels, chunks are
+      // loaded nearest first and the furthest hidden ones are unloaded above index.budget triangles
+      function loadChunks( index, createMaterial ) {
+          // A chunk which fails is tried again after RETRY_DELAY ms, doubling each time, and given up on after MAX_RETRIES
+          const MAX_RETRIES = 3;
+          const RETRY_DELAY = 1000;
+          const nodes = index.nodes;
+          const materials = {};
+          const loaded = new Map();
+          const loading = new Set();
+          const failures = new Map();
+          const group = new THREE.Group();
+          const center = new THREE.Vector3();
+          let loadedTriangles = 0;
+          let lastUpdate = 0;
+          scene.add( group );
+          object = group;
+
+          function material( name ) {
+              if ( ! ( name in materials ) ) materials[ name ] = createMaterial( name );
+              return materials[ name ];
+          }
+
+          function distance( node ) {
+              center.fromArray( node.center );
+              return Math.max( camera.position.distanceTo( center ) - node.radius, camera.near );
+          }
+
+          function needsRefining( node ) {
+              const pixels = window.innerHeight / ( 2 * Math.tan( THREE.MathUtils.degToRad( camera.fov ) / 2 ) );
+              return node.children.length > 0 && node.error / distance( node ) * pixels > index.pixelError;
+          }
+
+          function waiting( node ) {
+              const failure = failures.get( node.id );
+              return failure !== undefined && ( failure.attempts > MAX_RETRIES || performance.now() < failure.retryAt );
+          }
+
+          function failed( node ) {
+              return failures.has( node.id ) && failures.get( node.id ).attempts > MAX_RETRIES;
+          }
+
+          function request( node ) {
+              loading.add( node.id );
+              loadBuffers( node.url, material, function ( mesh ) {
+                  loading.delete( node.id );
+                  failures.delete( node.id );
+                  mesh.visible = false;
+                  loaded.set( node.id, mesh );
+                  loadedTriangles += node.triangles;
+                  group.add( mesh );
+                  sceneMeshes.push( mesh );
+              }, function () {}, function ( error ) {
+                  loading.delete( node.id );
+                  const attempts = failures.has( node.id ) ? failures.get( node.id ).attempts + 1 : 1;
+                  failures.set( node.id, { attempts: attempts, retryAt: performance.now() + RETRY_DELAY * 2 ** ( attempts - 1 ) } );
+                  console.error( 'Chunk ' + node.url + ' failed to load (attempt ' + attempts + ')', error );
+                  onError( error );
+              } );
+          }
+
+          function unload( node ) {
+              const mesh = loaded.get( node.id );
+              loaded.delete( node.id );
+              loadedTriangles -= node.triangles;
+              group.remove( mesh );
+              sceneMeshes.splice( sceneMeshes.indexOf( mesh ), 1 );
+              mesh.geometry.dispose();
+          }
+
+          function update() {
+              const now = performance.now();
+              if ( now - lastUpdate < 100 ) return;
+              lastUpdate = now;
+
+              // Show the finest loaded chunks, a parent stays visible until all of its children are loaded
+              const visible = new Set();
+              const wanted = [];
+              ( function visit( node ) {
+                  if ( ! loaded.has( node.id ) ) {
+                      wanted.push( node );
+                      return;
+                  }
+                  if ( needsRefining( node ) ) {
+                      const missing = node.children.filter( id => ! loaded.has( id ) );
+                      if ( missing.length === 0 ) {
+                          node.children.forEach( id => visit( nodes[ id ] ) );
+                          return;
+                      }
+                      missing.forEach( id => wanted.push( nodes[ id ] ) );
+                  }
+                  visible.add( node.id );
+              } )( nodes[ index.root ] );
+              loaded.forEach( ( mesh, id ) => mesh.visible = visible.has( id ) );
+
+              // Nearest chunks first, a few at a time
+              wanted.sort( ( a, b ) => distance( a ) - distance( b ) );
+              for ( const node of wanted ) {
+                  if ( loading.size >= 4 ) break;
+                  if ( ! loading.has( node.id ) && ! waiting( node ) ) request( node );
+              }
+
+              // Unload the furthest hidden chunks without loaded children, the root is always kept
+              if ( loadedTriangles > index.budget ) {
+                  const hidden = [ ...loaded.keys() ].map( id => nodes[ id ] ).filter( node =>
+                      ! visible.has( node.id ) && node.id !== index.root && ! node.children.some( id => loaded.has( id ) ) );
+                  hidden.sort( ( a, b ) => distance( b ) - distance( a ) );
+                  for ( const node of hidden ) {
+                      if ( loadedTriangles <= index.budget ) break;
+                      unload( node );
+                  }
+              }
+
+              const percentage = Math.round( visible.size / ( visible.size + wanted.length ) * 100 );
+              const failedCount = wanted.filter( failed ).length;
+              document.getElementById( "completionBar" ).style.width = percentage + "%";
+              document.getElementById( "completionBar" ).innerHTML = failedCount > 0 ?
+                  failedCount + " chunks of the model could not be loaded, see the web console." : wanted.length === 0 ? "The model is loaded." :
+                  "Loading the model in view, " + visible.size + " of " + ( visible.size + wanted.length ) + " chunks shown.";
+          }
+
+          frameCallbacks.push( update );
+      }
+"""
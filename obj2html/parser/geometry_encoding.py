@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Quantized encoding of mesh attributes for the bin output format.
+
+- positions are quantized to an unsigned integer grid over the bounding box
+- normals are octahedral encoded to two unsigned integers
+- texture coordinates are quantized over their bounding box
+- the index buffer is delta + zigzag encoded so that gzip/brotli compress it well
+
+DECODER_JS is injected into the rendered template and undoes the encoding in the browser.
+"""
+from collections import namedtuple
+import numpy as np
+
+
+# The number of bits used for each attribute
+Quantization = namedtuple("Quantization", ["position_bits", "normal_bits", "uv_bits"])
+DEFAULT_QUANTIZATION = Quantization(16, 8, 12)
+
+
+def _storage_type(bits):
+    return np.uint8 if bits <= 8 else np.uint16
+
+
+def _type_name(dtype):
+    return np.dtype(dtype).name
+
+
+def quantize_range(values, bits):
+    """
+    Quantizes each column of values to bits over its own [min, max] range.
+    Returns the quantized values, the minimum and the scale to decode with (q * scale + min).
+    """
+    if not 1 <= bits <= 16:
+        raise ValueError("Quantization bits must be between 1 and 16")
+    steps = (1 << bits) - 1
+    # An empty mesh has no range, it decodes to nothing whatever the minimum and scale
+    if len(values) == 0:
+        return np.zeros(values.shape, dtype=_storage_type(bits)), np.zeros(values.shape[1]), np.ones(values.shape[1])
+    minimum = values.min(axis=0).astype(np.float64)
+    extent = values.max(axis=0).astype(np.float64) - minimum
+    scale = np.where(extent > 0, extent / steps, 1.0)
+    quantized = np.rint((values - minimum) / scale).astype(_storage_type(bits))
+    return quantized, minimum, scale
+
+
+def dequantize_range(quantized, minimum, scale):
+    return (quantized.astype(np.float64) * scale + minimum).astype(np.float32)
+
+
+def encode_octahedral(normals, bits):
+    """
+    Encodes unit normals with the octahedral mapping to two unsigned integers of bits each.
+    """
+    if not 2 <= bits <= 16:
+        raise ValueError("Normal bits must be between 2 and 16")
+    normals = normals.astype(np.float64)
+    lengths = np.abs(normals).sum(axis=1, keepdims=True)
+    lengths[lengths == 0] = 1.0
+    n = normals / lengths
+    x, y, z = n[:, 0].copy(), n[:, 1].copy(), n[:, 2]
+
+    # Fold the lower hemisphere over the diagonals
+    lower = z < 0
+    sign_x = np.where(x >= 0, 1.0, -1.0)
+    sign_y = np.where(y >= 0, 1.0, -1.0)
+    folded_x = (1.0 - np.abs(y)) * sign_x
+    folded_y = (1.0 - np.abs(x)) * sign_y
+    x[lower] = folded_x[lower]
+    y[lower] = folded_y[lower]
+
+    steps = (1 << bits) - 1
+    encoded = np.rint((np.stack((x, y), axis=1) * 0.5 + 0.5) * steps)
+    return np.clip(encoded, 0, steps).astype(_storage_type(bits))
+
+
+def decode_octahedral(encoded, bits):
+    steps = (1 << bits) - 1
+    xy = encoded.astype(np.float64) / steps * 2.0 - 1.0
+    x, y = xy[:, 0], xy[:, 1]
+    z = 1.0 - np.abs(x) - np.abs(y)
+    t = np.maximum(-z, 0.0)
+    x = x - np.where(x >= 0, t, -t)
+    y = y - np.where(y >= 0, t, -t)
+    n = np.stack((x, y, z), axis=1)
+    return (n / np.linalg.norm(n, axis=1, keepdims=True)).astype(np.float32)
+
+
+def delta_encode_indices(indices):
+    """
+    Delta encodes the flattened index buffer and zigzag maps the deltas to unsigned integers.
+    """
+    flat = indices.reshape(-1).astype(np.int64)
+    deltas = np.diff(flat, prepend=0)
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+    dtype = np.uint16 if len(zigzag) == 0 or zigzag.max() <= 0xFFFF else np.uint32
+    return zigzag.astype(dtype)
+
+
+def delta_decode_indices(encoded):
+    zigzag = encoded.astype(np.int64)
+    deltas = (zigzag >> 1) ^ -(zigzag & 1)
+    return np.cumsum(deltas).astype(np.uint32)
+
+
+def encode_mesh(mesh, quantization=DEFAULT_QUANTIZATION):
+    """
+    Quantizes the attributes of a Mesh.
+    Returns the header fields, the (name, array) sections to write and the error introduced.
+
+    Args:
+    - mesh              : the Mesh to encode
+    - quantization      : the Quantization bits to use
+    """
+    header = {"quantized": True}
+    sections = []
+    errors = {}
+
+    positions, minimum, scale = quantize_range(mesh.positions, quantization.position_bits)
+    header["position"] = {"type": _type_name(positions.dtype), "bits": quantization.position_bits,
+                          "min": minimum.tolist(), "scale": scale.tolist()}
+    sections.append(("position", positions))
+    decoded = dequantize_range(positions, minimum, scale)
+    diagonal = float(np.linalg.norm(mesh.positions.max(axis=0) - mesh.positions.min(axis=0))) if mesh.vertex_count else 0.0
+    errors["position"] = float(np.abs(decoded - mesh.positions).max()) if mesh.vertex_count else 0.0
+    errors["position_relative"] = errors["position"] / diagonal if diagonal > 0 else 0.0
+
+    if mesh.normals is not None:
+        normals = encode_octahedral(mesh.normals, quantization.normal_bits)
+        header["normal"] = {"type": _type_name(normals.dtype), "bits": quantization.normal_bits}
+        sections.append(("normal", normals))
+        lengths = np.linalg.norm(mesh.normals, axis=1)
+        valid = lengths > 0
+        unit = mesh.normals[valid] / lengths[valid, None]
+        cosines = np.clip((decode_octahedral(normals[valid], quantization.normal_bits) * unit).sum(axis=1), -1.0, 1.0)
+        errors["normal_degrees"] = float(np.degrees(np.arccos(cosines)).max()) if valid.any() else 0.0
+
+    if mesh.texcoords is not None:
+        texcoords, minimum, scale = quantize_range(mesh.texcoords, quantization.uv_bits)
+        header["uv"] = {"type": _type_name(texcoords.dtype), "bits": quantization.uv_bits,
+                        "min": minimum.tolist(), "scale": scale.tolist()}
+        sections.append(("uv", texcoords))
+        errors["uv"] = float(np.abs(dequantize_range(texcoords, minimum, scale) - mesh.texcoords).max()) if mesh.vertex_count else 0.0
+
+    indices = delta_encode_indices(mesh.indices)
+    header["index"] = {"type": _type_name(indices.dtype), "encoding": "delta-zigzag"}
+    sections.append(("index", indices))
+
+    return header, sections, errors
+
+
+def format_errors(errors):
+    """
+    Formats the error introduced by encode_mesh for printing.
+    """
+    report = f"position max {errors['position']:.6g} ({errors['position_relative'] * 100:.4f}% of the bounding box diagonal)"
+    if "normal_degrees" in errors:
+        report += f", normal max {errors['normal_degrees']:.3f} degrees"
+    if "uv" in errors:
+        report += f", uv max {errors['uv']:.6g}"
+    return report
+
+
+# Decodes the quantized sections of the bin format into the geometry, see loadBuffers in the template
+DECODER_JS = """
+      const quantizedArrays = { uint8: Uint8Array, uint16: Uint16Array, uint32: Uint32Array };
+
+      function decodeQuantized( header, data, geometry ) {
+          const count = header.vertexCount;
+          const position = header.position;
+          const positions = new quantizedArrays[ position.type ]( data, position.byteOffset, count * 3 );
+          const decodedPositions = new Float32Array( count * 3 );
+          for ( let i = 0; i < count * 3; i ++ ) {
+              const c = i % 3;
+              decodedPositions[ i ] = positions[ i ] * position.scale[ c ] + position.min[ c ];
+          }
+          geometry.setAttribute( 'position', new THREE.BufferAttribute( decodedPositions, 3 ) );
+
+          if ( header.normal ) {
+              const normals = new quantizedArrays[ header.normal.type ]( data, header.normal.byteOffset, count * 2 );
+              const steps = ( 1 << header.normal.bits ) - 1;
+              const decodedNormals = new Float32Array( count * 3 );
+              for ( let i = 0; i < count; i ++ ) {
+                  let x = normals[ 2 * i ] / steps * 2 - 1;
+                  let y = normals[ 2 * i + 1 ] / steps * 2 - 1;
+                  const z = 1 - Math.abs( x ) - Math.abs( y );
+                  const t = Math.max( - z, 0 );
+                  x += x >= 0 ? - t : t;
+                  y += y >= 0 ? - t : t;
+                  const length = Math.hypot( x, y, z );
+                  decodedNormals[ 3 * i ] = x / length;
+                  decodedNormals[ 3 * i + 1 ] = y / length;
+                  decodedNormals[ 3 * i + 2 ] = z / length;
+              }
+              geometry.setAttribute( 'normal', new THREE.BufferAttribute( decodedNormals, 3 ) );
+          }
+
+          if ( header.uv ) {
+              const uv = header.uv;
+              const texcoords = new quantizedArrays[ uv.type ]( data, uv.byteOffset, count * 2 );
+              const decodedTexcoords = new Float32Array( count * 2 );
+              for ( let i = 0; i < count * 2; i ++ ) {
+                  decodedTexcoords[ i ] = texcoords[ i ] * uv.scale[ i % 2 ] + uv.min[ i % 2 ];
+              }
+              geometry.setAttribute( 'uv', new THREE.BufferAttribute( decodedTexcoords, 2 ) );
+          }
+
+          const encoded = new quantizedArrays[ header.index.type ]( data, header.index.byteOffset, header.indexCount );
+          const indices = count > 65535 ? new Uint32Array( header.indexCount ) : new Uint16Array( header.indexCount );
+          let last = 0;
+          for ( let i = 0; i < header.indexCount; i ++ ) {
+              const zigzag = encoded[ i ];
+              last += ( zigzag >>> 1 ) ^ - ( zigzag & 1 );
+              indices[ i ] = last;
+          }
+          geometry.setIndex( new THREE.BufferAttribute( indices, 1 ) );
+      }
+"""
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Converts parsed OBJ geometry into binary formats which the browser can upload to the GPU
+without parsing any text:
+
+- glb   : a glTF 2.0 binary with the MTL materials and textures embedded, loaded with GLTFLoader
+- bin   : interleaved little-endian vertex/index buffers (or quantized attributes) with a small
+          JSON header, loaded with the loadBuffers() function in the default template
+
+An optimized mesh can also be written back as an OBJ, with one usemtl statement per material.
+"""
+import json
+import struct
+from os.path import splitext, basename, exists
+import numpy as np
+from obj2html.parser.geometry_parser import parse_obj, Group, MISSING_INDEX
+from obj2html.parser.mtl_parser import parse_mtl, material_colour, material_opacity
+from obj2html.parser.geometry_encoding import encode_mesh
+from obj2html.parser.geometry_optimize import optimize_mesh
+
+
+# Output formats which replace the OBJ file in the generated page
+BINARY_FORMATS = ("glb", "bin")
+
+# Magic and version of the bin format header
+BUFFERS_MAGIC = b"O2HB"
+BUFFERS_VERSION = 1
+
+# glTF constants
+_GLB_MAGIC = b"glTF"
+_GLB_JSON = 0x4E4F534A
+_GLB_BIN = 0x004E4942
+_FLOAT = 5126
+_UNSIGNED_SHORT = 5123
+_UNSIGNED_INT = 5125
+_ARRAY_BUFFER = 34962
+_ELEMENT_ARRAY_BUFFER = 34963
+
+# The material of faces before any usemtl, the page creates it like any material missing from the MTL file
+DEFAULT_MATERIAL = "default"
+
+# Image types which can be embedded in a glTF
+IMAGE_MIME_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}
+
+
+class Mesh:
+    """
+    Indexed triangle geometry with a single index per vertex, ready to be uploaded to the GPU.
+    Triangles are ordered by material so that each group is one draw call.
+
+    Attributes:
+    - positions         : (V, 3) float32
+    - normals           : (V, 3) float32 or None
+    - texcoords         : (V, 2) float32 or None
+    - indices           : (T, 3) uint32
+    - groups            : list of Group of triangles which share a material
+    """
+
+    def __init__(self, positions, normals, texcoords, indices, groups):
+        self.positions  = positions
+        self.normals    = normals
+        self.texcoords  = texcoords
+        self.indices    = indices
+        self.groups     = groups
+
+    @property
+    def vertex_count(self):
+        return len(self.positions)
+
+    @property
+    def triangle_count(self):
+        return len(self.indices)
+
+    @property
+    def index_dtype(self):
+        return np.uint16 if self.vertex_count <= 0xFFFF else np.uint32
+
+
+def _unique_corners(columns, sizes):
+    """
+    Finds the unique (position, texcoord, normal) index tuples of every triangle corner.
+    Returns the unique tuples as columns and the inverse mapping of each corner.
+    """
+    if np.prod([float(s) for s in sizes]) < 2 ** 63:
+        key = np.zeros(len(columns[0]), dtype=np.int64)
+        for column, size in zip(columns, sizes):
+            key *= size
+            key += column
+        unique, inverse = np.unique(key, return_inverse=True)
+        unique_columns = []
+        for size in reversed(sizes):
+            unique_columns.append(unique % size)
+            unique //= size
+        return unique_columns[::-1], inverse.reshape(-1)
+
+    unique, inverse = np.unique(np.stack(columns, axis=1), axis=0, return_inverse=True)
+    return [unique[:, i] for i in range(len(columns))], inverse.reshape(-1)
+
+
+def _material_order(geometry):
+    # Material id of each triangle, in order of first use
+    names = []
+    material_ids = np.zeros(geometry.triangle_count, dtype=np.int64)
+    for group in geometry.material_groups:
+        if group.name not in names:
+            names.append(group.name)
+        material_ids[group.start:group.start + group.count] = names.index(group.name)
+    if len(names) == 0:
+        names.append(None)
+    return names, material_ids
+
+
+def build_mesh(geometry):
+    """
+    Converts the separate OBJ index streams into a single indexed vertex buffer.
+
+    Args:
+    - geometry          : an ObjGeometry from parse_obj
+    """
+    columns = [geometry.position_index.reshape(-1).astype(np.int64)]
+    sizes = [max(geometry.vertex_count, 1)]
+    attributes = []
+    for index, values in ((geometry.texcoord_index, geometry.texcoords), (geometry.normal_index, geometry.normals)):
+        if index is None or len(values) == 0:
+            attributes.append(None)
+            continue
+        # Shift by one so that a missing index becomes 0
+        column = (index.reshape(-1).astype(np.int64) + 1) % (MISSING_INDEX + 1)
+        columns.append(column)
+        sizes.append(len(values) + 1)
+        attributes.append(values)
+
+    unique_columns, inverse = _unique_corners(columns, sizes)
+    positions = geometry.positions[unique_columns[0]]
+
+    gathered = []
+    column = 1
+    for values in attributes:
+        if values is None:
+            gathered.append(None)
+            continue
+        # Prepend a zero row for corners without a value
+        padded = np.concatenate((np.zeros((1, values.shape[1]), dtype=np.float32), values))
+        gathered.append(padded[unique_columns[column]])
+        column += 1
+
+    names, material_ids = _material_order(geometry)
+    order = np.argsort(material_ids, kind="stable")
+    indices = inverse.reshape(-1, 3)[order].astype(np.uint32)
+    counts = np.bincount(material_ids, minlength=len(names))
+    starts = np.cumsum(counts) - counts
+    groups = [Group(name, int(start), int(count)) for name, start, count in zip(names, starts, counts) if count > 0]
+
+    return Mesh(positions, gathered[1], gathered[0], indices, groups)
+
+
+def _pad(data, alignment=4, fill=b"\x00"):
+    return data + fill * (-len(data) % alignment)
+
+
+def write_sections(out_file, header, sections):
+    """
+    Writes the bin format: 'O2HB' | uint32 version | uint32 header length | JSON header | sections.
+    The byte offset of each (name, array) section is stored in header[name]["byteOffset"].
+    """
+    # The offsets depend on the header length so encode it until it is stable
+    while True:
+        header_bytes = _pad(json.dumps(header).encode("utf-8"), fill=b" ")
+        offset = 12 + len(header_bytes)
+        stable = True
+        for name, array in sections:
+            if header[name].get("byteOffset") != offset:
+                header[name]["byteOffset"] = offset
+                stable = False
+            offset += len(_pad(array.tobytes()))
+        if stable:
+            break
+
+    with open(out_file, 'wb') as f:
+        f.write(BUFFERS_MAGIC)
+        f.write(struct.pack("<II", BUFFERS_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for _, array in sections:
+            f.write(_pad(array.tobytes()))
+
+    return out_file
+
+
+def write_buffers(mesh, out_file, quantization=None):
+    """
+    Writes the bin format, either as an interleaved float32 vertex buffer and an index buffer
+    or, when quantization is given, as quantized planar attributes (see geometry_encoding).
+    Returns the path written and the error introduced by the quantization (see format_errors),
+    or None when floats were written.
+
+    Args:
+    - mesh              : the Mesh to write
+    - out_file          : path of the .bin file
+    - quantization      : the Quantization to encode with, None to write floats
+    """
+    header = {"vertexCount": mesh.vertex_count,
+              "indexCount": int(mesh.indices.size),
+              "groups": [{"material": g.name if g.name is not None else DEFAULT_MATERIAL, "start": g.start, "count": g.count}
+                         for g in mesh.groups]}
+
+    if quantization is not None:
+        encoded_header, sections, errors = encode_mesh(mesh, quantization)
+        header.update(encoded_header)
+        sections = [(name, array.astype(array.dtype.newbyteorder("<"))) for name, array in sections]
+        return write_sections(out_file, header, sections), errors
+
+    layout = [("position", mesh.positions)]
+    if mesh.normals is not None:
+        layout.append(("normal", mesh.normals))
+    if mesh.texcoords is not None:
+        layout.append(("uv", mesh.texcoords))
+
+    stride = sum(values.shape[1] for _, values in layout)
+    vertices = np.empty((mesh.vertex_count, stride), dtype="<f4")
+    attributes = {}
+    offset = 0
+    for name, values in layout:
+        vertices[:, offset:offset + values.shape[1]] = values
+        attributes[name] = {"offset": offset, "size": values.shape[1]}
+        offset += values.shape[1]
+
+    index_dtype = mesh.index_dtype
+    header.update({"stride": stride,
+                   "attributes": attributes,
+                   "vertices": {},
+                   "index": {"type": "uint16" if index_dtype == np.uint16 else "uint32"}})
+    return write_sections(out_file, header, [("vertices", vertices),
+                                             ("index", mesh.indices.astype(np.dtype(index_dtype).newbyteorder("<")))]), None
+
+
+def write_obj(mesh, out_file, chunk_size=1 << 16):
+    """
+    Writes the mesh as an OBJ where every vertex has the same position, texture coordinate and
+    normal index, and each material is a single usemtl group.
+
+    Args:
+    - mesh              : the Mesh to write
+    - out_file          : path of the .obj file
+    - chunk_size        : the number of vertices/faces formatted at once
+    """
+    with open(out_file, 'w') as f:
+        f.write(f"# {mesh.vertex_count} vertices, {mesh.triangle_count} triangles, {len(mesh.groups)} materials\n")
+        for values, line in ((mesh.positions, "v %.9g %.9g %.9g\n"),
+                             (mesh.texcoords, "vt %.7g %.7g\n"),
+                             (mesh.normals, "vn %.7g %.7g %.7g\n")):
+            if values is None:
+                continue
+            for start in range(0, len(values), chunk_size):
+                block = values[start:start + chunk_size]
+                f.write((line * len(block)) % tuple(block.ravel().tolist()))
+
+        # OBJ indices start at 1 and are repeated for each attribute which is present
+        corner = {(False, False): "%d", (True, False): "%d/%d",
+                  (False, True): "%d//%d", (True, True): "%d/%d/%d"}[(mesh.texcoords is not None, mesh.normals is not None)]
+        attributes = corner.count("%")
+        face = f"f {corner} {corner} {corner}\n"
+        for group in mesh.groups:
+            if group.name is not None:
+                f.write(f"usemtl {group.name}\n")
+            for start in range(group.start, group.start + group.count, chunk_size):
+                block = mesh.indices[start:min(start + chunk_size, group.start + group.count)].astype(np.int64) + 1
+                f.write((face * len(block)) % tuple(np.repeat(block, attributes, axis=1).ravel().tolist()))
+    return out_file
+
+
+class _GltfBuilder:
+    """
+    Collects the glTF JSON and the binary chunk of a GLB.
+    """
+
+    def __init__(self):
+        self.gltf = {"asset": {"version": "2.0", "generator": "obj2html"},
+                     "scene": 0, "scenes": [{"nodes": [0]}], "nodes": [{"mesh": 0}],
+                     "meshes": [], "accessors": [], "bufferViews": [], "buffers": []}
+        self.chunks = []
+        self.length = 0
+        self.images = {}
+
+    def add_view(self, data, target=None):
+        data = bytes(data)
+        view = {"buffer": 0, "byteOffset": self.length, "byteLength": len(data)}
+        if target is not None:
+            view["target"] = target
+        self.gltf["bufferViews"].append(view)
+        padded = _pad(data)
+        self.chunks.append(padded)
+        self.length += len(padded)
+        return len(self.gltf["bufferViews"]) - 1
+
+    def add_accessor(self, view, component_type, count, accessor_type, byte_offset=0, min_values=None, max_values=None):
+        accessor = {"bufferView": view, "byteOffset": byte_offset, "componentType": component_type,
+                    "count": int(count), "type": accessor_type}
+        if min_values is not None:
+            accessor["min"] = [float(v) for v in min_values]
+            accessor["max"] = [float(v) for v in max_values]
+        self.gltf["accessors"].append(accessor)
+        return len(self.gltf["accessors"]) - 1
+
+    def add_texture(self, texture_path):
+        """
+        Embeds an image, returns the texture index or None if it cannot be embedded.
+        """
+        if texture_path in self.images:
+            return self.images[texture_path]
+
+        mime_type = IMAGE_MIME_TYPES.get(splitext(texture_path)[1].lower())
+        if mime_type is None or not exists(texture_path):
+            print(f"WARNING: Could not embed texture {texture_path}, only PNG and JPEG files are supported.")
+            self.images[texture_path] = None
+            return None
+
+        with open(texture_path, 'rb') as f:
+            view = self.add_view(f.read())
+        self.gltf.setdefault("images", []).append({"bufferView": view, "mimeType": mime_type, "name": basename(texture_path)})
+        self.gltf.setdefault("samplers", [{"wrapS": 10497, "wrapT": 10497}])
+        self.gltf.setdefault("textures", []).append({"source": len(self.gltf["images"]) - 1, "sampler": 0})
+        self.images[texture_path] = len(self.gltf["textures"]) - 1
+        return self.images[texture_path]
+
+    def add_material(self, name, material, texture_path=None):
+        colour = material_colour(material) if material is not None else (1.0, 1.0, 1.0)
+        opacity = material_opacity(material) if material is not None else 1.0
+        shininess = float(material.get("Ns", "0").split()[0]) if material is not None else 0.0
+        pbr = {"baseColorFactor": list(colour) + [opacity],
+               "metallicFactor": 0.0,
+               "roughnessFactor": float(np.clip(1.0 - np.sqrt(shininess / 1000.0), 0.0, 1.0))}
+
+        if material is not None and "map_Kd" in material:
+            texture_path = material["map_Kd"]
+        if texture_path is not None:
+            texture = self.add_texture(texture_path)
+            if texture is not None:
+                pbr["baseColorTexture"] = {"index": texture}
+
+        entry = {"name": name or DEFAULT_MATERIAL, "pbrMetallicRoughness": pbr, "doubleSided": True}
+        if opacity < 1.0:
+            entry["alphaMode"] = "BLEND"
+        self.gltf.setdefault("materials", []).append(entry)
+        return len(self.gltf["materials"]) - 1
+
+    def write(self, out_file):
+        binary = b"".join(self.chunks)
+        self.gltf["buffers"].append({"byteLength": len(binary)})
+        json_chunk = _pad(json.dumps(self.gltf, separators=(",", ":")).encode("utf-8"), fill=b" ")
+
+        with open(out_file, 'wb') as f:
+            f.write(_GLB_MAGIC)
+            f.write(struct.pack("<II", 2, 12 + 8 + len(json_chunk) + 8 + len(binary)))
+            f.write(struct.pack("<II", len(json_chunk), _GLB_JSON))
+            f.write(json_chunk)
+            f.write(struct.pack("<II", len(binary), _GLB_BIN))
+            f.write(binary)
+
+
+def write_glb(mesh, out_file, materials=None, texture_file=None):
+    """
+    Writes the mesh as a GLB with one primitive per material.
+
+    Args:
+    - mesh              : the Mesh to write
+    - out_file          : path of the .glb file
+    - materials         : the parsed MTL materials (see parse_mtl), textures are embedded
+    - texture_file      : a single texture to use when there is no MTL file
+    """
+    builder = _GltfBuilder()
+
+    attributes = {"POSITION": builder.add_accessor(
+        builder.add_view(mesh.positions.astype("<f4").tobytes(), _ARRAY_BUFFER), _FLOAT, mesh.vertex_count, "VEC3",
+        min_values=mesh.positions.min(axis=0), max_values=mesh.positions.max(axis=0))}
+    if mesh.normals is not None:
+        attributes["NORMAL"] = builder.add_accessor(
+            builder.add_view(mesh.normals.astype("<f4").tobytes(), _ARRAY_BUFFER), _FLOAT, mesh.vertex_count, "VEC3")
+    if mesh.texcoords is not None:
+        # glTF has its texture origin in the top left rather than the bottom left
+        texcoords = mesh.texcoords.astype("<f4")
+        texcoords[:, 1] = 1.0 - texcoords[:, 1]
+        attributes["TEXCOORD_0"] = builder.add_accessor(
+            builder.add_view(texcoords.tobytes(), _ARRAY_BUFFER), _FLOAT, mesh.vertex_count, "VEC2")
+
+    index_dtype = mesh.index_dtype
+    component_type = _UNSIGNED_SHORT if index_dtype == np.uint16 else _UNSIGNED_INT
+    index_view = builder.add_view(mesh.indices.astype(np.dtype(index_dtype).newbyteorder("<")).tobytes(), _ELEMENT_ARRAY_BUFFER)
+
+    primitives = []
+    material_indices = {}
+    for group in mesh.groups:
+        if group.name not in material_indices:
+            material = materials.get(group.name) if materials is not None else None
+            material_indices[group.name] = builder.add_material(group.name, material, texture_file)
+        indices = builder.add_accessor(index_view, component_type, group.count * 3, "SCALAR",
+                                       byte_offset=group.start * 3 * np.dtype(index_dtype).itemsize)
+        primitives.append({"attributes": attributes, "indices": indices, "material": material_indices[group.name]})
+
+    builder.gltf["meshes"].append({"primitives": primitives})
+    builder.write(out_file)
+    return out_file
+
+
+def load_mesh(obj_file, optimization=None):
+    """
+    Parses the OBJ file into a Mesh, optimized (see geometry_optimize) if optimization is given.
+    Returns the Mesh and the OptimizationReport, or None when it was not optimized.
+    """
+    geometry = parse_obj(obj_file)
+    mesh = build_mesh(geometry)
+    report = None
+    if optimization is not None:
+        report = optimize_mesh(mesh, optimization, geometry)
+    return mesh, report
+
+
+def convert_geometry(obj_file, out_file, output_format, mtl_file=None, texture_file=None, quantization=None, optimization=None):
+    """
+    Parses the OBJ file and writes it in one of the BINARY_FORMATS, or as an optimized OBJ.
+    Returns the path written, the OptimizationReport (None when it was not optimized) and the
+    quantization error of the bin format (None when it was not quantized).
+
+    Args:
+    - obj_file          : path to the OBJ file
+    - out_file          : path of the file to write
+    - output_format     : 'glb', 'bin' or 'obj'
+    - mtl_file          : the MTL file, embedded for glb
+    - texture_file      : the texture file, embedded for glb
+    - quantization      : the Quantization for the bin format, None to write floats
+    - optimization      : the Optimization to weld, add normals and reorder with, None to write the mesh as parsed
+    """
+    mesh, report = load_mesh(obj_file, optimization)
+    if output_format == "obj":
+        return write_obj(mesh, out_file), report, None
+    elif output_format == "glb":
+        materials = parse_mtl(mtl_file) if mtl_file is not None else None
+        return write_glb(mesh, out_file, materials, texture_file), report, None
+    elif output_format == "bin":
+        out_file, errors = write_buffers(mesh, out_file, quantization)
+        return out_file, report, errors
+
+    raise ValueError(f"Unknown output format {output_format}")
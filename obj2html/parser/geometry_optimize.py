@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Server side optimization of a Mesh before it is written, so the browser uploads fewer vertices
+and issues fewer draw calls:
+
+- welding : vertices with identical position, normal and texture coordinate values are merged,
+            scanned models often repeat the same values under different OBJ indices
+- normals : smooth, area weighted normals are computed for vertices without one, so the page
+            does not have to call computeVertexNormals
+- merging : every face with the same material is one group of one geometry, one draw call each
+            (done by build_mesh, counted here against the meshes OBJLoader would create)
+- ordering: optionally the triangles of each group are reordered for the post-transform vertex
+            cache (Tipsify, Sander et al. 2007) and the vertices are reordered by first use
+"""
+from collections import namedtuple
+import numpy as np
+
+
+# How a mesh is optimized
+Optimization = namedtuple("Optimization", ["vertex_cache", "cache_size"])
+
+# The post-transform cache size which triangles are ordered for and the ACMR is measured with
+DEFAULT_CACHE_SIZE = 16
+DEFAULT_OPTIMIZATION = Optimization(False, DEFAULT_CACHE_SIZE)
+
+# The counts before and after optimization
+OptimizationReport = namedtuple("OptimizationReport", ["vertices_before", "vertices_after", "draw_calls_before",
+                                                       "draw_calls_after", "normals_computed", "acmr_before", "acmr_after"])
+
+
+def obj_draw_calls(geometry):
+    """
+    Returns the number of draw calls OBJLoader makes for the geometry, one for each run of
+    triangles between usemtl, o and g statements.
+
+    Args:
+    - geometry          : an ObjGeometry from parse_obj
+    """
+    starts = {0}
+    for group in list(geometry.material_groups) + list(geometry.object_groups):
+        if group.count > 0:
+            starts.add(group.start)
+            starts.add(group.start + group.count)
+    return max(sum(1 for start in starts if start < geometry.triangle_count), 1)
+
+
+def _vertex_keys(*columns):
+    # One opaque key per row of the columns, adding 0 makes -0.0 and 0.0 the same value
+    values = np.ascontiguousarray(np.hstack([c for c in columns if c is not None]).astype(np.float32) + np.float32(0))
+    return values.view(np.dtype((np.void, values.dtype.itemsize * values.shape[1]))).reshape(-1)
+
+
+def _first_use_order(inverse, first):
+    # Renumbers the unique rows in order of their first occurrence so the result stays in input order
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], rank[inverse]
+
+
+def weld_vertices(mesh):
+    """
+    Merges the vertices with identical attribute values. Returns the number of vertices removed.
+    """
+    _, first, inverse = np.unique(_vertex_keys(mesh.positions, mesh.normals, mesh.texcoords),
+                                  return_index=True, return_inverse=True)
+    keep, remap = _first_use_order(inverse.reshape(-1), first)
+    removed = mesh.vertex_count - len(keep)
+    if removed == 0:
+        return 0
+
+    mesh.positions = mesh.positions[keep]
+    mesh.normals = mesh.normals[keep] if mesh.normals is not None else None
+    mesh.texcoords = mesh.texcoords[keep] if mesh.texcoords is not None else None
+    mesh.indices = remap[mesh.indices].astype(np.uint32)
+    return removed
+
+
+def compute_normals(mesh):
+    """
+    Sets a smooth normal on every vertex without one (all of them if the OBJ has no normals).
+    Face normals are weighted by area and summed by position, so the normals stay smooth across
+    texture seams. Returns the number of normals computed.
+    """
+    missing = np.ones(mesh.vertex_count, dtype=bool)
+    if mesh.normals is not None:
+        missing = ~np.any(mesh.normals != 0, axis=1)
+    if not missing.any():
+        return 0
+
+    # The cross product has the length of twice the area of the triangle
+    corners = mesh.positions[mesh.indices]
+    face_normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]).astype(np.float64)
+
+    _, position_ids = np.unique(_vertex_keys(mesh.positions), return_inverse=True)
+    position_ids = position_ids.reshape(-1)
+    corner_ids = position_ids[mesh.indices].reshape(-1)
+    sums = np.stack([np.bincount(corner_ids, weights=np.repeat(face_normals[:, axis], 3), minlength=position_ids.max() + 1)
+                     for axis in range(3)], axis=1)
+
+    # Vertices only used by degenerate triangles point along Z
+    lengths = np.linalg.norm(sums, axis=1)
+    sums[lengths == 0] = (0.0, 0.0, 1.0)
+    lengths[lengths == 0] = 1.0
+    normals = (sums / lengths[:, None]).astype(np.float32)[position_ids]
+
+    if mesh.normals is None:
+        mesh.normals = normals
+    else:
+        mesh.normals = mesh.normals.copy()
+        mesh.normals[missing] = normals[missing]
+    return int(missing.sum())
+
+
+def average_cache_miss_ratio(indices, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Returns the vertices transformed per triangle (ACMR) with a FIFO cache, 3 is the worst and 0.5 the best possible.
+    """
+    flat = indices.reshape(-1).tolist()
+    if len(flat) == 0:
+        return 0.0
+    inserted = {}
+    misses = 0
+    for vertex in flat:
+        # A vertex is still cached if fewer than cache_size vertices were added after it
+        if misses - inserted.get(vertex, -cache_size - 1) > cache_size:
+            inserted[vertex] = misses
+            misses += 1
+    return misses / (len(flat) // 3)
+
+
+def tipsify(indices, vertex_count, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Returns the triangles reordered for a post-transform vertex cache of the given size.
+    Triangles are fanned around a vertex, the next vertex is a recently used one which will still
+    be cached once its remaining triangles are emitted, otherwise the most recent dead end.
+
+    Args:
+    - indices           : (T, 3) the triangles
+    - vertex_count      : the number of vertices the indices refer to
+    - cache_size        : the number of vertices in the cache
+    """
+    triangle_count = len(indices)
+    if triangle_count == 0:
+        return indices
+    flat = indices.reshape(-1).astype(np.int64)
+
+    # The triangles around each vertex
+    live = np.bincount(flat, minlength=vertex_count)
+    offsets = np.concatenate(([0], np.cumsum(live))).tolist()
+    adjacency = (np.argsort(flat, kind="stable") // 3).tolist()
+    live = live.tolist()
+    triangles = indices.tolist()
+
+    cache_time = [0] * vertex_count
+    emitted = [False] * triangle_count
+    dead_end = []
+    order = []
+    time = cache_size + 1
+    cursor = 0
+    fan = int(flat[0])
+
+    while fan >= 0:
+        candidates = []
+        for triangle in adjacency[offsets[fan]:offsets[fan + 1]]:
+            if emitted[triangle]:
+                continue
+            emitted[triangle] = True
+            order.append(triangle)
+            for vertex in triangles[triangle]:
+                dead_end.append(vertex)
+                candidates.append(vertex)
+                live[vertex] -= 1
+                if time - cache_time[vertex] > cache_size:
+                    cache_time[vertex] = time
+                    time += 1
+
+        # The candidate which has been in the cache longest and will still be there after its fan
+        fan = -1
+        best = -1
+        for vertex in candidates:
+            if live[vertex] > 0:
+                priority = 0
+                if time - cache_time[vertex] + 2 * live[vertex] <= cache_size:
+                    priority = time - cache_time[vertex]
+                if priority > best:
+                    best = priority
+                    fan = vertex
+
+        # Otherwise the most recent vertex with triangles left, then the next one in input order
+        while fan < 0 and dead_end:
+            vertex = dead_end.pop()
+            if live[vertex] > 0:
+                fan = vertex
+        while fan < 0 and cursor < vertex_count:
+            if live[cursor] > 0:
+                fan = cursor
+            cursor += 1
+
+    return indices[np.array(order, dtype=np.int64)]
+
+
+def optimize_vertex_cache(mesh, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Reorders the triangles of each group for the vertex cache and then the vertices by first use,
+    so vertices are also fetched in order.
+    """
+    for group in mesh.groups:
+        mesh.indices[group.start:group.start + group.count] = tipsify(mesh.indices[group.start:group.start + group.count],
+                                                                      mesh.vertex_count, cache_size)
+
+    _, first, inverse = np.unique(mesh.indices.reshape(-1), return_index=True, return_inverse=True)
+    keep, remap = _first_use_order(inverse.reshape(-1), first)
+    vertices = mesh.indices.reshape(-1)[keep]
+    mesh.positions = mesh.positions[vertices]
+    mesh.normals = mesh.normals[vertices] if mesh.normals is not None else None
+    mesh.texcoords = mesh.texcoords[vertices] if mesh.texcoords is not None else None
+    mesh.indices = remap.reshape(-1, 3).astype(np.uint32)
+
+
+def optimize_mesh(mesh, optimization=DEFAULT_OPTIMIZATION, geometry=None):
+    """
+    Welds the vertices, computes the missing normals and optionally orders the mesh for the vertex
+    cache, in place. Returns an OptimizationReport, see format_report.
+
+    Args:
+    - mesh              : the Mesh from build_mesh
+    - optimization      : the Optimization settings
+    - geometry          : the ObjGeometry the mesh was built from, to count the draw calls of the OBJ
+    """
+    vertices_before = mesh.vertex_count
+    draw_calls_before = obj_draw_calls(geometry) if geometry is not None else len(mesh.groups)
+
+    # Normals first, vertices which only differed by a missing normal can then be welded
+    normals_computed = compute_normals(mesh)
+    weld_vertices(mesh)
+
+    acmr_before = acmr_after = None
+    if optimization.vertex_cache:
+        acmr_before = average_cache_miss_ratio(mesh.indices, optimization.cache_size)
+        optimize_vertex_cache(mesh, optimization.cache_size)
+        acmr_after = average_cache_miss_ratio(mesh.indices, optimization.cache_size)
+
+    report = OptimizationReport(vertices_before, mesh.vertex_count, draw_calls_before, len(mesh.groups),
+                                normals_computed, acmr_before, acmr_after)
+    return report
+
+
+def format_report(report):
+    """
+    Formats an OptimizationReport as a short table of the counts before and after.
+    """
+    lines = [f"{'':<22}{'before':>12}{'after':>12}",
+             f"{'vertices':<22}{report.vertices_before:>12,}{report.vertices_after:>12,}",
+             f"{'draw calls':<22}{report.draw_calls_before:>12,}{report.draw_calls_after:>12,}"]
+    if report.acmr_before is not None:
+        lines.append(f"{'ACMR':<22}{report.acmr_before:>12.3f}{report.acmr_after:>12.3f}")
+    if report.normals_computed:
+        lines.append(f"Computed {report.normals_computed:,} normals")
+    return "\n".join(lines)
@@ -0,0 +1,687 @@
+#!/usr/bin/env python3
+"""
+Streaming OBJ geometry parser.
+
+The OBJ file is read in fixed size chunks which are cut at line boundaries. Each chunk is
+classified line by line with NumPy (no Python object per vertex or face is created) and the
+numbers are parsed in bulk with np.fromstring. The results are appended into growable typed
+buffers so that memory stays close to the size of the final float32/uint32 arrays.
+
+Large files are parsed by a pool of processes instead. The file is memory-mapped and split into
+byte ranges at line boundaries. A first pass counts the vertices and triangles of every range,
+which gives each range the global offsets of its output and the bases for its relative indices.
+The second pass parses the ranges in parallel straight into shared memory arrays of the exact size.
+
+Supported statements: v, vt, vn, f (triangles and polygons which are fan triangulated,
+v, v/vt, v//vn and v/vt/vn corners with positive or negative indices), usemtl, mtllib, o and g.
+"""
+import os
+import mmap
+import multiprocessing
+from itertools import repeat
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from os.path import getsize
+import numpy as np
+
+
+# The default amount of the OBJ file read and parsed at a time
+DEFAULT_CHUNK_SIZE = 1 << 22
+
+# The value stored in an index buffer for a missing texture coordinate/normal
+MISSING_INDEX = 0xFFFFFFFF
+
+# Files at least this large are parsed by a pool of processes when there is more than one core
+PARALLEL_THRESHOLD = 1 << 28
+
+# The size of the byte ranges a file is split into for the pool, each worker holds the temporaries of one
+DEFAULT_RANGE_SIZE = DEFAULT_CHUNK_SIZE
+
+# The arrays the pool parses into: the name, its width, its type and which count gives its length
+_SHARED_ARRAYS = (("positions", 3, np.float32, 0), ("texcoords", 2, np.float32, 1), ("normals", 3, np.float32, 2),
+                  ("position_index", 3, np.uint32, 3), ("texcoord_index", 3, np.uint32, 3), ("normal_index", 3, np.uint32, 3))
+
+# Line kinds
+_OTHER, _V, _VT, _VN, _F, _STATE = range(6)
+
+# ASCII codes used while classifying lines
+_NEWLINE, _SPACE, _TAB, _CR, _SLASH = 10, 32, 9, 13, 47
+_WHITESPACE = np.array([_SPACE, _TAB, _CR, _NEWLINE], dtype=np.uint8)
+_INDENT = np.array([_SPACE, _TAB], dtype=np.uint8)
+
+# A range of triangles which share a material or object name
+Group = namedtuple("Group", ["name", "start", "count"])
+
+# A usemtl/o/g/mtllib statement found at a given (block local) triangle index
+Marker = namedtuple("Marker", ["keyword", "value", "triangle"])
+
+
+class GrowableArray:
+    """
+    A 2D typed array which grows by doubling so that appending chunks is amortised O(1)
+    and never holds more than twice the final size.
+    """
+
+    def __init__(self, width, dtype, capacity=1024):
+        self.width = width
+        self.size = 0
+        self.data = np.empty((capacity, width), dtype=dtype)
+
+    def __len__(self):
+        return self.size
+
+    def reserve(self, capacity):
+        if capacity <= len(self.data):
+            return
+        new_capacity = max(capacity, 2 * len(self.data))
+        data = np.empty((new_capacity, self.width), dtype=self.data.dtype)
+        data[:self.size] = self.data[:self.size]
+        self.data = data
+
+    def extend(self, values):
+        values = np.asarray(values).reshape(-1, self.width)
+        self.reserve(self.size + len(values))
+        self.data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    def fill(self, count, value):
+        self.reserve(self.size + count)
+        self.data[self.size:self.size + count] = value
+        self.size += count
+
+    def array(self):
+        """
+        Returns the used part of the buffer, the spare capacity is released.
+        """
+        if len(self.data) != self.size:
+            self.data = self.data[:self.size].copy()
+        return self.data
+
+
+class ObjBlock:
+    """
+    The geometry parsed from one block of OBJ text. Index buffers are 0-based and are
+    already offset by the vertex counts of the blocks before it.
+    """
+
+    def __init__(self, positions, texcoords, normals, position_index, texcoord_index, normal_index, markers):
+        self.positions      = positions
+        self.texcoords      = texcoords
+        self.normals        = normals
+        self.position_index = position_index
+        self.texcoord_index = texcoord_index
+        self.normal_index   = normal_index
+        self.markers        = markers
+
+    @property
+    def triangle_count(self):
+        return len(self.position_index)
+
+
+class ObjGeometry:
+    """
+    The geometry of a whole OBJ file.
+
+    Attributes:
+    - positions         : (N, 3) float32 vertex positions
+    - texcoords         : (M, 2) float32 texture coordinates
+    - normals           : (K, 3) float32 normals
+    - position_index    : (T, 3) uint32 position index of each triangle corner
+    - texcoord_index    : (T, 3) uint32 texture coordinate indices or None, MISSING_INDEX where a face has none
+    - normal_index      : (T, 3) uint32 normal indices or None, MISSING_INDEX where a face has none
+    - material_groups   : list of Group for each usemtl run of triangles
+    - object_groups     : list of Group for each o/g run of triangles
+    - mtllibs           : the material libraries referenced with mtllib
+    """
+
+    def __init__(self, positions, texcoords, normals, position_index, texcoord_index, normal_index,
+                 material_groups, object_groups, mtllibs):
+        self.positions          = positions
+        self.texcoords          = texcoords
+        self.normals            = normals
+        self.position_index     = position_index
+        self.texcoord_index     = texcoord_index
+        self.normal_index       = normal_index
+        self.material_groups    = material_groups
+        self.object_groups      = object_groups
+        self.mtllibs            = mtllibs
+
+    @property
+    def vertex_count(self):
+        return len(self.positions)
+
+    @property
+    def triangle_count(self):
+        return len(self.position_index)
+
+    @property
+    def nbytes(self):
+        arrays = [self.positions, self.texcoords, self.normals, self.position_index,
+                  self.texcoord_index, self.normal_index]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+
+def _line_starts(buf):
+    # Start offset of each non-empty line
+    starts = np.flatnonzero(buf == _NEWLINE) + 1
+    starts = np.concatenate((np.zeros(1, dtype=starts.dtype), starts))
+    return starts[starts < len(buf)]
+
+
+def _skip_indent(buf, starts):
+    """
+    Returns the offset of the first character after the indentation of each line, OBJLoader trims
+    lines so indented statements count like any other.
+    """
+    firsts = starts.copy()
+    indented = np.flatnonzero(np.isin(buf[firsts], _INDENT))
+    while len(indented):
+        firsts[indented] += 1
+        indented = indented[firsts[indented] < len(buf)]
+        indented = indented[np.isin(buf[firsts[indented]], _INDENT)]
+    return np.minimum(firsts, len(buf) - 1)
+
+
+def _classify_lines(buf, firsts):
+    n = len(buf)
+    c0 = buf[firsts]
+    c1 = buf[np.minimum(firsts + 1, n - 1)]
+    c1 = np.where(firsts + 1 < n, c1, _NEWLINE)
+    c1_space = np.isin(c1, _WHITESPACE)
+
+    kinds = np.full(len(firsts), _OTHER, dtype=np.uint8)
+    is_v = c0 == ord('v')
+    kinds[is_v & c1_space] = _V
+    kinds[is_v & (c1 == ord('t'))] = _VT
+    kinds[is_v & (c1 == ord('n'))] = _VN
+    kinds[(c0 == ord('f')) & c1_space] = _F
+    is_state = np.isin(c0, np.frombuffer(b"uomg", dtype=np.uint8))
+    kinds[is_state] = _STATE
+    return kinds
+
+
+def _payload(buf, firsts, lengths, kinds, kind, prefix):
+    """
+    Returns the bytes of every line of the given kind with the keyword removed, lines stay
+    separated by their newline. The keyword is found at the first character after the indentation.
+    """
+    mask = np.repeat(kinds == kind, lengths)
+    line_starts = firsts[kinds == kind]
+    for i in range(prefix):
+        mask[line_starts + i] = False
+    return buf[mask]
+
+
+def _token_counts(text, line_count):
+    """
+    Counts the whitespace separated tokens on each line of the text.
+    """
+    if line_count == 0:
+        return np.zeros(0, dtype=np.int64)
+    is_space = np.isin(text, _WHITESPACE)
+    previous_space = np.concatenate(([True], is_space[:-1]))
+    token_starts = ~is_space & previous_space
+    line_ids = np.cumsum(text == _NEWLINE)
+    return np.bincount(line_ids[token_starts], minlength=line_count)[:line_count]
+
+
+def _parse_floats(text, line_count, width, keyword):
+    """
+    Parses the vertex attribute lines, keeping only the first width values of each line
+    (e.g. the optional w of a position or vertex colours are dropped).
+    """
+    if line_count == 0:
+        return np.zeros((0, width), dtype=np.float32)
+
+    values = np.fromstring(text.tobytes(), dtype=np.float32, sep=' ')
+    if len(values) == line_count * width:
+        return values.reshape(-1, width)
+
+    counts = _token_counts(text, line_count)
+    if len(values) != counts.sum() or (counts < width).any():
+        raise ValueError(f"Malformed '{keyword}' statement in OBJ file")
+    offsets = np.cumsum(counts) - counts
+    return values[offsets[:, None] + np.arange(width)]
+
+
+def _parse_corners_slow(text):
+    # Fallback for blocks which mix corner formats e.g. "f 1/1 2/2 3/3" and "f 4//4 5//5 6//6"
+    corners = []
+    for line in text.tobytes().split(b"\n"):
+        for token in line.split():
+            parts = token.split(b"/")
+            corner = [int(p) if p else 0 for p in parts[:3]]
+            corners.append(corner + [0] * (3 - len(corner)))
+    return np.array(corners, dtype=np.int64).reshape(-1, 3)
+
+
+def _parse_corners(text, corner_count):
+    """
+    Parses the face corners to a (C, 3) array of raw (v, vt, vn) OBJ indices, 0 where missing.
+    """
+    corners = np.zeros((corner_count, 3), dtype=np.int64)
+    if corner_count == 0:
+        return corners
+
+    slashes = text == _SLASH
+    slash_count = int(slashes.sum())
+
+    # Use the first corner to work out the format of the block
+    not_space = ~np.isin(text, _WHITESPACE)
+    first = int(np.argmax(not_space))
+    length = int(np.argmin(not_space[first:])) if not not_space[first:].all() else len(text) - first
+    first_corner = text[first:first + length].tobytes()
+    per_corner = first_corner.count(b"/")
+    skips_texcoord = b"//" in first_corner
+    double_slashes = int((slashes[:-1] & slashes[1:]).sum())
+
+    if slash_count != per_corner * corner_count or double_slashes != (corner_count if skips_texcoord else 0):
+        return _parse_corners_slow(text)
+
+    spaced = text.copy()
+    spaced[slashes] = _SPACE
+    width = per_corner if skips_texcoord else per_corner + 1
+    values = np.fromstring(spaced.tobytes(), dtype=np.int64, sep=' ')
+    if len(values) != corner_count * width:
+        return _parse_corners_slow(text)
+    values = values.reshape(-1, width)
+
+    if skips_texcoord:
+        corners[:, 0] = values[:, 0]
+        corners[:, 2] = values[:, 1]
+    else:
+        corners[:, :width] = values
+    return corners
+
+
+def _resolve_indices(raw, counts_before):
+    """
+    Converts raw 1-based/negative OBJ indices to 0-based indices, missing (0) becomes -1.
+    """
+    resolved = raw - 1
+    negative = raw < 0
+    if negative.any():
+        resolved[negative] = counts_before[negative] + raw[negative]
+    resolved[raw == 0] = -1
+    return resolved
+
+
+def _to_index_buffer(resolved):
+    out = resolved.astype(np.uint32)
+    out[resolved < 0] = MISSING_INDEX
+    return out
+
+
+def parse_obj_block(data, v_base=0, vt_base=0, vn_base=0):
+    """
+    Parses a block of complete OBJ lines.
+
+    Args:
+    - data              : bytes (or a buffer) holding whole lines of the OBJ file
+    - v_base            : number of positions in the file before this block
+    - vt_base           : number of texture coordinates in the file before this block
+    - vn_base           : number of normals in the file before this block
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if len(buf) == 0:
+        empty = np.zeros((0, 3), dtype=np.uint32)
+        return ObjBlock(np.zeros((0, 3), np.float32), np.zeros((0, 2), np.float32),
+                        np.zeros((0, 3), np.float32), empty, None, None, [])
+
+    starts = _line_starts(buf)
+    lengths = np.diff(np.append(starts, len(buf)))
+    firsts = _skip_indent(buf, starts)
+    kinds = _classify_lines(buf, firsts)
+
+    # Vertex attributes
+    positions = _parse_floats(_payload(buf, firsts, lengths, kinds, _V, 1), int((kinds == _V).sum()), 3, "v")
+    texcoords = _parse_floats(_payload(buf, firsts, lengths, kinds, _VT, 2), int((kinds == _VT).sum()), 2, "vt")
+    normals = _parse_floats(_payload(buf, firsts, lengths, kinds, _VN, 2), int((kinds == _VN).sum()), 3, "vn")
+
+    # Faces
+    is_face = kinds == _F
+    face_lines = np.flatnonzero(is_face)
+    face_text = _payload(buf, firsts, lengths, kinds, _F, 1)
+    corner_counts = _token_counts(face_text, len(face_lines))
+    if (corner_counts < 3).any():
+        raise ValueError("Malformed 'f' statement in OBJ file, faces need at least 3 vertices")
+    corners = _parse_corners(face_text, int(corner_counts.sum()))
+
+    # The number of each attribute defined before every face line (for negative indices)
+    indices = []
+    for column, (kind, base) in enumerate(((_V, v_base), (_VT, vt_base), (_VN, vn_base))):
+        raw = corners[:, column]
+        if not raw.any():
+            indices.append(None)
+            continue
+        before = (np.cumsum(kinds == kind) - (kinds == kind))[face_lines] + base
+        indices.append(_resolve_indices(raw, np.repeat(before, corner_counts)))
+
+    # Fan triangulate the polygons
+    triangle_counts = corner_counts - 2
+    triangle_count = int(triangle_counts.sum())
+    corner_offsets = np.cumsum(corner_counts) - corner_counts
+    triangle_offsets = np.cumsum(triangle_counts) - triangle_counts
+    face_of_triangle = np.repeat(np.arange(len(face_lines)), triangle_counts)
+    first = corner_offsets[face_of_triangle]
+    step = np.arange(triangle_count) - triangle_offsets[face_of_triangle]
+    triangle_corners = np.stack((first, first + step + 1, first + step + 2), axis=1)
+
+    index_buffers = [None if index is None else _to_index_buffer(index[triangle_corners]) for index in indices]
+    if index_buffers[0] is None:
+        index_buffers[0] = np.zeros((0, 3), dtype=np.uint32)
+
+    markers = _block_markers(buf, starts, lengths, kinds, face_lines, triangle_counts)
+    return ObjBlock(positions, texcoords, normals, index_buffers[0], index_buffers[1], index_buffers[2], markers)
+
+
+def _block_markers(buf, starts, lengths, kinds, face_lines, triangle_counts):
+    # usemtl, mtllib, o and g statements are rare so these are decoded in Python
+    markers = []
+    state_lines = np.flatnonzero(kinds == _STATE)
+    if len(state_lines):
+        line_triangles = np.zeros(len(kinds), dtype=np.int64)
+        line_triangles[face_lines] = triangle_counts
+        triangles_before = np.cumsum(line_triangles) - line_triangles
+        for line in state_lines:
+            text = buf[starts[line]:starts[line] + lengths[line]].tobytes().decode("utf-8", "replace").strip()
+            parts = text.split(None, 1)
+            if parts[0] in ("usemtl", "mtllib", "o", "g"):
+                value = parts[1].strip() if len(parts) > 1 else ""
+                markers.append(Marker(parts[0], value, int(triangles_before[line])))
+    return markers
+
+
+def iter_obj_chunks(file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields chunks of the open binary file which always end on a line boundary.
+    """
+    remainder = b""
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        chunk = remainder + chunk
+        cut = chunk.rfind(b"\n") + 1
+        if cut == 0:
+            remainder = chunk
+            continue
+        remainder = chunk[cut:]
+        yield chunk[:cut]
+
+    if remainder:
+        yield remainder + b"\n"
+
+
+def _markers_to_groups(markers, keywords, triangle_count):
+    groups = []
+    current = None
+    start = 0
+    for marker in markers:
+        if marker.keyword not in keywords:
+            continue
+        if marker.triangle > start:
+            groups.append(Group(current, start, marker.triangle - start))
+        start = marker.triangle
+        current = marker.value
+    if triangle_count > start:
+        groups.append(Group(current, start, triangle_count - start))
+    return groups
+
+
+class ObjGeometryBuilder:
+    """
+    Accumulates parsed blocks (in file order) into the buffers of an ObjGeometry.
+    """
+
+    def __init__(self):
+        self.positions      = GrowableArray(3, np.float32)
+        self.texcoords      = GrowableArray(2, np.float32)
+        self.normals        = GrowableArray(3, np.float32)
+        self.position_index = GrowableArray(3, np.uint32)
+        self.texcoord_index = None
+        self.normal_index   = None
+        self.markers        = []
+
+    def _extend_index(self, buffer, values, triangle_count):
+        # Create the buffer the first time it is needed, faces before then have no value
+        if values is None:
+            if buffer is not None:
+                buffer.fill(triangle_count, MISSING_INDEX)
+            return buffer
+        if buffer is None:
+            buffer = GrowableArray(3, np.uint32)
+            buffer.fill(len(self.position_index), MISSING_INDEX)
+        buffer.extend(values)
+        return buffer
+
+    def add(self, block):
+        triangle_base = len(self.position_index)
+        self.positions.extend(block.positions)
+        self.texcoords.extend(block.texcoords)
+        self.normals.extend(block.normals)
+        self.texcoord_index = self._extend_index(self.texcoord_index, block.texcoord_index, block.triangle_count)
+        self.normal_index = self._extend_index(self.normal_index, block.normal_index, block.triangle_count)
+        self.position_index.extend(block.position_index)
+        self.markers.extend(m._replace(triangle=m.triangle + triangle_base) for m in block.markers)
+
+    @property
+    def counts(self):
+        return len(self.positions), len(self.texcoords), len(self.normals)
+
+    def build(self):
+        triangle_count = len(self.position_index)
+        return ObjGeometry(
+            positions=self.positions.array(),
+            texcoords=self.texcoords.array(),
+            normals=self.normals.array(),
+            position_index=self.position_index.array(),
+            texcoord_index=None if self.texcoord_index is None else self.texcoord_index.array(),
+            normal_index=None if self.normal_index is None else self.normal_index.array(),
+            material_groups=_markers_to_groups(self.markers, ("usemtl",), triangle_count),
+            object_groups=_markers_to_groups(self.markers, ("o", "g"), triangle_count),
+            mtllibs=[m.value for m in self.markers if m.keyword == "mtllib"])
+
+
+def count_obj_block(data):
+    """
+    Returns the number of positions, texture coordinates, normals and triangles in a block of
+    complete OBJ lines, without parsing any numbers.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if len(buf) == 0:
+        return 0, 0, 0, 0
+
+    starts = _line_starts(buf)
+    lengths = np.diff(np.append(starts, len(buf)))
+    firsts = _skip_indent(buf, starts)
+    kinds = _classify_lines(buf, firsts)
+    face_count = int((kinds == _F).sum())
+    corner_counts = _token_counts(_payload(buf, firsts, lengths, kinds, _F, 1), face_count)
+    if (corner_counts < 3).any():
+        raise ValueError("Malformed 'f' statement in OBJ file, faces need at least 3 vertices")
+    return int((kinds == _V).sum()), int((kinds == _VT).sum()), int((kinds == _VN).sum()), int((corner_counts - 2).sum())
+
+
+def scan_obj_block(data):
+    """
+    Summarises a block of complete OBJ lines without building any index buffer. Returns the number
+    of positions, texture coordinates, normals, faces and triangles, the minimum, maximum and float64
+    sum of the positions (None without positions) and the markers, with triangles counted from the
+    start of the block.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if len(buf) == 0:
+        return (0, 0, 0, 0, 0), None, None, None, []
+
+    starts = _line_starts(buf)
+    lengths = np.diff(np.append(starts, len(buf)))
+    firsts = _skip_indent(buf, starts)
+    kinds = _classify_lines(buf, firsts)
+    positions = _parse_floats(_payload(buf, firsts, lengths, kinds, _V, 1), int((kinds == _V).sum()), 3, "v")
+
+    face_lines = np.flatnonzero(kinds == _F)
+    corner_counts = _token_counts(_payload(buf, firsts, lengths, kinds, _F, 1), len(face_lines))
+    if (corner_counts < 3).any():
+        raise ValueError("Malformed 'f' statement in OBJ file, faces need at least 3 vertices")
+    triangle_counts = corner_counts - 2
+
+    counts = (len(positions), int((kinds == _VT).sum()), int((kinds == _VN).sum()), len(face_lines), int(triangle_counts.sum()))
+    markers = _block_markers(buf, starts, lengths, kinds, face_lines, triangle_counts)
+    if len(positions) == 0:
+        return counts, None, None, None, markers
+    return counts, positions.min(axis=0), positions.max(axis=0), positions.sum(axis=0, dtype=np.float64), markers
+
+
+def split_lines(buffer, range_size=DEFAULT_RANGE_SIZE):
+    """
+    Returns (start, end) byte ranges of about range_size covering the buffer, each ending on a line boundary.
+    """
+    ranges = []
+    start = 0
+    while start < len(buffer):
+        end = buffer.find(b"\n", min(start + range_size, len(buffer)) - 1)
+        end = len(buffer) if end == -1 else end + 1
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _read_range(obj_file, start, end):
+    # Only the range is read from the mapping, the last line of the file may have no newline
+    with open(obj_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        data = mapped[start:end]
+    return data if data.endswith(b"\n") else data + b"\n"
+
+
+def _count_range(obj_file, start, end):
+    return count_obj_block(_read_range(obj_file, start, end))
+
+
+def _parse_range(obj_file, start, end, bases, arrays):
+    """
+    Parses one range into the shared arrays. Returns its markers and whether its faces have
+    texture coordinate and normal indices.
+    """
+    block = parse_obj_block(_read_range(obj_file, start, end), bases[0], bases[1], bases[2])
+    values = {"positions": block.positions, "texcoords": block.texcoords, "normals": block.normals,
+              "position_index": block.position_index, "texcoord_index": block.texcoord_index,
+              "normal_index": block.normal_index}
+
+    for name, width, dtype, count in _SHARED_ARRAYS:
+        if values[name] is None or len(values[name]) == 0:
+            continue
+        shared_name, rows = arrays[name]
+        memory = SharedMemory(name=shared_name)
+        try:
+            view = np.ndarray((rows, width), dtype=dtype, buffer=memory.buf)
+            view[bases[count]:bases[count] + len(values[name])] = values[name]
+            del view
+        finally:
+            memory.close()
+
+    return block.markers, block.texcoord_index is not None, block.normal_index is not None
+
+
+def parse_obj_parallel(obj_file, workers=None, range_size=DEFAULT_RANGE_SIZE):
+    """
+    Parses an OBJ file with a pool of processes into the same ObjGeometry as parse_obj. Peak memory
+    is the output arrays plus a range per worker, the text of the file is never held in full.
+
+    Args:
+    - obj_file          : path to the OBJ file
+    - workers           : the number of processes, all cores by default
+    - range_size        : the number of bytes each task parses
+    """
+    with open(obj_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        ranges = split_lines(mapped, range_size)
+    starts, ends = [r[0] for r in ranges], [r[1] for r in ranges]
+
+    # Workers share the tracker of this process, their own would unlink the shared arrays when they exit
+    if os.name == "posix":
+        resource_tracker.ensure_running()
+
+    shared = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            # Count pass, the offsets of each range's output and the bases of its relative indices
+            counts = np.array(list(executor.map(_count_range, repeat(obj_file), starts, ends)), dtype=np.int64).reshape(-1, 4)
+            bases = np.cumsum(counts, axis=0) - counts
+            totals = counts.sum(axis=0)
+
+            arrays = {}
+            for name, width, dtype, count in _SHARED_ARRAYS:
+                rows = int(totals[count])
+                shared[name] = SharedMemory(create=True, size=max(rows * width * np.dtype(dtype).itemsize, 1))
+                arrays[name] = (shared[name].name, rows)
+
+            # Parse pass, straight into the shared arrays
+            results = list(executor.map(_parse_range, repeat(obj_file), starts, ends, bases.tolist(), repeat(arrays)))
+
+        markers = [m._replace(triangle=m.triangle + int(base)) for (range_markers, _, _), base in zip(results, bases[:, 3])
+                   for m in range_markers]
+        has_index = {"texcoord_index": [r[1] for r in results], "normal_index": [r[2] for r in results]}
+
+        # Copy each array out of shared memory and free it before the next, so at most one is held twice
+        geometry = {}
+        for name, width, dtype, count in _SHARED_ARRAYS:
+            rows = arrays[name][1]
+            if name in has_index and not any(has_index[name]):
+                geometry[name] = None
+            else:
+                view = np.ndarray((rows, width), dtype=dtype, buffer=shared[name].buf)
+                # Faces without the index are missing it, as in the serial parser
+                if name in has_index:
+                    for present, base, triangles in zip(has_index[name], bases[:, 3], counts[:, 3]):
+                        if not present:
+                            view[base:base + triangles] = MISSING_INDEX
+                geometry[name] = view.copy()
+                del view
+            memory = shared.pop(name)
+            memory.close()
+            memory.unlink()
+    finally:
+        for memory in shared.values():
+            memory.close()
+            memory.unlink()
+
+    triangle_count = int(totals[3])
+    return ObjGeometry(material_groups=_markers_to_groups(markers, ("usemtl",), triangle_count),
+                       object_groups=_markers_to_groups(markers, ("o", "g"), triangle_count),
+                       mtllibs=[m.value for m in markers if m.keyword == "mtllib"],
+                       **geometry)
+
+
+def default_workers(obj_file):
+    """
+    Returns the number of processes to parse the file with, one unless the file is large, there
+    is more than one core and this is not already a worker process (e.g. of a batch).
+    """
+    cores = os.cpu_count() or 1
+    if cores == 1 or multiprocessing.parent_process() is not None or getsize(obj_file) < PARALLEL_THRESHOLD:
+        return 1
+    return cores
+
+
+def parse_obj(obj_file, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """
+    Parses an OBJ file into compact NumPy buffers.
+
+    Args:
+    - obj_file          : path to the OBJ file
+    - chunk_size        : the number of bytes read and parsed at a time
+    - workers           : the number of processes to parse with, by default a pool is only used for large files
+    """
+    workers = workers if workers is not None else default_workers(obj_file)
+    if workers > 1 and getsize(obj_file) > 0:
+        return parse_obj_parallel(obj_file, workers)
+
+    builder = ObjGeometryBuilder()
+    with open(obj_file, 'rb') as f:
+        for chunk in iter_obj_chunks(f, chunk_size):
+            v_base, vt_base, vn_base = builder.counts
+            builder.add(parse_obj_block(chunk, v_base, vt_base, vn_base))
+
+    return builder.build()
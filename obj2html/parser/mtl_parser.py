@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import os
+from os.path import dirname, abspath, join, isabs, realpath
+
+
+# Statements which reference a texture file (compared in lower case)
+MAP_KEYWORDS = ("map_ka", "map_kd", "map_ks", "map_ke", "map_ns", "map_d", "map_bump", "bump", "disp", "decal",
+                "norm", "refl", "map_pr", "map_pm", "map_ps", "map_rma", "map_orm")
+
+# The number of arguments taken by each texture option, (minimum, maximum)
+MAP_OPTIONS = {"-blendu": (1, 1), "-blendv": (1, 1), "-bm": (1, 1), "-boost": (1, 1), "-cc": (1, 1),
+               "-clamp": (1, 1), "-imfchan": (1, 1), "-mm": (2, 2), "-o": (1, 3), "-s": (1, 3), "-t": (1, 3),
+               "-texres": (1, 1), "-type": (1, 1)}
+
+
+def _is_number(token):
+    try:
+        float(token)
+        return True
+    except ValueError:
+        return False
+
+
+def is_map_keyword(keyword):
+    return keyword.lower() in MAP_KEYWORDS
+
+
+def tokenize_map(value):
+    """
+    Splits the arguments of a texture statement e.g. '-s 1 1 1 -bm 0.5 my texture.png'
+    into the option tokens and the file name (which may contain spaces).
+    """
+    tokens = value.split()
+    i = 0
+    while i < len(tokens) and tokens[i] in MAP_OPTIONS:
+        minimum, maximum = MAP_OPTIONS[tokens[i]]
+        i += 1 + minimum
+        # Options such as -s take up to three numbers
+        taken = minimum
+        while taken < maximum and i < len(tokens) - 1 and _is_number(tokens[i]):
+            i += 1
+            taken += 1
+
+    return tokens[:i], " ".join(tokens[i:])
+
+
+def resolve_texture(texture_path, mtl_dir):
+    """
+    Resolves a texture path relative to the directory of the MTL file, URLs are left alone.
+    """
+    if "://" in texture_path or isabs(texture_path):
+        return texture_path
+    return join(mtl_dir, texture_path.replace("\\", os.sep))
+
+
+def texture_key(texture_path):
+    # Different relative paths to the same texture map to the same key
+    return texture_path if "://" in texture_path else realpath(texture_path)
+
+
+def parse_mtl(mtl_file):
+    """
+    Reads a MTL file into a dictionary of material name to its statements.
+    Texture paths are resolved relative to the MTL file.
+
+    Args:
+    - mtl_file          : path to the MTL file
+    """
+    mtl_dir = dirname(abspath(mtl_file))
+    materials = {}
+    current = None
+
+    with open(mtl_file, 'r') as f:
+        for line in f:
+            parts = line.strip().split(None, 1)
+            if len(parts) == 0 or parts[0].startswith("#"):
+                continue
+
+            keyword = parts[0]
+            value = parts[1].strip() if len(parts) > 1 else ""
+            if keyword == "newmtl":
+                current = {}
+                materials[value] = current
+            elif current is not None:
+                if is_map_keyword(keyword):
+                    _, texture_path = tokenize_map(value)
+                    value = resolve_texture(texture_path, mtl_dir)
+                current[keyword] = value
+
+    return materials
+
+
+def find_textures(mtl_file):
+    """
+    Returns every texture referenced by the MTL file, resolved relative to it. Textures shared by
+    several materials or statements are only listed once.
+    """
+    mtl_dir = dirname(abspath(mtl_file))
+    textures = {}
+    with open(mtl_file, 'r') as f:
+        for line in f:
+            parts = line.strip().split(None, 1)
+            if len(parts) == 2 and is_map_keyword(parts[0]):
+                _, texture_path = tokenize_map(parts[1])
+                if texture_path:
+                    texture_path = resolve_texture(texture_path, mtl_dir)
+                    textures.setdefault(texture_key(texture_path), texture_path)
+
+    return list(textures.values())
+
+
+def rewrite_mtl(mtl_file, texture_links, out_file):
+    """
+    Writes a copy of the MTL file with every texture replaced by its link, options are kept.
+
+    Args:
+    - mtl_file          : the MTL file to rewrite
+    - texture_links     : dictionary of the texture paths from find_textures to their link
+    - out_file          : where to write the new MTL file
+    """
+    mtl_dir = dirname(abspath(mtl_file))
+    links = {texture_key(texture_path): link for texture_path, link in texture_links.items()}
+    lines = []
+    with open(mtl_file, 'r') as f:
+        for line in f:
+            parts = line.strip().split(None, 1)
+            if len(parts) == 2 and is_map_keyword(parts[0]):
+                options, texture_path = tokenize_map(parts[1])
+                key = texture_key(resolve_texture(texture_path, mtl_dir))
+                if key in links:
+                    line = " ".join([parts[0]] + options + [links[key]]) + "\n"
+            lines.append(line)
+
+    with open(out_file, 'w') as f:
+        f.write("".join(lines))
+
+    return out_file
+
+
+def material_colour(material, keyword="Kd", default=(0.8, 0.8, 0.8)):
+    """
+    Returns the RGB colour of a statement such as Kd as floats.
+    """
+    if keyword not in material:
+        return default
+    values = [float(v) for v in material[keyword].split()[:3]]
+    return tuple(values + [values[-1]] * (3 - len(values)))
+
+
+def material_opacity(material):
+    """
+    Returns the opacity from either d or Tr (which is 1 - d).
+    """
+    if "d" in material:
+        return float(material["d"].split()[0])
+    if "Tr" in material:
+        return 1.0 - float(material["Tr"].split()[0])
+    return 1.0
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Inspection of an OBJ file in one pass over a memory map, a range of lines at a time so memory stays
+bounded whatever the size of the file: the counts, the bounding box and centroid of the positions,
+the triangles of each material and an estimate of the GPU memory the page needs.
+
+The camera of the page is framed from the bounding box, so --min_camera, --max_camera and --z_pos
+do not have to be found by trial and error. Results are cached in the config directory by the hash
+of the file, so converting the same model again does not scan it again.
+"""
+import os
+import json
+import math
+import mmap
+import time
+import tempfile
+from collections import namedtuple
+from os.path import join, exists, getsize
+import numpy as np
+from obj2html.parser.geometry_parser import scan_obj_block, split_lines, DEFAULT_RANGE_SIZE
+from obj2html.utils.canvas_utils import get_config_dir
+from obj2html.utils.upload_cache import file_digest
+
+
+# What an inspection found, materials is a list of [name, triangles] in order of first use
+ModelStats = namedtuple("ModelStats", ["vertices", "texcoords", "normals", "faces", "triangles", "minimum", "maximum",
+                                       "centroid", "materials", "mtllibs", "gpu_bytes"])
+
+# The camera settings of the template
+CameraFraming = namedtuple("CameraFraming", ["min_camera", "max_camera", "z_pos"])
+
+# The settings used when the model has no positions or is not a local file
+DEFAULT_FRAMING = CameraFraming(2, 1000, 250)
+
+# The vertical field of view of the template's camera in degrees
+CAMERA_FOV = 45
+
+# Space left around the model, how far the camera can zoom out and how close it can get before clipping
+FRAMING_MARGIN = 1.1
+FAR_FACTOR = 4
+NEAR_FACTOR = 0.01
+
+# Increased when ModelStats changes so older cache entries are not used
+INSPECT_VERSION = 1
+MAX_CACHE_ENTRIES = 1000
+
+
+def get_inspect_cache_file():
+    return join(get_config_dir(), "inspect_cache.json")
+
+
+def gpu_bytes(vertices, texcoords, normals, triangles):
+    """
+    Estimates the bytes of vertex and index buffers on the GPU. OBJLoader makes a position, normal
+    and (with texture coordinates) uv for every corner of every triangle. The bin format shares
+    vertices, of which there are about as many as the largest attribute count.
+    """
+    stride = 24 + (8 if texcoords > 0 else 0)
+    shared_vertices = max(vertices, texcoords, normals)
+    index_size = 2 if shared_vertices < 65536 else 4
+    return {"obj": triangles * 3 * stride, "bin": shared_vertices * stride + triangles * 3 * index_size}
+
+
+def inspect_obj(obj_file, range_size=DEFAULT_RANGE_SIZE):
+    """
+    Scans the OBJ file and returns its ModelStats.
+
+    Args:
+    - obj_file          : path to the OBJ file
+    - range_size        : the number of bytes scanned at a time
+    """
+    counts = np.zeros(5, dtype=np.int64)
+    minimum = maximum = None
+    position_sum = np.zeros(3, dtype=np.float64)
+    materials = {}
+    mtllibs = []
+    material = None
+    material_start = 0
+
+    if getsize(obj_file) > 0:
+        with open(obj_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start, end in split_lines(mapped, range_size):
+                data = mapped[start:end]
+                # Pages already scanned are dropped from the mapping, they would otherwise count towards memory
+                if hasattr(mmap, "MADV_DONTNEED"):
+                    page_start = start - start % mmap.PAGESIZE
+                    mapped.madvise(mmap.MADV_DONTNEED, page_start, end - page_start)
+                block_counts, block_min, block_max, block_sum, markers = scan_obj_block(data if data.endswith(b"\n") else data + b"\n")
+
+                # Each usemtl ends the run of triangles of the material before it
+                for marker in markers:
+                    if marker.keyword == "usemtl":
+                        triangle = int(counts[4]) + marker.triangle
+                        materials[material] = materials.get(material, 0) + triangle - material_start
+                        material, material_start = marker.value, triangle
+                    elif marker.keyword == "mtllib":
+                        mtllibs.append(marker.value)
+
+                counts += block_counts
+                if block_min is not None:
+                    minimum = block_min if minimum is None else np.minimum(minimum, block_min)
+                    maximum = block_max if maximum is None else np.maximum(maximum, block_max)
+                    position_sum += block_sum
+
+    materials[material] = materials.get(material, 0) + int(counts[4]) - material_start
+    vertices, texcoords, normals, faces, triangles = (int(c) for c in counts)
+    return ModelStats(vertices, texcoords, normals, faces, triangles,
+                      minimum.tolist() if minimum is not None else None,
+                      maximum.tolist() if maximum is not None else None,
+                      (position_sum / vertices).tolist() if vertices > 0 else None,
+                      [[name, count] for name, count in materials.items() if count > 0],
+                      mtllibs,
+                      gpu_bytes(vertices, texcoords, normals, triangles))
+
+
+def _read_cache(cache_file):
+    if not exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"WARNING: The inspection cache {cache_file} could not be read and is ignored.")
+        return {}
+
+
+def _write_cache(entries, cache_file):
+    # Only the most recent entries are kept, written whole so parallel conversions never leave a partial file
+    entries = dict(sorted(entries.items(), key=lambda item: item[1]["time"])[-MAX_CACHE_ENTRIES:])
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix=".tmp")
+    with os.fdopen(fd, 'w') as f:
+        json.dump(entries, f)
+    os.replace(temp_file, cache_file)
+
+
+def cached_inspect(obj_file, cache_file=None, use_cache=True):
+    """
+    Returns the ModelStats of the OBJ file, from the cache if a file with the same contents was inspected before.
+
+    Args:
+    - obj_file          : path to the OBJ file
+    - cache_file        : the JSON file of the cache, defaults to the config directory
+    - use_cache         : whether to read and update the cache
+    """
+    if not use_cache:
+        return inspect_obj(obj_file)
+
+    cache_file = cache_file if cache_file is not None else get_inspect_cache_file()
+    key = f"{INSPECT_VERSION}:{file_digest(obj_file)}"
+    entries = _read_cache(cache_file)
+    if key in entries:
+        return ModelStats(**entries[key]["stats"])
+
+    stats = inspect_obj(obj_file)
+    entries[key] = {"time": time.time(), "stats": stats._asdict()}
+    _write_cache(entries, cache_file)
+    return stats
+
+
+def _round(value):
+    # Three significant figures are plenty for camera settings and easy to read
+    return float(f"{value:.3g}")
+
+
+def camera_framing(stats, fov=CAMERA_FOV):
+    """
+    Returns the CameraFraming which shows the whole model. The camera is on the Z axis looking at
+    the origin, so it is placed where the sphere around the origin holding the bounding box fits
+    the field of view.
+    """
+    if stats is None or stats.minimum is None:
+        return DEFAULT_FRAMING
+    radius = float(np.linalg.norm(np.maximum(np.abs(stats.minimum), np.abs(stats.maximum))))
+    if radius == 0:
+        return DEFAULT_FRAMING
+
+    z_pos = radius / math.sin(math.radians(fov) / 2) * FRAMING_MARGIN
+    return CameraFraming(_round(z_pos * NEAR_FACTOR), _round((z_pos + radius) * FAR_FACTOR), _round(z_pos))
+
+
+def _vector(values):
+    return "(" + ", ".join(f"{v:.4g}" for v in values) + ")"
+
+
+def format_stats(obj_file, stats, framing=None):
+    """
+    Formats the ModelStats and the camera settings as a short report.
+    """
+    framing = framing if framing is not None else camera_framing(stats)
+    lines = [obj_file,
+             f"  {'vertices':<14}{stats.vertices:,} positions, {stats.texcoords:,} texture coordinates, {stats.normals:,} normals",
+             f"  {'faces':<14}{stats.faces:,} ({stats.triangles:,} triangles)"]
+    if stats.minimum is not None:
+        size = np.subtract(stats.maximum, stats.minimum)
+        lines += [f"  {'bounds':<14}{_vector(stats.minimum)} to {_vector(stats.maximum)}, size {_vector(size)}",
+                  f"  {'centroid':<14}{_vector(stats.centroid)}"]
+    if stats.mtllibs:
+        lines.append(f"  {'mtllib':<14}{', '.join(stats.mtllibs)}")
+    materials = ", ".join(f"{name if name is not None else '(none)'} ({count:,})" for name, count in stats.materials)
+    lines += [f"  {'materials':<14}{len(stats.materials)}: {materials}",
+              f"  {'GPU memory':<14}{stats.gpu_bytes['obj'] / 1e6:,.1f} MB as OBJ, about {stats.gpu_bytes['bin'] / 1e6:,.1f} MB as bin/glb",
+              f"  {'camera':<14}--min_camera {framing.min_camera:g} --max_camera {framing.max_camera:g} --z_pos {framing.z_pos:g}"]
+    return "\n".join(lines)
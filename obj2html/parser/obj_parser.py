@@ -1,7 +1,22 @@
 #!/usr/bin/env python3
-from os import chdir, getcwd
-from os.path import exists, dirname, abspath
-from obj2html.utils.canvas_utils import file_to_link, autoconvert_files, convert_mtl_file
+import json
+import time
+from functools import partial
+from os.path import dirname, abspath, basename, splitext, getsize, join
+from obj2html.utils.canvas_utils import file_to_link, autoconvert_files, UploadSession
+from obj2html.utils.upload_cache import UploadCache
+from obj2html.parser.geometry_export import convert_geometry, load_mesh, BINARY_FORMATS
+from obj2html.parser.geometry_encoding import Quantization, DECODER_JS, format_errors
+from obj2html.parser.geometry_optimize import Optimization, DEFAULT_CACHE_SIZE, format_report
+from obj2html.parser.geometry_bvh import build_bvh, write_bvh, BVH_JS
+from obj2html.parser.annotation_parser import load_annotations, snap_annotations, annotation_entries, annotations_json, ANNOTATIONS_JS
+from obj2html.parser.obj_inspect import cached_inspect, camera_framing, DEFAULT_FRAMING
+from obj2html.parser.geometry_chunks import CHUNKS_FORMAT, CHUNKS_JS, DEFAULT_PIXEL_ERROR, convert_chunks, format_chunks
+from obj2html.parser.render_engine import get_engine
+from obj2html.utils.texture_utils import TextureSettings, optimize_texture_to, optimize_mtl_textures
+from obj2html.utils.trace_utils import span, traced
+from obj2html.utils.bundle_utils import page_modules, module_imports, import_map, file_data_url, mtl_data_url
+from obj2html.utils.runtime_utils import hash_file_name, split_page, write_runtime, shell_page
 
 
 def load_raw_template(template_file, environment):
@@ -14,51 +29,134 @@ def load_raw_template(template_file, environment):
     return template
 
 
-def obj_to_html(args, environment):
+def build_template_context(title, min_camera, max_camera, z_pos, obj_file, texture_file=None, mtl_file=None,
+                           output_format="obj", texture_loader="THREE.TextureLoader", quantization=None, bundle=False,
+                           chunk_index=None, annotations=None, bvh_file=None, shared_runtime=False):
     """
-    OBJ-TO-HTML Converter:
-    This function will take in the arguments (mandatory being the OBJ and the outfile) and then parse the template given the files.
+    Builds the context the template is rendered with, including the JavaScript which loads the model.
+
     Args:
-    - args:     the arguments including the (max and min camera sizes, the mtl file, template files, title, object files and output name)
+    - title             : the title of the page
+    - min_camera        : the minimum distance for the camera
+    - max_camera        : the maximum distance for the camera
+    - z_pos             : the Z coordinate of the camera
+    - obj_file          : the link or path of the geometry (OBJ, GLB or bin), unused for chunks
+    - texture_file      : the link or path of the texture
+    - mtl_file          : the link or path of the MTL file
+    - output_format     : the format of the geometry, one of obj, glb, bin or chunks
+    - texture_loader    : the three.js loader used for the texture
+    - quantization      : the Quantization of a bin file, if set the decoder is included
+    - bundle            : whether to inline the three.js modules so the page works offline
+    - chunk_index       : the index of the chunks, with the link of each chunk as its url
+    - annotations       : the list of Annotation to show over the model
+    - bvh_file          : the link or path of the BVH used to pick the model
+    - shared_runtime    : whether the values of the page are read from its viewer_config, so the
+                          script is the same for every page of the same kind
     """
-    obj_file            = args.obj_file
-    out_file            = args.output
-    title               = args.title
-    min_camera          = str(args.min_camera)
-    max_camera          = str(args.max_camera)
-    z_pos               = str(args.z_pos)
-    texture_file         = args.texture
-    mtl_file            = args.mtl_file
-    template_file       = args.template_file
+    # The values which differ between pages, written into the script or read from the page's config
+    viewer_config = {}
 
-    # Load the template
-    template = load_raw_template(template_file, environment)
+    def page_value(name, value, literal):
+        if not shared_runtime:
+            return literal
+        viewer_config[name] = value
+        return "viewerConfig." + name
 
-    # Autoconvert files to canvas links if required
-    if args.auto_convert:
-        obj_file, texture_file, mtl_file = autoconvert_files(obj_file, texture_file, mtl_file, args.access_token, args.directory, args.prefix, args.course_number)
+    def page_url(name, url):
+        return page_value(name, url, "'" + url + "'")
 
     # This is the context that will be sent through to the template
     template_context = {"title": title,
-                "min_camera": min_camera,
-                "max_camera": max_camera,
-                "z_pos": z_pos}
+                "min_camera": page_value("min_camera", min_camera, str(min_camera)),
+                "max_camera": page_value("max_camera", max_camera, str(max_camera)),
+                "z_pos": page_value("z_pos", z_pos, str(z_pos)),
+                "decoder_str": DECODER_JS if quantization is not None else "",
+                "chunks_str": CHUNKS_JS if output_format == CHUNKS_FORMAT else "",
+                "annotations_str": "",
+                "viewer_config": viewer_config}
+
+    # The annotations are set up once the page has loaded, with picking if there is a BVH
+    if annotations or bvh_file is not None:
+        bvh_url = page_url("bvh_file", bvh_file) if bvh_file is not None else "null"
+        annotations_str = page_value("annotations", annotation_entries(annotations or []), annotations_json(annotations or []))
+        template_context["annotations_str"] = (ANNOTATIONS_JS + (BVH_JS if bvh_file is not None else "") + """
+      setupAnnotations( """ + annotations_str + """, """ + bvh_url + """ );
+""")
+
+    # If this is a GLB file (materials and textures are embedded)
+    if output_format == "glb":
+        template_context.update({"obj_file": obj_file,
+                             "load_str": """
+    var loader = new GLTFLoader();
+    loader.setCrossOrigin("");
+    loader.load( """ + page_url("obj_file", obj_file) + """, function ( gltf ) {
+        object = gltf.scene;
+        object.traverse( function ( child ) {
+            if ( child.isMesh ) sceneMeshes.push( child );
+        });
+        scene.add( object );
+    }, onProgress, onError);
+    """})
+
+    # If this is the raw buffer format, or chunks of it, materials come from the MTL/texture file
+    elif output_format in ("bin", CHUNKS_FORMAT):
+        if output_format == CHUNKS_FORMAT:
+            load_call = "loadChunks( " + page_value("chunk_index", chunk_index, json.dumps(chunk_index)) + ", createMaterial );"
+        else:
+            load_call = "loadBuffers( " + page_url("obj_file", obj_file) + ", createMaterial, addMesh );"
+
+        if mtl_file is not None:
+            template_context.update({"obj_file": obj_file,
+                                 "mtl_file": mtl_file,
+                                 "load_str": """
+    var manager = new THREE.LoadingManager();
+    manager.addHandler( /\.dds$/i, new DDSLoader() );
+    manager.setURLModifier( inlineURL );
+    new MTLLoader( manager )
+        .load( """ + page_url("mtl_file", mtl_file) + """, function ( materials ) {
+            materials.preload();
+            function createMaterial( name ) {
+                return materials.create( name );
+            }
+            """ + load_call + """
+        } );
+    """})
+        elif texture_file is not None:
+            template_context.update({"obj_file": obj_file,
+                                 "texture_file": texture_file,
+                                 "load_str": """
+    textureLoader = new """ + texture_loader + """();
+    texture       = textureLoader.load(""" + page_url("texture_file", texture_file) + """);
+    material      = new THREE.MeshPhysicalMaterial( { map : texture } );
+    function createMaterial( name ) {
+        return material;
+    }
+    """ + load_call + """
+    """})
+        else:
+            template_context.update({"obj_file": obj_file,
+                                 "load_str": """
+    function createMaterial( name ) {
+        return new THREE.MeshPhongMaterial();
+    }
+    """ + load_call + """
+    """})
 
     # If this is a OBJ + Texture
-    if texture_file is not None and mtl_file is None:
-        template_context.update({"texture_file": texture_url,
+    elif texture_file is not None and mtl_file is None:
+        template_context.update({"texture_file": texture_file,
                              "obj_file": obj_file,
                              "load_str": """
     var manager = new THREE.LoadingManager(loadModel);
     manager.onProgress = function ( item, loaded, total ) {
         console.log( item, loaded, total );
     };
-    textureLoader = new THREE.TextureLoader(manager);
-    texture       = textureLoader.load('""" + texture_file + """');
+    textureLoader = new """ + texture_loader + """(manager);
+    texture       = textureLoader.load(""" + page_url("texture_file", texture_file) + """);
     material      = new THREE.MeshPhysicalMaterial( { map : texture } );
     loader        = new OBJLoader(manager);
     loader.setCrossOrigin("");
-    loader.load( '""" + obj_file + """', function ( obj ) {
+    loader.load( """ + page_url("obj_file", obj_file) + """, function ( obj ) {
         object = obj;
     }, onProgress, onError);
     """})
@@ -72,14 +170,15 @@ def obj_to_html(args, environment):
     // loading MTL ontop of OBJ
     var manager   = new THREE.LoadingManager();
     manager.addHandler( /\.dds$/i, new DDSLoader() );
+    manager.setURLModifier( inlineURL );
     // Uncomment if you need to use TGA textures
     // manager.addHandler( /\.tga$/i, new TGALoader() );
     var mtlLoader = new MTLLoader( manager )
-        .load( \'""" + mtl_file + """\', function ( materials ) {
+        .load( """ + page_url("mtl_file", mtl_file) + """, function ( materials ) {
             materials.preload();
             new OBJLoader( manager )
                 .setMaterials( materials )
-                .load( \'""" + obj_file + """\', function ( object ) {
+                .load( """ + page_url("obj_file", obj_file) + """, function ( object ) {
                     scene.add( object );
                 }, onProgress, onError );
         } );
@@ -88,23 +187,228 @@ def obj_to_html(args, environment):
     # If this is an OBJ file conversion
     else:
         template_context['load_str'] = """var loader = new OBJLoader();
-        loader.load( \'""" + obj_file + """\', function ( obj ) {
+        loader.load( """ + page_url("obj_file", obj_file) + """, function ( obj ) {
             object = obj;
             scene.add(object);
         }, onProgress, onError);
     """
 
-    # TODO
-    # If we need to load any annotations...
-    annotations = False
-    if annotations:
-        read_js_template = "";
-        load_str = """
-        """
+    # Only the loaders the page uses are imported, inlined from the vendored copies when bundling
+    modules = page_modules(template_context["load_str"])
+    template_context["loader_imports"] = module_imports(modules)
+    template_context["import_map"] = import_map(modules) if bundle else ""
+
+    return template_context
+
+
+@traced()
+def obj_to_html(args, environment=None, template=None):
+    """
+    OBJ-TO-HTML Converter:
+    This function will take in the arguments (mandatory being the OBJ and the outfile) and then parse the template given the files.
+    Args:
+    - args:     the arguments including the (max and min camera sizes, the mtl file, template files, title, object files and output name)
+    - environment: a Jinja2 environment to compile the template with, by default the process wide RenderEngine is used which caches compiled templates
+    - template: an already compiled template, if given the template file is not re-read
+
+    Returns the reports of the conversion (e.g. the camera settings it framed the model with, warnings and the counts before and after optimizing) for the caller to print.
+    """
+    obj_file            = args.obj_file
+    out_file            = args.output
+    title               = args.title
+    min_camera          = args.min_camera
+    max_camera          = args.max_camera
+    z_pos               = args.z_pos
+    texture_file         = args.texture
+    mtl_file            = args.mtl_file
+    template_file       = args.template_file
+    output_format       = args.output_format
+    quantization        = None
+    if args.quantize:
+        quantization = Quantization(args.position_bits, args.normal_bits, args.uv_bits)
+    optimization        = None
+    if args.optimize_geometry:
+        optimization = Optimization(args.vertex_cache, DEFAULT_CACHE_SIZE)
+    reports             = []
+
+    # Load the template unless the caller has already compiled it
+    with span("template_load", template_file=template_file):
+        if template is None and environment is not None:
+            template = load_raw_template(template_file, environment)
+        elif template is None:
+            template = get_engine().get_template(template_file)
+
+    # Downscale and transcode the textures into the output directory, results are cached by content
+    if args.optimize_textures:
+        with span("optimize_textures"):
+            settings = TextureSettings(args.texture_max_size, not args.no_power_of_two, args.texture_format)
+            out_dir = dirname(abspath(out_file))
+            # Linked textures are not downloaded, they are loaded as they are
+            if texture_file is not None and "://" in texture_file:
+                reports.append(f"WARNING: Texture {texture_file} is a link and is not optimized.")
+            elif texture_file is not None:
+                texture_file = optimize_texture_to(texture_file, settings, out_dir)
+            if mtl_file is not None:
+                mtl_file = optimize_mtl_textures(mtl_file, settings, out_dir)
+
+    # DDS textures are compressed and need their own loader
+    texture_loader = "THREE.TextureLoader"
+    if texture_file is not None and texture_file.lower().endswith(".dds"):
+        texture_loader = "DDSLoader"
+
+    # View settings which were not given frame the camera around the model, the scan is cached by the file's hash
+    if None in (min_camera, max_camera, z_pos):
+        framing = DEFAULT_FRAMING
+        if "://" not in obj_file:
+            with span("inspect", bytes_read=getsize(obj_file)):
+                framing = camera_framing(cached_inspect(obj_file))
+        min_camera = framing.min_camera if min_camera is None else min_camera
+        max_camera = framing.max_camera if max_camera is None else max_camera
+        z_pos = framing.z_pos if z_pos is None else z_pos
+        reports.append(f"Camera: --min_camera {min_camera:g} --max_camera {max_camera:g} --z_pos {z_pos:g}")
+
+    # The BVH is built over the OBJ as given, the annotations are snapped onto its surface
+    annotations = None
+    bvh = None
+    bvh_file = None
+    if (args.annotations is not None or args.bvh) and "://" in obj_file:
+        reports.append(f"WARNING: {obj_file} is a link, no BVH is built so annotations are not snapped and picking is off.")
+    elif args.annotations is not None or args.bvh:
+        with span("build_bvh", bytes_read=getsize(obj_file)) as s:
+            bvh = build_bvh(load_mesh(obj_file)[0])
+            bvh_file = write_bvh(bvh, splitext(out_file)[0] + ".bvh")
+            s.set(nodes=len(bvh.nodes), bytes_written=getsize(bvh_file))
+    if args.annotations is not None:
+        annotations = load_annotations(args.annotations)
+        if bvh is not None and not args.no_snap_annotations:
+            annotations = snap_annotations(annotations, bvh)
+
+    # Convert the OBJ to a binary format written next to the HTML file, or write the optimized OBJ there
+    generated_geometry = output_format in BINARY_FORMATS or (output_format == "obj" and optimization is not None)
+    if generated_geometry:
+        geometry_file = splitext(out_file)[0] + ("_optimized.obj" if output_format == "obj" else "." + output_format)
+        with span("convert_geometry", format=output_format, bytes_read=getsize(obj_file)) as s:
+            obj_file, report, errors = convert_geometry(obj_file, geometry_file, output_format, mtl_file, texture_file, quantization, optimization)
+            s.set(bytes_written=getsize(obj_file))
+        if report is not None:
+            reports.append(format_report(report))
+        if errors is not None:
+            reports.append(f"Quantization error: {format_errors(errors)}")
+
+        # The GLB has the materials and textures embedded
+        if output_format == "glb":
+            texture_file = None
+            mtl_file = None
+
+    # Split the OBJ into an octree of chunks written to a folder next to the HTML file
+    chunk_index = None
+    chunk_files = []
+    if output_format == CHUNKS_FORMAT:
+        chunk_dir = splitext(out_file)[0] + "_chunks"
+        with span("convert_chunks", bytes_read=getsize(obj_file)) as s:
+            chunk_index, report = convert_chunks(obj_file, chunk_dir, args.chunk_triangles, quantization, optimization)
+            chunk_files = [join(chunk_dir, node["file"]) for node in chunk_index["nodes"]]
+            s.set(chunks=len(chunk_files), bytes_written=sum(getsize(f) for f in chunk_files))
+        if report is not None:
+            reports.append(format_report(report))
+        reports.append(format_chunks(chunk_index))
+        chunk_index["budget"] = args.chunk_budget
+        chunk_index["pixelError"] = DEFAULT_PIXEL_ERROR
+        obj_file = None
+
+    # Files written next to the page get content-hashed names so they can be cached as immutable,
+    # optimized textures are already named by the hash of the original
+    if args.shared_viewer:
+        with span("hash_names"):
+            if generated_geometry:
+                obj_file = hash_file_name(obj_file)
+            if bvh_file is not None:
+                bvh_file = hash_file_name(bvh_file)
+            chunk_files = [hash_file_name(f) for f in chunk_files]
+            if chunk_index is not None:
+                for node, chunk_file in zip(chunk_index["nodes"], chunk_files):
+                    node["file"] = basename(chunk_file)
+                with open(join(chunk_dir, "index.json"), 'w') as f:
+                    json.dump(chunk_index, f)
+
+    def page_context(obj_file, texture_file, mtl_file, bvh_file):
+        return build_template_context(title, min_camera, max_camera, z_pos, obj_file, texture_file, mtl_file,
+                                      output_format, texture_loader, quantization, args.bundle, chunk_index,
+                                      annotations, bvh_file, args.shared_viewer)
+
+    # The stylesheet and script move into the runtime shared by the pages in the output directory. The runtime
+    # reads the links from the page's config, so it is written before the uploads and uploaded along with them
+    page = None
+    runtime_files = []
+    if args.shared_viewer:
+        with span("render"):
+            page = split_page(template.render(page_context(obj_file, texture_file, mtl_file, bvh_file)))
+        if page is None:
+            reports.append(f"WARNING: {template_file} has no <style> and <script type=\"module\">, the page keeps its own copy of the viewer.")
+        else:
+            with span("write_runtime") as s:
+                runtime_files = list(write_runtime(page, dirname(abspath(out_file))))
+                s.set(bytes_written=sum(getsize(f) for f in runtime_files))
+
+    # Autoconvert files to canvas links if required
+    if args.auto_convert:
+        cache = None if args.no_cache else UploadCache(validate=args.validate_cache)
+        start = time.perf_counter()
+        try:
+            with span("upload"), UploadSession(max_workers=args.upload_workers) as session:
+                # Every upload runs on the session's pool, the OBJ, texture and MTL uploads are queued behind these
+                upload = partial(file_to_link, access_token=args.access_token, directory=args.directory, prefix=args.prefix,
+                                 course_num=args.course_number, cache=cache, session=session)
+                chunk_futures = [session.submit(upload, f) for f in chunk_files]
+                runtime_futures = [session.submit(upload, f) for f in runtime_files]
+                bvh_future = session.submit(upload, bvh_file) if bvh_file is not None else None
+                obj_file, texture_file, mtl_file = autoconvert_files(obj_file, texture_file, mtl_file, args.access_token, args.directory, args.prefix, args.course_number, cache, session)
+
+                chunk_urls = [future.result() for future in chunk_futures]
+                runtime_files = [future.result() for future in runtime_futures]
+                bvh_file = bvh_future.result() if bvh_future is not None else None
+                session.print_summary(time.perf_counter() - start)
+        finally:
+            # The links of the uploads which finished are kept even when another upload failed
+            if cache is not None:
+                cache.save()
+    elif args.inline_geometry:
+        # Embed the geometry, MTL and textures in the page so it makes no requests for them
+        with span("inline_geometry"):
+            obj_file = file_data_url(obj_file) if obj_file is not None else None
+            chunk_urls = [file_data_url(f) for f in chunk_files]
+            bvh_file = file_data_url(bvh_file) if bvh_file is not None else None
+            texture_file = file_data_url(texture_file) if texture_file is not None else None
+            mtl_file = mtl_data_url(mtl_file) if mtl_file is not None else None
+    else:
+        # Generated files sit next to the HTML file so reference them relatively
+        chunk_urls = [basename(dirname(f)) + "/" + basename(f) for f in chunk_files]
+        runtime_files = [basename(f) for f in runtime_files]
+        bvh_file = basename(bvh_file) if bvh_file is not None else None
+        if generated_geometry:
+            obj_file = basename(obj_file)
+        if args.optimize_textures:
+            texture_file = basename(texture_file) if texture_file is not None and "://" not in texture_file else texture_file
+            mtl_file = basename(mtl_file) if mtl_file is not None else None
+
+    # Each chunk is loaded from its link
+    if chunk_index is not None:
+        for node, url in zip(chunk_index["nodes"], chunk_urls):
+            node["url"] = url
+
+    with span("build_context"):
+        template_context = page_context(obj_file, texture_file, mtl_file, bvh_file)
+
+    # Create the HTML and output this, a shared viewer page links its runtime and holds its values
+    if page is not None:
+        css_file, js_file = runtime_files
+        html = shell_page(page, css_file, js_file, template_context["viewer_config"])
+    else:
+        with span("render"):
+            html = template.render(template_context)
 
-    # Create the HTML and output this
-    html = template.render(template_context)
-    with open(f'{out_file}', 'w') as f:
-        f.write(html)
+    with span("write", bytes_written=len(html)):
+        with open(f'{out_file}', 'w') as f:
+            f.write(html)
 
-    return
+    return reports
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import os
+import threading
+from collections import OrderedDict
+from os.path import abspath, dirname, basename, join, getmtime
+import jinja2
+from obj2html.utils.canvas_utils import get_config_dir
+
+
+# The template used when none is given
+DEFAULT_TEMPLATE = "./templates/default.html"
+
+# The number of compiled templates kept in memory
+DEFAULT_CACHE_SIZE = 32
+
+# The engine shared by every conversion in this process
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_bytecode_cache_dir():
+    return join(get_config_dir(), "jinja_cache")
+
+
+class RenderEngine:
+    """
+    A long-lived template renderer. Templates are loaded through a FileSystemLoader with the
+    compiled bytecode cached on disk, and compiled templates are kept in an LRU keyed by their
+    path and modification time so an edited template is picked up without a restart.
+
+    Args:
+    - cache_size        : the number of compiled templates kept in memory
+    - bytecode_cache_dir: where compiled bytecode is stored, None for the config directory
+    """
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, bytecode_cache_dir=None):
+        bytecode_cache_dir = bytecode_cache_dir if bytecode_cache_dir is not None else get_bytecode_cache_dir()
+        if not os.path.exists(bytecode_cache_dir):
+            os.makedirs(bytecode_cache_dir)
+
+        self.cache_size = cache_size
+        self.bytecode_cache = jinja2.FileSystemBytecodeCache(bytecode_cache_dir)
+        self.environments = {}
+        self.templates = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _environment(self, template_dir):
+        # One environment per template directory, they share the bytecode cache. Jinja's own template
+        # cache is off so the LRU below is the only copy in memory and an evicted template is freed
+        if template_dir not in self.environments:
+            self.environments[template_dir] = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(template_dir),
+                bytecode_cache=self.bytecode_cache,
+                cache_size=0,
+                auto_reload=False)
+        return self.environments[template_dir]
+
+    def get_template(self, template_file=DEFAULT_TEMPLATE):
+        """
+        Returns the compiled template, only compiling it when it is new or has changed on disk.
+        """
+        path = abspath(template_file)
+        key = (path, getmtime(path))
+        with self.lock:
+            if key in self.templates:
+                self.templates.move_to_end(key)
+                return self.templates[key]
+
+            environment = self._environment(dirname(path))
+
+            # An edited template has a new mtime, drop the compiled copies of the old one
+            for stale_key in [k for k in self.templates if k[0] == path]:
+                del self.templates[stale_key]
+
+            template = environment.get_template(basename(path))
+            self.templates[key] = template
+            while len(self.templates) > self.cache_size:
+                self.templates.popitem(last=False)
+            return template
+
+    def render(self, context, template_file=DEFAULT_TEMPLATE, encoding=None):
+        """
+        Renders the template with the context.
+
+        Args:
+        - context           : the template variables e.g. title, load_str, min_camera
+        - template_file     : the template to render
+        - encoding          : if given the HTML is returned as bytes in this encoding
+        """
+        html = self.get_template(template_file).render(context)
+        return html.encode(encoding) if encoding is not None else html
+
+
+def get_engine():
+    """
+    Returns the RenderEngine shared by the process.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RenderEngine()
+        return _engine
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+import os
+import csv
+import json
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os.path import exists, dirname, abspath, basename, splitext, join, isdir, relpath
+from obj2html.parser.obj_parser import obj_to_html
+from obj2html.parser.render_engine import get_engine
+
+
+# Manifest column names which map onto the argument names used by obj_to_html
+MANIFEST_ALIASES = {"obj": "obj_file",
+                    "mtl": "mtl_file",
+                    "texture_file": "texture",
+                    "out": "output",
+                    "output_file": "output"}
+
+# Per-row settings which can be given in a manifest
+JOB_FIELDS = ("obj_file", "output", "title", "min_camera", "max_camera", "z_pos", "texture", "mtl_file", "annotations")
+
+# Manifest fields which are paths relative to the manifest
+PATH_FIELDS = ("obj_file", "texture", "mtl_file", "annotations")
+
+# Manifest fields which should be read as floats
+FLOAT_FIELDS = ("min_camera", "max_camera", "z_pos")
+
+def load_manifest(manifest_file):
+    """
+    Reads a CSV or JSON manifest where each row/object describes one conversion.
+
+    Args:
+    - manifest_file     : path to the .csv or .json manifest
+    """
+    rows = []
+    if manifest_file.lower().endswith(".json"):
+        with open(manifest_file, 'r') as f:
+            rows = json.load(f)
+        if isinstance(rows, dict):
+            rows = rows.get("models", [])
+    else:
+        with open(manifest_file, 'r', newline='') as f:
+            rows = list(csv.DictReader(f))
+
+    base_dir = dirname(abspath(manifest_file))
+    jobs = []
+    for row in rows:
+        job = {}
+        for key, value in row.items():
+            if key is None:
+                continue
+            key = key.strip()
+            key = MANIFEST_ALIASES.get(key, key)
+
+            # Skip empty CSV cells so that the defaults are used
+            if key not in JOB_FIELDS or value is None or value == "":
+                continue
+
+            if key in PATH_FIELDS and not os.path.isabs(value) and "://" not in value:
+                value = join(base_dir, value)
+            elif key in FLOAT_FIELDS:
+                value = float(value)
+            job[key] = value
+
+        if "obj_file" not in job:
+            raise ValueError(f"Manifest row is missing an obj file: {row}")
+        jobs.append(job)
+
+    return jobs
+
+
+def glob_root(pattern):
+    """
+    Returns the directory of a glob pattern before its first wildcard e.g. models for models/**/*.obj
+    """
+    parts = pattern.replace(os.sep, "/").split("/")
+    fixed = []
+    for part in parts[:-1]:
+        if glob.has_magic(part):
+            break
+        fixed.append(part)
+    return "/".join(fixed) or "."
+
+
+def find_obj_files(source):
+    """
+    Finds the OBJ files for a directory or a glob pattern. A MTL file with the same
+    name as the OBJ file is picked up automatically. Each job is named by its path
+    relative to the directory the pattern starts from, so models in different
+    subdirectories with the same file name get different outputs.
+
+    Args:
+    - source            : a directory or a glob e.g. models/**/*.obj
+    """
+    pattern = join(source, "*.obj") if isdir(source) else source
+    root = glob_root(pattern)
+    jobs = []
+    for obj_file in sorted(glob.glob(pattern, recursive=True)):
+        job = {"obj_file": obj_file, "name": relpath(splitext(obj_file)[0], root)}
+        mtl_file = splitext(obj_file)[0] + ".mtl"
+        if exists(mtl_file):
+            job["mtl_file"] = mtl_file
+        jobs.append(job)
+
+    return jobs
+
+
+def collect_jobs(source):
+    """
+    Returns the list of conversions given either a manifest or a directory/glob.
+    """
+    if source.lower().endswith((".csv", ".json")) and exists(source):
+        return load_manifest(source)
+    return find_obj_files(source)
+
+
+def job_to_args(job, defaults, output_dir):
+    """
+    Builds the argument namespace expected by obj_to_html for a single job, falling
+    back to the batch wide settings for anything the job does not set.
+    """
+    stem = splitext(basename(job["obj_file"]))[0]
+    args = argparse.Namespace(**vars(defaults))
+    args.texture = None
+    args.mtl_file = None
+    args.title = stem
+    args.output = join(output_dir, job.get("name", stem) + ".html")
+    for key, value in job.items():
+        if key in JOB_FIELDS:
+            setattr(args, key, value)
+
+    return args
+
+
+def check_outputs(all_args):
+    """
+    Raises a ValueError when two jobs would write the same HTML file, and creates the
+    directories of the outputs.
+    """
+    owners = {}
+    for args in all_args:
+        output = abspath(args.output)
+        if output in owners:
+            raise ValueError(f"{owners[output]} and {args.obj_file} would both be written to {args.output}, "
+                             "set a different output for one of them in the manifest")
+        owners[output] = args.obj_file
+
+    for output in owners:
+        os.makedirs(dirname(output), exist_ok=True)
+
+
+def _init_worker(template_file):
+    # Compile the template once per worker (from the bytecode cache) rather than once per conversion
+    get_engine().get_template(template_file)
+
+
+def _convert_job(args):
+    start = time.perf_counter()
+    reports = []
+    try:
+        reports = obj_to_html(args)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    return {"obj_file": args.obj_file,
+            "output": args.output,
+            "ok": error is None,
+            "error": error,
+            "reports": reports,
+            "seconds": time.perf_counter() - start}
+
+
+def run_batch(jobs, defaults, output_dir, workers=None):
+    """
+    Converts all of the jobs over a process pool, the template is compiled once and
+    each worker loads it from the bytecode cache.
+
+    Args:
+    - jobs              : list of dicts as returned by collect_jobs
+    - defaults          : namespace with the batch wide settings (camera, template, Canvas)
+    - output_dir        : the directory to write HTML files to when a job has no output
+    - workers           : number of processes, defaults to the number of cores
+    """
+    all_args = [job_to_args(job, defaults, output_dir) for job in jobs]
+    check_outputs(all_args)
+
+    # Compile the template once up front so the workers find it in the bytecode cache
+    get_engine().get_template(defaults.template_file)
+
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(all_args)))
+
+    # Keep the summary in the same order as the jobs, a manifest can list the same OBJ more than once
+    results = [None] * len(all_args)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(defaults.template_file,)) as executor:
+        futures = {executor.submit(_convert_job, args): i for i, args in enumerate(all_args)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+
+def print_summary(results, total_seconds):
+    """
+    Prints the reports of each conversion and then the per file summary of a batch run.
+    """
+    for r in results:
+        for report in r["reports"]:
+            print(f"{r['obj_file']}:\n{report}\n")
+
+    width = max([len(r["obj_file"]) for r in results] + [8])
+    for r in results:
+        status = "OK" if r["ok"] else "FAILED"
+        print(f"{r['obj_file']:<{width}}  {status:<6}  {r['seconds']:8.3f}s  {r['output'] if r['ok'] else r['error']}")
+
+    succeeded = sum(1 for r in results if r["ok"])
+    print(f"\n{succeeded} succeeded, {len(results) - succeeded} failed, {len(results)} total in {total_seconds:.3f}s")
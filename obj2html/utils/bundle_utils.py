@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Offline bundles: the three.js modules a page needs are read from the vendored copies in the package,
+minified and inlined through an import map of data URLs, so the page makes no requests to a CDN.
+The template keeps importing the CDN URLs, the import map redirects each of them to its inlined copy.
+
+Only the loaders used by the page are included, e.g. an OBJ page has no MTLLoader or DDSLoader.
+"""
+import os
+import re
+import json
+import base64
+import mimetypes
+import tempfile
+import functools
+from os.path import join, dirname, abspath, exists
+from obj2html.parser.mtl_parser import find_textures, rewrite_mtl
+
+
+# The three.js release the template is written against
+THREE_VERSION = "0.132.2"
+CDN_ROOT = f"https://cdn.skypack.dev/three@{THREE_VERSION}"
+VENDOR_SOURCE = f"https://unpkg.com/three@{THREE_VERSION}"
+
+# The MIT license of three.js, vendored with the modules so the shipped copy carries it
+VENDOR_LICENSE = "LICENSE"
+
+# Module name to its path in the three.js release and how the template imports it
+MODULES = {"THREE": ("build/three.module.js", "import * as THREE from '{url}';"),
+           "OrbitControls": ("examples/jsm/controls/OrbitControls.js", "import {{ OrbitControls }} from '{url}';"),
+           "TWEEN": ("examples/jsm/libs/tween.module.min.js", "import {{ TWEEN }} from '{url}';"),
+           "CSS2DRenderer": ("examples/jsm/renderers/CSS2DRenderer.js", "import {{ CSS2DRenderer, CSS2DObject }} from '{url}';"),
+           "OBJLoader": ("examples/jsm/loaders/OBJLoader.js", "import {{ OBJLoader }} from '{url}';"),
+           "MTLLoader": ("examples/jsm/loaders/MTLLoader.js", "import {{ MTLLoader }} from '{url}';"),
+           "DDSLoader": ("examples/jsm/loaders/DDSLoader.js", "import {{ DDSLoader }} from '{url}';"),
+           "GLTFLoader": ("examples/jsm/loaders/GLTFLoader.js", "import {{ GLTFLoader }} from '{url}';"),
+           "Stats": ("examples/jsm/libs/stats.module.js", "import Stats from '{url}';")}
+
+# Modules imported by the template itself, the rest are only imported when the load string uses them
+CORE_MODULES = ("THREE", "OrbitControls", "TWEEN", "CSS2DRenderer")
+OPTIONAL_MODULES = ("OBJLoader", "MTLLoader", "DDSLoader", "GLTFLoader", "Stats")
+
+# The example modules import three.js relative to themselves
+_THREE_IMPORT = re.compile(r"""(from\s*|import\s*)(['"])[^'"]*build/three\.module\.js\2""")
+
+# A regular expression rather than a division can follow these characters and keywords
+_REGEX_PREFIX = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {"return", "typeof", "case", "in", "of", "new", "delete", "void", "throw", "else", "do",
+                   "instanceof", "yield", "await"}
+
+
+def get_vendor_dir():
+    return join(dirname(dirname(abspath(__file__))), "vendor", "three")
+
+
+def module_url(name):
+    return f"{CDN_ROOT}/{MODULES[name][0]}"
+
+
+def vendor_file(name, vendor_dir=None):
+    vendor_dir = vendor_dir if vendor_dir is not None else get_vendor_dir()
+    return join(vendor_dir, MODULES[name][0])
+
+
+def page_modules(load_str):
+    """
+    Returns the modules a page needs, the core modules and each optional module used by the load string.
+    """
+    used = [name for name in OPTIONAL_MODULES if re.search(rf"\b{name}\b", load_str)]
+    return list(CORE_MODULES) + used
+
+
+def module_imports(modules):
+    """
+    Returns the import statements of the optional modules for the template.
+    """
+    return "\n      ".join(MODULES[name][1].format(url=module_url(name)) for name in modules if name not in CORE_MODULES)
+
+
+def _is_identifier(char):
+    return char != "" and (char.isalnum() or char in "_$\\")
+
+
+def _needs_space(prev, nxt):
+    # Whitespace between two tokens can only be dropped when it does not join them
+    if _is_identifier(prev) and _is_identifier(nxt):
+        return True
+    if prev in "+-" and nxt in "+-" and prev != "" and nxt != "":
+        return True
+    return prev.isdigit() and nxt == "."
+
+
+def minify_js(source):
+    """
+    Removes the comments, indentation and blank lines of JavaScript. Strings, template literals and
+    regular expressions are copied as is and line breaks are kept so automatic semicolons still apply.
+    """
+    out = []
+    i = 0
+    n = len(source)
+    last = ""
+    last_word = ""
+    depth = 0
+    templates = []
+
+    def previous():
+        return out[-1][-1] if out and out[-1] else ""
+
+    while i < n:
+        c = source[i]
+
+        # Strings
+        if c in "'\"":
+            j = i + 1
+            while j < n and source[j] != c and source[j] != "\n":
+                j += 2 if source[j] == "\\" else 1
+            out.append(source[i:j + 1])
+            i, last, last_word = j + 1, c, ""
+            continue
+
+        # Template literals, a substitution returns to code until its closing brace
+        if c == "`" or (c == "}" and templates and templates[-1] == depth):
+            if c == "}":
+                templates.pop()
+            j = i + 1
+            while j < n and source[j] != "`" and not (source[j] == "$" and source[j + 1:j + 2] == "{"):
+                j += 2 if source[j] == "\\" else 1
+            if j < n and source[j] == "$":
+                templates.append(depth)
+                out.append(source[i:j + 2])
+                i, last, last_word = j + 2, "{", ""
+            else:
+                out.append(source[i:j + 1])
+                i, last, last_word = j + 1, "`", ""
+            continue
+
+        # Comments
+        if source.startswith("//", i):
+            j = source.find("\n", i)
+            i = n if j == -1 else j
+            continue
+        if source.startswith("/*", i):
+            j = source.find("*/", i + 2)
+            i = n if j == -1 else j + 2
+            if _needs_space(previous(), source[i:i + 1]):
+                out.append(" ")
+            continue
+
+        # Regular expressions
+        if c == "/" and (last == "" or last in _REGEX_PREFIX or last_word in _REGEX_KEYWORDS):
+            j = i + 1
+            in_class = False
+            while j < n and source[j] != "\n" and (in_class or source[j] != "/"):
+                if source[j] == "\\":
+                    j += 1
+                elif source[j] == "[":
+                    in_class = True
+                elif source[j] == "]":
+                    in_class = False
+                j += 1
+            j += 1
+            while j < n and source[j].isalnum():
+                j += 1
+            out.append(source[i:j])
+            i, last, last_word = j, ")", ""
+            continue
+
+        # Whitespace, runs with a line break become one line break
+        if c.isspace():
+            j = i
+            while j < n and source[j].isspace():
+                j += 1
+            if "\n" in source[i:j]:
+                if previous() not in ("", "\n"):
+                    out.append("\n")
+            elif _needs_space(previous(), source[j:j + 1]):
+                out.append(" ")
+            i = j
+            continue
+
+        # Identifiers, keywords and numbers
+        if _is_identifier(c):
+            j = i
+            while j < n and _is_identifier(source[j]):
+                j += 1
+            word = source[i:j]
+            out.append(word)
+            i, last, last_word = j, word[-1], word
+            continue
+
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+        out.append(c)
+        i, last, last_word = i + 1, c, ""
+
+    return "".join(out).strip() + "\n"
+
+
+def missing_vendor(modules=MODULES, vendor_dir=None):
+    """
+    Returns the paths of the vendored modules which have not been downloaded.
+    """
+    return [vendor_file(name, vendor_dir) for name in modules if not exists(vendor_file(name, vendor_dir))]
+
+
+def check_vendor(modules, vendor_dir=None):
+    """
+    Raises an error naming the vendored modules which are missing.
+    """
+    missing = missing_vendor(modules, vendor_dir)
+    if missing:
+        raise FileNotFoundError("The vendored three.js modules shipped with the package are missing, restore them "
+                                "with: python -m obj2html.obj2html_vendor\nMissing: " + ", ".join(missing))
+
+
+def data_url(data, mime):
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+@functools.lru_cache(maxsize=None)
+def module_data_url(name, vendor_dir=None):
+    """
+    Returns the minified module as a data URL, its import of three.js is pointed at the CDN URL
+    which the import map redirects to the inlined copy.
+    """
+    with open(vendor_file(name, vendor_dir), 'r', encoding='utf-8') as f:
+        source = f.read()
+    source = _THREE_IMPORT.sub(lambda m: f"{m.group(1)}'{module_url('THREE')}'", source)
+    return data_url(minify_js(source).encode("utf-8"), "text/javascript")
+
+
+def import_map(modules, vendor_dir=None):
+    """
+    Returns the import map script inlining the modules, it has to come before any module script.
+    """
+    check_vendor(modules, vendor_dir)
+    imports = {module_url(name): module_data_url(name, vendor_dir) for name in modules}
+
+    # Example modules also import three.js, so it is always mapped
+    imports.setdefault(module_url("THREE"), module_data_url("THREE", vendor_dir))
+    return f'<script type="importmap">{json.dumps({"imports": imports})}</script>'
+
+
+def file_data_url(file_path):
+    """
+    Returns the contents of a file as a data URL. DDS files are marked with a #.dds fragment so
+    the DDS loader is still chosen by the extension.
+    """
+    if "://" in file_path:
+        return file_path
+    mime = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    with open(file_path, 'rb') as f:
+        url = data_url(f.read(), mime)
+    return url + "#.dds" if file_path.lower().endswith(".dds") else url
+
+
+def mtl_data_url(mtl_file):
+    """
+    Returns the MTL file as a data URL, with each of its textures inlined as a data URL.
+    """
+    if "://" in mtl_file:
+        return mtl_file
+    texture_links = {}
+    for texture_path in find_textures(mtl_file):
+        if "://" in texture_path:
+            continue
+        if not exists(texture_path):
+            print(f"WARNING: Texture {texture_path} does not exist and is left as is.")
+            continue
+        texture_links[texture_path] = file_data_url(texture_path)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        inline_mtl = rewrite_mtl(mtl_file, texture_links, join(temp_dir, os.path.basename(mtl_file)))
+        with open(inline_mtl, 'rb') as f:
+            return data_url(f.read(), "text/plain")
+
+
+def fetch_vendor(vendor_dir=None, session=None):
+    """
+    Downloads every module in MODULES and the license from the pinned three.js release into the vendor
+    directory. Only used by maintainers to refresh the vendored copy, see obj2html_vendor.
+    """
+    import requests
+    vendor_dir = vendor_dir if vendor_dir is not None else get_vendor_dir()
+    session = session if session is not None else requests.Session()
+    for name, path in [(name, path) for name, (path, _) in MODULES.items()] + [("license", VENDOR_LICENSE)]:
+        out_file = join(vendor_dir, path)
+        if not exists(dirname(out_file)):
+            os.makedirs(dirname(out_file))
+        response = session.get(f"{VENDOR_SOURCE}/{path}", timeout=60)
+        response.raise_for_status()
+        with open(out_file, 'wb') as f:
+            f.write(response.content)
+        print(f"Downloaded {name:<14} {len(response.content) / 1e3:8.1f} KB  {out_file}")
@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
 import os
-from os.path import exists, dirname, abspath
+import time
+import tempfile
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join
 import requests
+from obj2html.parser.mtl_parser import find_textures, rewrite_mtl
+from obj2html.utils.trace_utils import span, traced
 
 
 def get_config_dir():
@@ -14,71 +21,261 @@ def get_config_dir():
     return home_path
 
 
-def convert_mtl_file(mtl_file, access_token, directory, prefix=None, course_num=None):
-    # Change the current path to be relative to the MTL file
-    # This is done so that users don't have to go into the file and
-    # modify the paths to be relative to the working direcotry
-    curr_path = abspath(getcwd())
-    chdir(dirname(abspath(mtl_file)))
+# Upload settings
+DEFAULT_UPLOAD_WORKERS = 8
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
 
-    # Update the MTL file with the link of the texture file
-    mtl_raw = None
-    with open(mtl_file, 'r') as f:
-        mtl_raw = f.readlines()
 
-    # Find the unique lines mapping to the texture files
-    map_kds = {}
+class MultipartFile:
+    """
+    A file-like multipart/form-data body which streams the file from disk instead of reading it into memory.
 
-    # Loop over finding lines that match the texture files
-    for i, line in enumerate(mtl_raw):
-        if "map_Kd" in line:
-            text_url = None
-            line = line.strip()
+    Args:
+    - fields            : the form fields sent before the file
+    - file_path         : the file to upload
+    - file_name         : the name given to the file part
+    """
+
+    def __init__(self, fields, file_path, file_name, block_size=1 << 16):
+        self.boundary = os.urandom(16).hex()
+        self.file_path = file_path
+        self.block_size = block_size
+
+        preamble = b""
+        for name, value in fields.items():
+            preamble += (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n').encode("utf-8")
+        preamble += (f'--{self.boundary}\r\nContent-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n').encode("utf-8")
+        self.parts = [preamble, None, f'\r\n--{self.boundary}--\r\n'.encode("utf-8")]
+        self.length = len(self.parts[0]) + os.path.getsize(file_path) + len(self.parts[2])
+        self.part = 0
+        self.offset = 0
+        self.file = None
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.block_size
+        while self.part < len(self.parts):
+            # The file itself
+            if self.parts[self.part] is None:
+                if self.file is None:
+                    self.file = open(self.file_path, 'rb')
+                data = self.file.read(size)
+                if data:
+                    return data
+                self.close()
+                self.part += 1
+                continue
+
+            # The form fields and closing boundary
+            data = self.parts[self.part][self.offset:self.offset + size]
+            self.offset += len(data)
+            if self.offset >= len(self.parts[self.part]):
+                self.part += 1
+                self.offset = 0
+            if data:
+                return data
+        return b""
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class UploadSession:
+    """
+    A keep-alive requests session and thread pool shared by all uploads of a conversion, with retries
+    and timings. Close it, or use it as a context manager, to end its connections and threads.
 
-            # If not in the map then autoconvert the link
-            if line not in map_kds:
-                texture_path = line.split(" ")[1]
-                text_url = file_to_link(file_path=texture_path, access_token=access_token,
-                        directory=directory, prefix=prefix, course_num=course_num)
-                map_kds[line] = text_url
+    Args:
+    - max_workers       : the number of uploads run at once (and connections kept open)
+    - retries           : the number of times a request is retried on 429/5xx or a connection error
+    - backoff           : the initial delay in seconds between retries, doubled after each retry
+    """
 
-            # If we have converted this link before
-            else:
-                text_url = map_kds[line]
-            mtl_raw[i] = f"map_Kd {text_url}\n"
+    def __init__(self, max_workers=DEFAULT_UPLOAD_WORKERS, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.timings = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Waits for the submitted uploads and closes the thread pool and the connections.
+        """
+        self.executor.shutdown()
+        self.session.close()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Runs the function on the session's thread pool and returns its future, so uploads of
+        different kinds share the same workers.
+        """
+        return self.executor.submit(func, *args, **kwargs)
+
+    def request(self, method, url, body=None, **kwargs):
+        """
+        Sends a request, retrying with exponential backoff. body is a function returning a fresh
+        MultipartFile so that a streamed body can be sent again.
+        """
+        headers = dict(kwargs.pop("headers", None) or {})
+        with span("http_request", category="http", method=method, url=url.split("?")[0]) as s:
+            for attempt in range(self.retries + 1):
+                data = body() if body is not None else None
+                if data is not None:
+                    headers["Content-Type"] = data.content_type
+                    s.set(bytes_uploaded=len(data))
+                try:
+                    response = self.session.request(method, url, data=data, headers=headers, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt == self.retries:
+                        s.set(retries=attempt)
+                        raise
+                    response = None
+                finally:
+                    if data is not None:
+                        data.close()
+
+                if response is not None:
+                    s.set(status=response.status_code, retries=attempt)
+                if response is not None and response.status_code not in RETRY_STATUSES:
+                    return response
+                if attempt == self.retries:
+                    return response
+
+                # Respect the server's Retry-After when rate limited
+                delay = self.backoff * (2 ** attempt)
+                if response is not None and response.headers.get("Retry-After", "").isdigit():
+                    delay = max(delay, int(response.headers["Retry-After"]))
+                time.sleep(delay)
+
+    def record(self, file_path, size, seconds):
+        with self.lock:
+            self.timings.append((file_path, size, seconds))
+
+    def print_summary(self, total_seconds):
+        """
+        Prints the time taken for each uploaded file and the total throughput.
+        """
+        if len(self.timings) == 0:
+            return
+        width = max(len(os.path.basename(f)) for f, _, _ in self.timings)
+        for file_path, size, seconds in self.timings:
+            print(f"Uploaded {os.path.basename(file_path):<{width}}  {size / 1e6:10.2f} MB  {seconds:8.3f}s")
+        total_size = sum(size for _, size, _ in self.timings)
+        print(f"Uploaded {len(self.timings)} files, {total_size / 1e6:.2f} MB in {total_seconds:.3f}s "
+              f"({total_size / 1e6 / max(total_seconds, 1e-9):.2f} MB/s)")
+
+
+def _session(session):
+    # A session made for a single call is closed at the end of it
+    return nullcontext(session) if session is not None else UploadSession()
+
+
+@traced()
+def convert_mtl_file(mtl_file, access_token, directory, prefix=None, course_num=None, cache=None, session=None, executor=None, output_dir=None):
+    """
+    Uploads every texture referenced by the MTL file, writes a copy of the MTL with the texture
+    links and uploads it. Texture paths are relative to the MTL file, this is done so that users
+    don't have to go into the file and modify the paths to be relative to the working directory.
 
-    # To not overwrite the existing file
-    mtl_file = mtl_file[:-4] + "_online.mtl"
-    with open(mtl_file, 'w') as f:
-        f.write("".join(mtl_raw))
+    Args:
+    - mtl_file          : path of the MTL file
+    - executor          : uploads the textures in parallel when given
+    - output_dir        : where to write the rewritten MTL, a temporary directory if not given
+    """
+    # Upload each texture once, in parallel when given an executor
+    def upload(texture_path):
+        if "://" in texture_path:
+            return texture_path
+        link = file_to_link(file_path=texture_path, access_token=access_token, directory=directory,
+                            prefix=prefix, course_num=course_num, cache=cache, session=session)
+
+        # MTLLoader picks the DDS loader by the extension, which Canvas links do not keep
+        if texture_path.lower().endswith(".dds") and not link.lower().endswith(".dds"):
+            link += "#.dds"
+        return link
+
+    texture_paths = find_textures(mtl_file)
+    if executor is not None:
+        texture_links = dict(zip(texture_paths, executor.map(upload, texture_paths)))
+    else:
+        texture_links = {texture_path: upload(texture_path) for texture_path in texture_paths}
 
-    # Change the directory back to the working DIR
-    chdir(abspath(curr_path))
+    # To not overwrite the existing file the copy is written elsewhere
+    online_name = os.path.splitext(os.path.basename(mtl_file))[0] + "_online.mtl"
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with span("rewrite_mtl", textures=len(texture_links)):
+            online_mtl = rewrite_mtl(mtl_file, texture_links, join(output_dir or temp_dir, online_name))
 
-    # Convert MTL File
-    return file_to_link(file_path=mtl_file, access_token=access_token, directory=directory, prefix=prefix, course_num=course_num)
+        # Convert MTL File
+        return file_to_link(file_path=online_mtl, access_token=access_token, directory=directory, prefix=prefix, course_num=course_num, cache=cache, session=session)
 
 
-def autoconvert_files(obj_file, texture_file, mtl_file, access_token, directory, prefix=None, course_num=None):
-    # Convert OBJ
-    obj_url = file_to_link(file_path=obj_file, access_token=access_token,
-                           directory=directory, prefix=prefix, course_num=course_num)
+@traced()
+def autoconvert_files(obj_file, texture_file, mtl_file, access_token, directory, prefix=None, course_num=None, cache=None, session=None, output_dir=None):
+    """
+    Uploads the OBJ, texture, MTL and every texture referenced by the MTL in parallel.
+    Returns the links of the OBJ, texture and MTL files. The MTL rewritten with the texture
+    links is kept in output_dir if given. The OBJ may be None when the geometry is uploaded separately.
+    The uploads run on the session's thread pool, alongside any other uploads submitted to it, and the
+    summary of the uploads is printed when the session is made for this call.
+    """
+    start = time.perf_counter()
     texture_url = None
     mtl_url = None
 
-    # Convert Texture File
-    if mtl_file is None and texture_file is not None:
-        texture_url = file_to_link(file_path=texture_file, access_token=access_token,
-                                   directory=directory, prefix=prefix, course_num=course_num)
-
-    # Convert the MTL File
-    if mtl_file is not None:
-        mtl_url = convert_mtl_file(mtl_file, access_token, directory, prefix, course_num)
-
+    with _session(session) as upload_session:
+        # Convert OBJ
+        obj_future = None
+        if obj_file is not None:
+            obj_future = upload_session.submit(file_to_link, file_path=obj_file, access_token=access_token, directory=directory,
+                                               prefix=prefix, course_num=course_num, cache=cache, session=upload_session)
+
+        # Convert Texture File
+        texture_future = None
+        if mtl_file is None and texture_file is not None:
+            texture_future = upload_session.submit(file_to_link, file_path=texture_file, access_token=access_token, directory=directory,
+                                                   prefix=prefix, course_num=course_num, cache=cache, session=upload_session)
+
+        # Convert the MTL File, its textures are uploaded on the same pool
+        if mtl_file is not None:
+            mtl_url = convert_mtl_file(mtl_file, access_token, directory, prefix, course_num, cache, upload_session,
+                                       upload_session.executor, output_dir)
+
+        obj_url = obj_future.result() if obj_future is not None else None
+        if texture_future is not None:
+            texture_url = texture_future.result()
+
+        if session is None:
+            upload_session.print_summary(time.perf_counter() - start)
     return obj_url, texture_url, mtl_url
 
 
-def file_to_link(file_path, access_token, directory, prefix, course_num=None):
+@traced()
+def file_to_link(file_path, access_token, directory, prefix, course_num=None, cache=None, session=None):
     """
     Given the file name it will upload it to the Canvas site and directory indicated.
 
@@ -88,41 +285,68 @@ def file_to_link(file_path, access_token, directory, prefix, course_num=None):
     - directory         : the directory to upload to
     - prefix            : the Canvas host to use
     - course_num        : the course number if uploading to a specific course
+    - cache             : an UploadCache, if the same contents were uploaded to the same place before the URL is reused
+    - session           : the UploadSession to send the requests with, a new one is made (and closed) if not given
     """
 
-    # NOTE Warning this will overwrite existing files uploaded
-    file_name=os.path.basename(file_path)
+    # Skip the upload if these exact contents have already been uploaded here
+    cache_key = None
+    if cache is not None:
+        with span("cache_lookup", file=os.path.basename(file_path), bytes_read=os.path.getsize(file_path)) as s:
+            cache_key = cache.key(file_path, prefix, course_num, directory)
+            cached_url = cache.get(cache_key)
+            s.set(hit=cached_url is not None)
+        if cached_url is not None:
+            return cached_url
 
-    # Set the course path to the users files or to a course's files
-    course_path = ""
-    if course_num == None:
-        course_path = "users/self/"
-    else:
-        course_path = f"courses/{course_num}/"
+    with _session(session) as session:
+        start = time.perf_counter()
+
+        # NOTE Warning this will overwrite existing files uploaded
+        file_name=os.path.basename(file_path)
+
+        # Set the course path to the users files or to a course's files
+        course_path = ""
+        if course_num == None:
+            course_path = "users/self/"
+        else:
+            course_path = f"courses/{course_num}/"
+
+        # Step 1: Notify Canvas of the file upload
+        params = {"parent_folder_path": directory,
+                  "name": file_name,
+                  "size": os.path.getsize(file_path)}
+        authorisation = {'Authorization': f'Bearer {access_token}'}
+
+        # The prefix is a host, or a full URL when a scheme is given e.g. http://localhost:8000
+        base_url = prefix if "://" in prefix else f"https://{prefix}"
+        initial_req = session.request("POST", f"{base_url}/api/v1/{course_path}files/", params=params, headers=authorisation)
+        initial_req.raise_for_status()
 
-    # Step 1: Notify Canvas of the file upload
-    params = {"parent_folder_path": directory,
-              "name": file_name}
-    authorisation = {'Authorization': f'Bearer {access_token}'}
+        # Get the JSON
+        request_json = initial_req.json()
 
-    initial_req = requests.post(f"https://{prefix}/api/v1/{course_path}files/", params=params, headers=authorisation)
+        file_upload = request_json['upload_params']['file'] if 'file' in request_json else file_path
 
-    # Get the JSON
-    request_json = initial_req.json()
+        # Step 2: Upload the actual data to Canvas, the file is streamed from disk
+        upload_params = {k: v for k, v in request_json['upload_params'].items() if k != 'file'}
+        upload_req = session.request("POST", f"{request_json['upload_url']}",
+                                     body=lambda: MultipartFile(upload_params, file_upload, file_name))
+        upload_req.raise_for_status()
 
-    file_upload = request_json['upload_params']['file'] if 'file' in request_json else file_path
+        # Get the JSON
+        upload_json = upload_req.json()
 
-    # Step 2: Upload the actual data to Canvas
-    upload_req = requests.post(f"{request_json['upload_url']}", params=request_json['upload_params']['filename'], files={"file": open(file_upload, 'rb')})
+        # Step 3: Confirm that the upload was successful if we are given a location
+        if 'location' in upload_json:
+            confirm_req = session.request("POST", f"{upload_json['location']}", headers=authorisation, params=params)
 
-    # Get the JSON
-    upload_json = upload_req.json()
+        session.record(file_path, params["size"], time.perf_counter() - start)
 
-    # Step 3: Confirm that the upload was successful if we are given a location
-    if 'location' in upload_json:
-        confirm_req = requests.post(f"{upload_json['location']}", headers=authorisation, params=params)
+        if cache is not None:
+            cache.put(cache_key, upload_json['url'])
 
-    return upload_json['url']
+        return upload_json['url']
 
 
 def save_token(access_token, prefix):
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+The conversion settings shared by the command line, GUI, batch and watch entry points, so each
+flag is defined and checked in one place.
+"""
+from obj2html.utils.bundle_utils import missing_vendor
+
+
+def _widget(gui, widget, **gooey_options):
+    # Gooey's widget options are only understood by a GooeyParser
+    if not gui:
+        return {}
+    options = {"widget": widget}
+    if gooey_options:
+        options["gooey_options"] = gooey_options
+    return options
+
+
+def add_conversion_arguments(parser, batch=False, gui=False):
+    """
+    Adds the view, 3D, annotation, bundle, layout and Canvas settings of obj_to_html to the parser.
+
+    Args:
+    - parser            : an argparse.ArgumentParser or a GooeyParser
+    - batch             : whether the settings are the defaults of many jobs, the texture and MTL files
+                          are then given per row of a manifest and there are no diagnostics
+    - gui               : whether the parser is a GooeyParser, which is given widgets for the settings
+    """
+    # Optional View Settings
+    view_options_group = parser.add_argument_group(
+        "View Options [OPTIONAL]",
+        "Default view settings, these can be overridden per row of a manifest." if batch else
+        "Optional view settings which should be configured to correctly display the OBJ file.")
+    view_options_group.add_argument('--min_camera', type=float, default=None,
+                        help='The minimum distance for camera view. By default the camera is framed from the bounding box of the model.')
+    view_options_group.add_argument('--max_camera', type=float, default=None,
+                        help='The maximum distance for camera view. By default the camera is framed from the bounding box of the model.')
+    view_options_group.add_argument('-z', '--z_pos', type=float, default=None,
+                        help='The Z coordinate to display the camera. By default the camera is framed from the bounding box of the model.')
+    view_options_group.add_argument('--template_file', type=str, default="./templates/default.html", **_widget(gui, "FileChooser"),
+                        help='The template file for the HTML.')
+
+    # Texture, Material and Other 3D Settings
+    three_dim_settings_group = parser.add_argument_group(
+        "3D Options [OPTIONAL]",
+        "3D Settings for every job." if batch else
+        "3D Settings and parameters including whether to use texture or material files.")
+    if not batch:
+        three_dim_settings_group.add_argument('-T', '--texture', type=str, default=None, **_widget(gui, "FileChooser"),
+                            help='The texture file for the object.')
+        three_dim_settings_group.add_argument('-m', '--mtl_file', type=str, default=None, **_widget(gui, "FileChooser"),
+                            help='The texture file for the object. NOTE: You must provide the relative (to the file)/absolute paths of the texture files within the mtl file.')
+    three_dim_settings_group.add_argument('-f', '--output_format', type=str, default="obj", choices=["obj", "glb", "bin", "chunks"],
+                        help='The format of the geometry loaded by the page. glb and bin are converted from the OBJ and written next to the HTML file, they are smaller and faster to load. chunks splits the model into an octree of bin files with coarser levels of detail, streamed in as the camera moves.')
+    three_dim_settings_group.add_argument('--optimize_textures', action='store_true',
+                        help='Downscale the textures (and optionally transcode them) into the output directory. Results are cached so unchanged textures are not processed again. Requires Pillow.')
+    three_dim_settings_group.add_argument('--texture_max_size', type=int, default=2048, **_widget(gui, "IntegerField", min=1, max=16384),
+                        help='The maximum width or height of an optimized texture.')
+    three_dim_settings_group.add_argument('--texture_format', type=str, default=None, choices=["png", "jpg", "dds"],
+                        help='The format of optimized textures, dds is DXT1/DXT5 compressed with mipmaps (KTX2 is not supported). Defaults to the original format.')
+    three_dim_settings_group.add_argument('--no_power_of_two', action='store_true',
+                        help='Do not round optimized textures to power-of-two dimensions.')
+    three_dim_settings_group.add_argument('--quantize', action='store_true',
+                        help='Quantize the bin geometry and delta encode its indices, the error introduced is printed. Requires --output_format bin or chunks.')
+    three_dim_settings_group.add_argument('--position_bits', type=int, default=16, **_widget(gui, "IntegerField", min=1, max=16),
+                        help='The bits for each quantized position component (1 to 16).')
+    three_dim_settings_group.add_argument('--normal_bits', type=int, default=8, **_widget(gui, "IntegerField", min=2, max=16),
+                        help='The bits for each of the two octahedral normal components (2 to 16).')
+    three_dim_settings_group.add_argument('--uv_bits', type=int, default=12, **_widget(gui, "IntegerField", min=1, max=16),
+                        help='The bits for each quantized texture coordinate (1 to 16).')
+    three_dim_settings_group.add_argument('--chunk_triangles', type=int, default=65536, **_widget(gui, "IntegerField", min=1024, max=4194304),
+                        help='The most triangles in a chunk, larger nodes of the octree are split further. Used with --output_format chunks.')
+    three_dim_settings_group.add_argument('--chunk_budget', type=int, default=4194304, **_widget(gui, "IntegerField", min=65536, max=268435456),
+                        help='The most triangles the viewer keeps loaded, the furthest hidden chunks are unloaded above it. Used with --output_format chunks.')
+    three_dim_settings_group.add_argument('--optimize_geometry', action='store_true',
+                        help='Weld vertices with identical values, compute the missing normals and merge the faces of each material into one draw call. The counts before and after are printed. With --output_format obj the optimized OBJ is written next to the HTML file.')
+    three_dim_settings_group.add_argument('--vertex_cache', action='store_true',
+                        help='With --optimize_geometry, also reorder the triangles for the GPU vertex cache. Slower, around 5 seconds per million triangles.')
+
+    # Annotation Settings
+    annotation_group = parser.add_argument_group(
+        "Annotations [OPTIONAL]",
+        "Labelled points shown over the model, and picking the model with a BVH.")
+    annotation_group.add_argument('--annotations', type=str, default=None, **_widget(gui, "FileChooser"),
+                        help='A JSON or CSV file of annotations (title, description, position and optionally the camera position and target). A BVH of the model is written next to the HTML file for picking and the annotations are snapped onto the surface.')
+    annotation_group.add_argument('--no_snap_annotations', action='store_true',
+                        help='Keep the annotations where they are instead of moving them onto the nearest point of the surface.')
+    annotation_group.add_argument('--bvh', action='store_true',
+                        help='Write the BVH without annotations, clicking the model logs the point as an annotation entry.')
+
+    # Offline Bundle Settings
+    bundle_group = parser.add_argument_group(
+        "Offline bundle [OPTIONAL]",
+        "Make pages which load nothing from the internet, for LMS iframes which block other sites.")
+    bundle_group.add_argument('--bundle', action='store_true',
+                        help='Inline the minified three.js modules the page uses instead of importing them from the CDN. The modules are vendored into the package, so no network access is needed.')
+    bundle_group.add_argument('--inline_geometry', action='store_true',
+                        help='Embed the geometry, MTL and textures in the page as base64, with --bundle the page is a single file which makes no requests.')
+
+    # Output Layout Settings
+    layout_group = parser.add_argument_group(
+        "Output layout [OPTIONAL]",
+        "How the pages and their files are laid out, for courses with many models.")
+    layout_group.add_argument('--shared_viewer', action='store_true',
+                        help='Write the viewer script and stylesheet once as viewer.<hash>.js and viewer.<hash>.css next to the pages (uploaded once with --auto_convert) so each page is a thin shell which links them, and give the files generated next to the page content-hashed names so they can be cached as immutable. Cannot be used with --inline_geometry or --bundle.')
+
+    # Auto Conversion Settings
+    auto_convert_group = parser.add_argument_group(
+        "Canvas auto-convert [OPTIONAL]",
+        "Provide the ability to auto-convert and upload links to Canvas for use in pages.")
+    auto_convert_group.add_argument('--auto_convert', action='store_true',
+                        help='Whether to auto convert the links to Canvas files.')
+    if gui:
+        auto_convert_group.add_argument('--save_token', action='store_true',
+                            help='Whether to save the token for later use.')
+        auto_convert_group.add_argument('--access_token', metavar="access_token", widget="PasswordField",
+                            type=str, default=None, help='The access token generated in canvas settings. LEAVE EMPTY TO LOAD TOKEN FROM SAVED DIRECTORY.')
+    else:
+        auto_convert_group.add_argument('--access_token', metavar="access_token",
+                            type=str, default=None, help='The access token generated in canvas settings.')
+    auto_convert_group.add_argument('--directory', metavar="directory",
+                        type=str, default="", help='The directory to upload to on Canvas.')
+    auto_convert_group.add_argument('--course_number', metavar="c", type=int,
+                                    help='OPTIONAL: The course number of the canvas link.', default=None)
+    auto_convert_group.add_argument('-p', '--prefix', type=str,
+                        help='The canvas infrastructure to use e.g. canvas.sydney.edu.au', default="canvas.sydney.edu.au")
+    auto_convert_group.add_argument('--upload_workers', type=int, default=8,
+                        help='The number of files uploaded to Canvas at once.')
+    auto_convert_group.add_argument('--no_cache', action='store_true',
+                        help='Upload every file even if the same contents were uploaded to the same place before.')
+    auto_convert_group.add_argument('--validate_cache', action='store_true',
+                        help='Check that a previously uploaded file still exists on Canvas before reusing its link.')
+
+    # Diagnostics
+    if not batch:
+        diagnostics_group = parser.add_argument_group(
+            "Diagnostics [OPTIONAL]",
+            "Record where the time of a conversion goes.")
+        diagnostics_group.add_argument('--trace', type=str, default=None, **_widget(gui, "FileSaver"),
+                            help='Write the time, bytes and HTTP requests of each stage to this file in the Chrome trace-event format (open it in chrome://tracing or ui.perfetto.dev).')
+        diagnostics_group.add_argument('--profile', action='store_true',
+                            help='Run the conversion under cProfile and print the slowest functions.')
+
+
+def validate_conversion_args(parser, args):
+    """
+    Exits through parser.error when the settings added by add_conversion_arguments cannot be used together.
+    """
+    if args.quantize and args.output_format not in ("bin", "chunks"):
+        parser.error('--quantize requires --output_format bin or chunks')
+    for name, lowest in (("position_bits", 1), ("normal_bits", 2), ("uv_bits", 1)):
+        if not lowest <= getattr(args, name) <= 16:
+            parser.error(f'--{name} must be between {lowest} and 16')
+    if args.vertex_cache and not args.optimize_geometry:
+        parser.error('--vertex_cache requires --optimize_geometry')
+
+    if args.auto_convert and args.access_token is None:
+        parser.error('--auto_convert requires --access_token to be set')
+
+    if args.upload_workers < 1:
+        parser.error('--upload_workers must be at least 1')
+
+    if args.auto_convert and args.inline_geometry:
+        parser.error('--inline_geometry cannot be used with --auto_convert')
+
+    if args.shared_viewer and args.inline_geometry:
+        parser.error('--shared_viewer cannot be used with --inline_geometry')
+
+    # The bundled modules are an import map in the page, which would be repeated in every shared viewer page
+    if args.shared_viewer and args.bundle:
+        parser.error('--shared_viewer cannot be used with --bundle')
+
+    # The vendored modules are shipped with the package, an install without them cannot bundle
+    if args.bundle and missing_vendor():
+        parser.error('--bundle needs the three.js modules vendored into the package in obj2html/vendor/three, which are '
+                     'missing from this install. Restore them with: python -m obj2html.obj2html_vendor')
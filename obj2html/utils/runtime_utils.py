@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Shared viewer runtime: the stylesheet and module script of a rendered page are written once as
+viewer.<hash>.css and viewer.<hash>.js, and the page becomes a thin shell which links them and holds
+its own values (camera, links of the model, annotations) as JSON. Pages of the same kind (e.g. bin
+geometry with an MTL file) render the same runtime, so a course of many models downloads, compiles
+and uploads it once.
+
+The model files written next to the page are also given content-hashed names, so a changed model is
+a new URL and every file can be cached as immutable.
+"""
+import os
+import re
+import json
+import hashlib
+import tempfile
+from collections import namedtuple
+from os.path import join, basename, dirname, splitext, exists
+from obj2html.utils.upload_cache import file_digest
+
+
+# The length of the hashes in file names
+HASH_LENGTH = 12
+
+# The element holding the values of the page, read by the runtime before anything else
+CONFIG_ID = "viewerConfig"
+RUNTIME_PRELUDE = f"const viewerConfig = JSON.parse( document.getElementById( '{CONFIG_ID}' ).textContent );\n"
+
+# A rendered page split around its stylesheet and module script
+Page = namedtuple("Page", ["head", "css", "body", "js", "tail"])
+
+_STYLE = re.compile(r"<style>(.*?)</style>", re.S)
+_MODULE_SCRIPT = re.compile(r'<script type="module">(.*?)</script>', re.S)
+
+
+def hashed_name(file_path, digest=None):
+    """
+    Returns the name of the file with the hash of its contents before the extension, e.g. model.3f2a9c1e07bd.bin
+    """
+    stem, ext = splitext(basename(file_path))
+    digest = digest if digest is not None else file_digest(file_path)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def hash_file_name(file_path):
+    """
+    Renames the file to its content-hashed name in the same directory and returns the new path.
+    """
+    hashed_path = join(dirname(file_path), hashed_name(file_path))
+    os.replace(file_path, hashed_path)
+    return hashed_path
+
+
+def split_page(html):
+    """
+    Splits a rendered page around its first stylesheet and module script. Returns None when the
+    template has no <style> before a <script type="module">.
+    """
+    style = _STYLE.search(html)
+    script = _MODULE_SCRIPT.search(html, style.end()) if style is not None else None
+    if script is None:
+        return None
+    return Page(html[:style.start()], style.group(1), html[style.end():script.start()], script.group(1), html[script.end():])
+
+
+def _write_once(contents, out_file):
+    # Pages of a batch may write the same runtime at once, the file is only ever replaced whole
+    if exists(out_file):
+        return out_file
+    fd, temp_file = tempfile.mkstemp(dir=dirname(out_file) or ".", suffix=".tmp")
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(contents)
+    # Temporary files are only readable by their owner, the runtime is served like any other page file
+    os.chmod(temp_file, 0o644)
+    os.replace(temp_file, out_file)
+    return out_file
+
+
+def write_runtime(page, out_dir):
+    """
+    Writes the stylesheet and script of the page as viewer.<hash>.css and viewer.<hash>.js into the
+    directory, unless a page already wrote them. Returns the paths of the two files.
+    """
+    files = []
+    for contents, ext in ((page.css, ".css"), (RUNTIME_PRELUDE + page.js, ".js")):
+        digest = hashlib.sha256(contents.encode("utf-8")).hexdigest()
+        files.append(_write_once(contents, join(out_dir, f"viewer.{digest[:HASH_LENGTH]}{ext}")))
+    return files[0], files[1]
+
+
+def shell_page(page, css_url, js_url, config):
+    """
+    Returns the page with its stylesheet and script replaced by links to the runtime and its values as JSON.
+
+    Args:
+    - page              : the Page from split_page
+    - css_url           : the link of viewer.<hash>.css
+    - js_url            : the link of viewer.<hash>.js
+    - config            : the values the runtime reads as viewerConfig
+    """
+    # A </script> in a value cannot end the script
+    config_json = json.dumps(config).replace("</", "<\\/")
+    return (page.head + f'<link rel="stylesheet" href="{css_url}">' + page.body
+            + f'<script type="application/json" id="{CONFIG_ID}">{config_json}</script>\n'
+            + f'    <script type="module" src="{js_url}"></script>' + page.tail)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Texture optimization: textures are downscaled to a maximum size and to power-of-two dimensions and
+can be transcoded to PNG, JPEG or DDS. DDS files are BC1 (DXT1) or, with an alpha channel, BC3 (DXT5)
+compressed with a full precomputed mipmap chain, so they use 4-8x less GPU memory than RGBA8 images.
+KTX2 is not written: it needs a Basis Universal encoder here and its wasm transcoder in the page,
+while DDS is loaded by the DDSLoader the pages already have.
+
+The results are cached in the config directory by the hash of the texture contents and the settings,
+so unchanged textures are never processed twice.
+"""
+import os
+import struct
+import shutil
+import hashlib
+from collections import namedtuple
+from os.path import join, basename, splitext, exists, abspath
+import numpy as np
+from obj2html.utils.canvas_utils import get_config_dir
+from obj2html.parser.mtl_parser import find_textures, rewrite_mtl
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+# The settings textures are optimized with, format is None to keep the original format
+TextureSettings = namedtuple("TextureSettings", ["max_size", "power_of_two", "format"])
+DEFAULT_TEXTURE_SETTINGS = TextureSettings(2048, True, None)
+
+# Texture formats which can be written
+TEXTURE_FORMATS = ("png", "jpg", "dds")
+
+# DDS header constants
+_DDSD_FLAGS = 0x1 | 0x2 | 0x4 | 0x1000 | 0x20000 | 0x80000
+_DDPF_FOURCC = 0x4
+_DDSCAPS = 0x1000 | 0x400000 | 0x8
+
+
+def get_texture_cache_dir():
+    return join(get_config_dir(), "textures")
+
+
+def _power_of_two(size, max_size):
+    # The nearest power of two which is not above max_size
+    power = 2 ** int(round(np.log2(max(size, 1))))
+    while power > max_size:
+        power //= 2
+    return max(power, 1)
+
+
+def target_size(width, height, settings):
+    """
+    Returns the dimensions a texture of width x height is resized to.
+    """
+    scale = min(1.0, settings.max_size / max(width, height))
+    new_width, new_height = max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+    if settings.power_of_two or settings.format == "dds":
+        new_width = _power_of_two(new_width, settings.max_size)
+        new_height = _power_of_two(new_height, settings.max_size)
+    return new_width, new_height
+
+
+def _to_blocks(pixels):
+    # (H, W, C) with H and W multiples of 4 to (N, 16, C) blocks in row major order
+    height, width, channels = pixels.shape
+    blocks = pixels.reshape(height // 4, 4, width // 4, 4, channels).transpose(0, 2, 1, 3, 4)
+    return blocks.reshape(-1, 16, channels)
+
+
+def _pad_to_blocks(pixels):
+    height, width = pixels.shape[:2]
+    return np.pad(pixels, ((0, -height % 4), (0, -width % 4), (0, 0)), mode="edge")
+
+
+def _to_565(colours):
+    colours = np.clip(np.rint(colours), 0, 255).astype(np.uint16)
+    return ((colours[:, 0] >> 3) << 11) | ((colours[:, 1] >> 2) << 5) | (colours[:, 2] >> 3)
+
+
+def _from_565(packed):
+    packed = packed.astype(np.uint32)
+    r = (packed >> 11) & 0x1F
+    g = (packed >> 5) & 0x3F
+    b = packed & 0x1F
+    return np.stack(((r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)), axis=1).astype(np.float32)
+
+
+def encode_bc1_colours(blocks):
+    """
+    Encodes (N, 16, 3) uint8 blocks to (N, 8) BC1 colour blocks using the bounding box of each block.
+    """
+    blocks = blocks.astype(np.float32)
+    c0 = _to_565(blocks.max(axis=1))
+    c1 = _to_565(blocks.min(axis=1))
+
+    # Four colour mode needs c0 > c1
+    swap = c0 < c1
+    c0[swap], c1[swap] = c1[swap], c0[swap].copy()
+    p0, p1 = _from_565(c0), _from_565(c1)
+    palette = np.stack((p0, p1, (2 * p0 + p1) / 3, (p0 + 2 * p1) / 3), axis=1)
+
+    distances = ((blocks[:, :, None, :] - palette[:, None, :, :]) ** 2).sum(axis=3)
+    indices = distances.argmin(axis=2).astype(np.uint32)
+    indices[c0 == c1] = 0
+
+    packed_indices = (indices << (2 * np.arange(16, dtype=np.uint32))).sum(axis=1, dtype=np.uint32)
+    out = np.empty((len(blocks), 8), dtype=np.uint8)
+    out[:, 0:2] = c0.astype("<u2").view(np.uint8).reshape(-1, 2)
+    out[:, 2:4] = c1.astype("<u2").view(np.uint8).reshape(-1, 2)
+    out[:, 4:8] = packed_indices.astype("<u4").view(np.uint8).reshape(-1, 4)
+    return out
+
+
+def encode_bc3_alpha(alpha):
+    """
+    Encodes (N, 16) uint8 alpha values to (N, 8) BC3 alpha blocks.
+    """
+    a0 = alpha.max(axis=1).astype(np.float32)
+    a1 = alpha.min(axis=1).astype(np.float32)
+    steps = np.arange(1, 7, dtype=np.float32)
+    interpolated = ((7 - steps) * a0[:, None] + steps * a1[:, None]) / 7
+    palette = np.concatenate((a0[:, None], a1[:, None], interpolated), axis=1)
+
+    indices = np.abs(alpha[:, :, None].astype(np.float32) - palette[:, None, :]).argmin(axis=2).astype(np.uint64)
+    indices[a0 == a1] = 0
+    packed_indices = (indices << (3 * np.arange(16, dtype=np.uint64))).sum(axis=1, dtype=np.uint64)
+
+    out = np.empty((len(alpha), 8), dtype=np.uint8)
+    out[:, 0] = a0.astype(np.uint8)
+    out[:, 1] = a1.astype(np.uint8)
+    out[:, 2:8] = packed_indices.astype("<u8").view(np.uint8).reshape(-1, 8)[:, :6]
+    return out
+
+
+def write_dds(image, out_file):
+    """
+    Writes the image as a BC1/BC3 compressed DDS with a full mipmap chain. The image is flipped
+    vertically as compressed textures cannot be flipped when uploaded in the browser.
+    """
+    image = image.transpose(Image.FLIP_TOP_BOTTOM)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    width, height = image.size
+
+    levels = []
+    level = image
+    while True:
+        blocks = _to_blocks(_pad_to_blocks(np.asarray(level)))
+        colour = encode_bc1_colours(blocks[:, :, :3])
+        levels.append(np.concatenate((encode_bc3_alpha(blocks[:, :, 3]), colour), axis=1) if has_alpha else colour)
+        if level.size == (1, 1):
+            break
+        level = level.resize((max(1, level.size[0] // 2), max(1, level.size[1] // 2)), Image.BOX)
+
+    header = struct.pack("<4s7I44x", b"DDS ", 124, _DDSD_FLAGS, height, width, levels[0].nbytes, 0, len(levels))
+    header += struct.pack("<2I4s5I", 32, _DDPF_FOURCC, b"DXT5" if has_alpha else b"DXT1", 0, 0, 0, 0, 0)
+    header += struct.pack("<5I", _DDSCAPS, 0, 0, 0, 0)
+
+    with open(out_file, 'wb') as f:
+        f.write(header)
+        for data in levels:
+            f.write(data.tobytes())
+
+    return out_file
+
+
+def _cache_key(texture_path, settings):
+    digest = hashlib.sha256()
+    with open(texture_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(repr(tuple(settings)).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def optimize_texture(texture_path, settings=DEFAULT_TEXTURE_SETTINGS, cache_dir=None):
+    """
+    Resizes and transcodes a texture, returning the path of the optimized texture in the cache.
+
+    Args:
+    - texture_path      : the texture to optimize
+    - settings          : the TextureSettings to use
+    - cache_dir         : where optimized textures are kept, defaults to the config directory
+    """
+    if Image is None:
+        raise ImportError("Optimizing textures requires Pillow, install it with: pip install Pillow")
+
+    cache_dir = cache_dir if cache_dir is not None else get_texture_cache_dir()
+    stem, extension = splitext(basename(texture_path))
+    extension = "." + settings.format if settings.format is not None else extension.lower()
+    out_file = join(cache_dir, f"{stem}_{_cache_key(texture_path, settings)}{extension}")
+
+    # Unchanged textures are never reprocessed
+    if exists(out_file):
+        return out_file
+    if not exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    with Image.open(texture_path) as image:
+        image.load()
+        size = target_size(image.width, image.height, settings)
+        if size != image.size:
+            image = image.resize(size, Image.LANCZOS)
+
+        # Write to a temporary file so an interrupted run never leaves a partial texture in the cache
+        temp_file = f"{out_file}.{os.getpid()}.tmp"
+        if extension == ".dds":
+            write_dds(image, temp_file)
+        elif extension in (".jpg", ".jpeg"):
+            image.convert("RGB").save(temp_file, format="JPEG", quality=90, optimize=True)
+        else:
+            image.save(temp_file, format=Image.registered_extensions().get(extension, "PNG"), optimize=True)
+        os.replace(temp_file, out_file)
+
+    return out_file
+
+
+def optimize_texture_to(texture_path, settings, out_dir):
+    """
+    Optimizes the texture and copies the result into out_dir, returning the new path.
+    """
+    optimized = optimize_texture(texture_path, settings)
+    out_file = join(out_dir, basename(optimized))
+    if abspath(optimized) != abspath(out_file):
+        shutil.copyfile(optimized, out_file)
+    return out_file
+
+
+def optimize_mtl_textures(mtl_file, settings, out_dir):
+    """
+    Optimizes every texture of the MTL file into out_dir and writes a copy of the MTL which references them.
+    Returns the path of the new MTL file.
+    """
+    if not exists(out_dir):
+        os.makedirs(out_dir)
+
+    texture_links = {}
+    for texture_path in find_textures(mtl_file):
+        if "://" in texture_path:
+            continue
+        if not exists(texture_path):
+            print(f"WARNING: Texture {texture_path} does not exist and is left as is.")
+            continue
+        texture_links[texture_path] = basename(optimize_texture_to(texture_path, settings, out_dir))
+
+    out_file = join(out_dir, splitext(basename(mtl_file))[0] + "_optimized.mtl")
+    return rewrite_mtl(mtl_file, texture_links, out_file)
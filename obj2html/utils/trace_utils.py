@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Lightweight tracing of the conversion stages. Spans are recorded with their duration and any
+counters set on them (bytes read, bytes uploaded, HTTP status, retries) and can be written in the
+Chrome trace-event format, viewable in chrome://tracing or https://ui.perfetto.dev.
+
+Tracing is off until enable_tracing is called. While it is off span() returns a shared no-op span
+and traced functions are called directly, so the instrumented code only pays for a global lookup.
+"""
+import os
+import json
+import time
+import pstats
+import functools
+import cProfile
+import threading
+
+
+# The tracer spans are recorded to, None when tracing is disabled
+_tracer = None
+
+
+class _NullSpan:
+    # Returned by span() when tracing is disabled
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **counters):
+        return self
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    A timed section of the conversion, counters can be added while it is open with set().
+    """
+
+    def __init__(self, tracer, name, category, counters):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.counters = counters
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.counters["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.record(self.name, self.category, self.start, time.perf_counter_ns(), self.counters)
+        return False
+
+    def set(self, **counters):
+        self.counters.update(counters)
+        return self
+
+
+class Tracer:
+    """
+    Collects the spans of every thread in the process.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.events = []
+        self.threads = {}
+
+    def record(self, name, category, start, end, counters):
+        thread = threading.current_thread()
+        event = {"name": name,
+                 "cat": category,
+                 "ph": "X",
+                 "ts": (start - self.origin) / 1000,
+                 "dur": (end - start) / 1000,
+                 "pid": self.pid,
+                 "tid": thread.ident,
+                 "args": counters}
+        with self.lock:
+            self.events.append(event)
+            self.threads[thread.ident] = thread.name
+
+    def trace_events(self):
+        """
+        Returns the spans in the Chrome trace-event format, including the names of the threads.
+        """
+        with self.lock:
+            names = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                     for tid, name in self.threads.items()]
+            return {"traceEvents": names + sorted(self.events, key=lambda e: e["ts"]),
+                    "displayTimeUnit": "ms"}
+
+    def summary(self):
+        """
+        Returns the total time and number of spans for each span name.
+        """
+        totals = {}
+        with self.lock:
+            for event in self.events:
+                total = totals.setdefault(event["name"], [0, 0.0])
+                total[0] += 1
+                total[1] += event["dur"] / 1e6
+        return totals
+
+
+def span(name, category="obj2html", **counters):
+    """
+    Returns a context manager timing the enclosed code, a no-op when tracing is disabled.
+
+    Args:
+    - name              : the name of the stage e.g. render
+    - category          : the category the span is grouped by in the trace viewer
+    - counters          : any values to record with the span e.g. bytes_read
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return Span(tracer, name, category, counters)
+
+
+def traced(name=None, category="obj2html"):
+    """
+    Decorates a function so each call is recorded as a span, calls go straight through when tracing is disabled.
+    """
+    def decorator(func):
+        span_name = name if name is not None else func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return func(*args, **kwargs)
+            with Span(tracer, span_name, category, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enable_tracing():
+    """
+    Starts recording spans and returns the Tracer.
+    """
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable_tracing():
+    """
+    Stops recording spans and returns the Tracer that was in use.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def write_trace(tracer, out_file):
+    """
+    Writes the spans as a Chrome trace-event JSON file and prints the time spent in each stage.
+    """
+    with open(out_file, 'w') as f:
+        json.dump(tracer.trace_events(), f)
+
+    for name, (count, seconds) in sorted(tracer.summary().items(), key=lambda item: -item[1][1]):
+        print(f"{name:<24} {count:6d} spans  {seconds:10.3f}s")
+    print(f"Wrote the trace to {out_file}")
+
+
+def run_profiled(func, *args, profile_file=None, limit=25, **kwargs):
+    """
+    Runs the function under cProfile and prints the functions with the highest cumulative time.
+
+    Args:
+    - func              : the function to run with args and kwargs
+    - profile_file      : if given the raw profile is also saved here, for use with pstats or snakeviz
+    - limit             : the number of functions printed
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        if profile_file is not None:
+            profiler.dump_stats(profile_file)
+        pstats.Stats(profiler).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+
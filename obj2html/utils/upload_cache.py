@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from obj2html.utils.canvas_utils import get_config_dir
+
+
+# Default limits before old entries are evicted
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_AGE = 60 * 60 * 24 * 30
+
+
+def get_cache_file():
+    return os.path.join(get_config_dir(), "upload_cache.json")
+
+
+def file_digest(file_path, block_size=1 << 20):
+    """
+    Returns the SHA-256 of the file contents, read in blocks so large OBJ files are not loaded whole.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadCache:
+    """
+    A persistent map from the contents of an uploaded file (and where it was uploaded to) to its Canvas URL.
+    Entries are evicted when they are older than max_age seconds or when there are more than max_entries.
+
+    Args:
+    - cache_file        : the JSON file to store the cache in, defaults to the config directory
+    - validate          : whether to check that a cached URL still exists before using it
+    - max_entries       : the maximum number of entries kept
+    - max_age           : the maximum age of an entry in seconds
+    """
+
+    def __init__(self, cache_file=None, validate=False, max_entries=DEFAULT_MAX_ENTRIES, max_age=DEFAULT_MAX_AGE):
+        self.cache_file = cache_file if cache_file is not None else get_cache_file()
+        self.validate = validate
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.entries = self._read()
+        self.removed = set()
+        self.changed = False
+
+    def _read(self):
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # A corrupt cache is just treated as empty
+            return {}
+
+    @staticmethod
+    def key(file_path, prefix, course_num, directory):
+        return f"{prefix}|{course_num}|{directory}|{file_digest(file_path)}"
+
+    def _is_valid(self, url):
+        try:
+            response = requests.head(url, allow_redirects=True, timeout=10)
+        except requests.RequestException:
+            return False
+        return response.status_code < 400
+
+    def get(self, key):
+        """
+        Returns the cached URL for the key or None.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or time.time() - entry["created"] > self.max_age:
+            return None
+        if self.validate and not self._is_valid(entry["url"]):
+            with self.lock:
+                self.entries.pop(key, None)
+                self.removed.add(key)
+                self.changed = True
+            return None
+
+        with self.lock:
+            entry["last_used"] = time.time()
+            self.changed = True
+        return entry["url"]
+
+    def put(self, key, url):
+        now = time.time()
+        with self.lock:
+            self.entries[key] = {"url": url, "created": now, "last_used": now}
+            self.changed = True
+
+    def evict(self, entries):
+        now = time.time()
+        entries = {k: v for k, v in entries.items() if now - v["created"] <= self.max_age}
+        if len(entries) > self.max_entries:
+            newest = sorted(entries.items(), key=lambda item: item[1]["last_used"], reverse=True)
+            entries = dict(newest[:self.max_entries])
+        return entries
+
+    def save(self):
+        """
+        Writes the cache, merging with entries written by other processes since it was read.
+        """
+        with self.lock:
+            if not self.changed:
+                return
+            entries = self._read()
+            entries.update(self.entries)
+            for key in self.removed:
+                entries.pop(key, None)
+            self.entries = self.evict(entries)
+            self.changed = False
+
+            cache_dir = os.path.dirname(self.cache_file)
+            if cache_dir and not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+
+            # Write to a temporary file first so a crash never leaves a partial cache
+            temp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(temp_file, self.cache_file)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+import os
+import time
+from os.path import abspath, exists
+from obj2html.parser.obj_parser import obj_to_html
+from obj2html.parser.mtl_parser import find_textures
+from obj2html.utils.upload_cache import file_digest
+
+
+# How often the inputs are checked and how long a burst of saves has to settle before rebuilding
+DEFAULT_INTERVAL = 0.5
+DEFAULT_DEBOUNCE = 0.3
+
+
+def job_inputs(args):
+    """
+    Returns the local files an output HTML depends on: the OBJ, the texture, the MTL,
+    every texture referenced inside the MTL, the annotations and the template.
+
+    Args:
+    - args              : the argument namespace the output is converted with
+    """
+    inputs = [args.obj_file, args.texture, args.mtl_file, args.annotations, args.template_file]
+    if args.mtl_file is not None and exists(args.mtl_file):
+        inputs += find_textures(args.mtl_file)
+
+    # Links are not watched, paths are kept absolute so that the same file is only watched once
+    return [abspath(path) for path in inputs if path is not None and "://" not in path]
+
+
+class DependencyGraph:
+    """
+    Records the inputs of each output HTML and, in reverse, which outputs use each input.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.inputs = {}
+        self.outputs = {}
+
+    def add(self, args):
+        """
+        Adds (or refreshes) the inputs of an output, the MTL is re-read as it may reference new textures.
+        """
+        output = abspath(args.output)
+        self.remove(output)
+        self.jobs[output] = args
+        self.inputs[output] = set(job_inputs(args))
+        for path in self.inputs[output]:
+            self.outputs.setdefault(path, set()).add(output)
+
+    def remove(self, output):
+        for path in self.inputs.pop(output, ()):
+            self.outputs[path].discard(output)
+            if len(self.outputs[path]) == 0:
+                del self.outputs[path]
+        self.jobs.pop(output, None)
+
+    def affected(self, changed_paths):
+        """
+        Returns the outputs which depend on any of the changed paths.
+        """
+        affected = set()
+        for path in changed_paths:
+            affected |= self.outputs.get(path, set())
+        return sorted(affected)
+
+    def watched(self):
+        return list(self.outputs)
+
+
+class FileWatcher:
+    """
+    Polls files for changes. The size and modification time are checked on every poll and the
+    contents are only hashed when they have changed, so saving a file without changing it
+    (or touching it) does not count as a change.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.digests = {}
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def _digest(path):
+        try:
+            return file_digest(path)
+        except OSError:
+            return None
+
+    def track(self, paths):
+        """
+        Starts watching any of the paths which are not already watched and stops watching the rest.
+        """
+        paths = set(paths)
+        for path in paths - set(self.stats):
+            self.stats[path] = self._stat(path)
+            self.digests[path] = self._digest(path)
+        for path in set(self.stats) - paths:
+            del self.stats[path]
+            del self.digests[path]
+
+    def poll(self):
+        """
+        Returns the paths whose size or modification time changed since the last poll.
+        """
+        touched = set()
+        for path, old_stat in self.stats.items():
+            stat = self._stat(path)
+            if stat != old_stat:
+                self.stats[path] = stat
+                touched.add(path)
+        return touched
+
+    def changed(self, paths):
+        """
+        Returns the paths whose contents are different from when they were last hashed.
+        """
+        changed = set()
+        for path in paths:
+            digest = self._digest(path)
+            if digest != self.digests.get(path):
+                self.digests[path] = digest
+                changed.add(path)
+        return changed
+
+
+def build(graph, outputs):
+    """
+    Converts each of the outputs again, a failed conversion is printed and does not stop the others.
+    Uploads are only repeated for inputs whose contents changed as the upload cache is keyed by contents.
+    """
+    for output in outputs:
+        args = graph.jobs[output]
+        start = time.perf_counter()
+        try:
+            reports = obj_to_html(args)
+            print(f"Built {args.output} in {time.perf_counter() - start:.3f}s")
+            for report in reports:
+                print(report)
+        except Exception as e:
+            print(f"ERROR: Building {args.output} failed: {type(e).__name__}: {e}")
+
+        # The MTL may now reference different textures
+        graph.add(args)
+
+
+def watch(all_args, interval=DEFAULT_INTERVAL, debounce=DEFAULT_DEBOUNCE, max_polls=None):
+    """
+    Builds every output and then rebuilds only the outputs whose inputs change, until interrupted.
+
+    Args:
+    - all_args          : one argument namespace per output HTML
+    - interval          : the seconds between polls
+    - debounce          : the seconds without further changes before a burst of saves is rebuilt
+    - max_polls         : stop after this many polls, None to watch forever
+    """
+    graph = DependencyGraph()
+    watcher = FileWatcher()
+    for args in all_args:
+        graph.add(args)
+
+    build(graph, sorted(graph.jobs))
+    watcher.track(graph.watched())
+    print(f"Watching {len(graph.watched())} files for {len(graph.jobs)} outputs, press Ctrl+C to stop.")
+
+    polls = 0
+    touched = set()
+    last_touched = None
+    while max_polls is None or polls < max_polls:
+        time.sleep(interval)
+        polls += 1
+
+        # Coalesce a burst of saves, only rebuilding once nothing has changed for the debounce period
+        newly_touched = watcher.poll()
+        if newly_touched:
+            touched |= newly_touched
+            last_touched = time.monotonic()
+            continue
+        if not touched or time.monotonic() - last_touched < debounce:
+            continue
+
+        changed = watcher.changed(touched)
+        touched = set()
+        outputs = graph.affected(changed)
+        if outputs:
+            print(f"\n{len(changed)} changed: {', '.join(sorted(changed))}")
+            build(graph, outputs)
+            watcher.track(graph.watched())
@@ -0,0 +1,81 @@
+import json
+import numpy as np
+import pytest
+from obj2html.parser.geometry_export import load_mesh
+from obj2html.parser.geometry_bvh import build_bvh, closest_point
+from obj2html.parser.annotation_parser import load_annotations, snap_annotations, annotations_json, Annotation
+
+
+# A flat unit square in the XY plane
+QUAD = b"v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\nf 1 2 3 4\n"
+
+# A unit cube
+CUBE = b"""v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0 0 1
+v 1 0 1
+v 1 1 1
+v 0 1 1
+f 1 4 3 2
+f 5 6 7 8
+f 1 2 6 5
+f 2 3 7 6
+f 3 4 8 7
+f 4 1 5 8
+"""
+
+
+def mesh_bvh(tmp_path, data):
+    obj_file = tmp_path / "model.obj"
+    obj_file.write_bytes(data)
+    return build_bvh(load_mesh(str(obj_file))[0], leaf_size=2)
+
+
+def test_closest_point(tmp_path):
+    bvh = mesh_bvh(tmp_path, CUBE)
+    surface = closest_point(bvh, [0.5, 0.5, 3])
+
+    assert np.allclose(surface.point, [0.5, 0.5, 1], atol=1e-4)
+    assert np.allclose(np.abs(surface.normal), [0, 0, 1], atol=1e-4)
+    assert surface.distance == pytest.approx(2, abs=1e-4)
+
+
+def test_snap_flat_model(tmp_path, capsys):
+    bvh = mesh_bvh(tmp_path, QUAD)
+    on_surface = Annotation("on", "", [0.5, 0.5, 0], None, None)
+    off_surface = Annotation("off", "", [0.5, 0.5, 0.2], None, None)
+
+    snapped = snap_annotations([on_surface, off_surface], bvh)
+
+    # The camera is placed from the size of the quad, the flat Z axis adds nothing to it
+    camera = np.array(snapped[0].camera)
+    assert np.allclose(camera[:2], [0.5, 0.5])
+    assert abs(camera[2]) == pytest.approx(np.sqrt(2) / 2, rel=1e-3)
+    assert np.allclose(snapped[1].position, [0.5, 0.5, 0], atol=1e-4)
+    assert snapped[1].look_at == snapped[1].position
+
+    warnings = capsys.readouterr().out
+    assert "'off'" in warnings and "'on'" not in warnings
+
+
+def test_load_annotations(tmp_path):
+    json_file = tmp_path / "annotations.json"
+    json_file.write_text(json.dumps({"annotations": [{"label": "Top", "text": "</script>", "position": [0, 0, 1]}]}))
+    csv_file = tmp_path / "annotations.csv"
+    csv_file.write_text("title,description,x,y,z,cam_x,cam_y,cam_z\nTop,,0,0,1,0,0,5\n")
+
+    from_json = load_annotations(str(json_file))
+    from_csv = load_annotations(str(csv_file))
+
+    assert from_json == [Annotation("Top", "</script>", [0, 0, 1], None, None)]
+    assert from_csv == [Annotation("Top", "", [0, 0, 1], [0, 0, 5], None)]
+    assert "</script>" not in annotations_json(from_json)
+
+
+def test_invalid_annotation(tmp_path):
+    json_file = tmp_path / "annotations.json"
+    json_file.write_text(json.dumps([{"title": "Bad", "position": [0, 1]}]))
+    with pytest.raises(ValueError):
+        load_annotations(str(json_file))
@@ -0,0 +1,64 @@
+import os
+import argparse
+import pytest
+from obj2html.utils.cli_utils import add_conversion_arguments
+from obj2html.utils.batch_utils import glob_root, find_obj_files, load_manifest, job_to_args, check_outputs, run_batch
+
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "default.html")
+
+TRIANGLE = b"v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n"
+
+
+def defaults(*argv):
+    parser = argparse.ArgumentParser()
+    add_conversion_arguments(parser, batch=True)
+    return parser.parse_args(["--template_file", TEMPLATE_FILE, *argv])
+
+
+def write_models(tmp_path, *names):
+    for name in names:
+        path = tmp_path / "models" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(TRIANGLE)
+
+
+def test_glob_root():
+    assert glob_root("models/**/*.obj") == "models"
+    assert glob_root("models/a*/tree.obj") == "models"
+    assert glob_root("*.obj") == "."
+
+
+def test_same_names_in_subdirectories(tmp_path):
+    write_models(tmp_path, "a/tree.obj", "b/tree.obj")
+    jobs = find_obj_files(str(tmp_path / "models" / "**" / "*.obj"))
+    all_args = [job_to_args(job, defaults(), "out") for job in jobs]
+
+    assert [args.output for args in all_args] == [os.path.join("out", "a", "tree.html"), os.path.join("out", "b", "tree.html")]
+    assert [args.title for args in all_args] == ["tree", "tree"]
+    assert not hasattr(all_args[0], "name")
+
+
+def test_manifest_collision(tmp_path):
+    write_models(tmp_path, "a/tree.obj", "b/tree.obj")
+    manifest = tmp_path / "models.csv"
+    manifest.write_text("obj,title\nmodels/a/tree.obj,A\nmodels/b/tree.obj,B\n")
+
+    all_args = [job_to_args(job, defaults(), str(tmp_path / "out")) for job in load_manifest(str(manifest))]
+    with pytest.raises(ValueError):
+        check_outputs(all_args)
+
+
+def test_results_in_job_order(tmp_path):
+    # The same OBJ listed twice with different outputs
+    write_models(tmp_path, "tree.obj")
+    manifest = tmp_path / "models.csv"
+    out = tmp_path / "out"
+    manifest.write_text(f"obj,title,output\nmodels/tree.obj,First,{out / 'first.html'}\nmodels/tree.obj,Second,{out / 'second.html'}\n"
+                        f"missing.obj,Missing,{out / 'missing.html'}\n")
+
+    results = run_batch(load_manifest(str(manifest)), defaults("-f", "bin"), str(out), workers=2)
+
+    assert [os.path.basename(r["output"]) for r in results] == ["first.html", "second.html", "missing.html"]
+    assert [r["ok"] for r in results] == [True, True, False]
+    assert (out / "first.html").exists() and (out / "second.html").exists()
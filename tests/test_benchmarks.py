@@ -0,0 +1,28 @@
+import os
+import pytest
+from benchmarks.generate import generate_model
+from benchmarks.mock_canvas import MockCanvasServer
+from benchmarks.run import run_case
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", "default.html")
+
+
+@pytest.mark.parametrize("output_format", ["obj", "bin"])
+def test_run_case(tmp_path, output_format):
+    model = generate_model(str(tmp_path / "models"), 200, materials=2, texture_size=8)
+    settings = {"template_file": TEMPLATE_FILE, "upload_workers": 2, "quantize": None}
+
+    with MockCanvasServer() as server:
+        result = run_case(model, output_format, settings, server.url, str(tmp_path / "output"))
+        # The geometry, MTL and both textures are uploaded
+        assert server.requests == 4 * 3
+
+    assert {"template_load", "upload", "render", "write"} <= set(result["stages"])
+    assert result["total_seconds"] >= sum(result["stages"].values()) * 0.99
+
+    # The page loads the OBJ itself or the bin converted from it, with the MTL and textures
+    inputs = sum(os.path.getsize(f) for f in [model["mtl_file"]] + model["texture_files"])
+    written = [os.path.join(root, name) for root, _, names in os.walk(tmp_path / "output") for name in names]
+    geometry = model["obj_file"] if output_format == "obj" else next(f for f in written if f.endswith(".bin"))
+    html = next(f for f in written if f.endswith(".html"))
+    assert result["output_bytes"] == inputs + os.path.getsize(geometry) + os.path.getsize(html)
@@ -0,0 +1,68 @@
+import json
+import base64
+import pytest
+from obj2html.utils.bundle_utils import (minify_js, page_modules, module_imports, import_map, module_url, missing_vendor,
+                                         MODULES, CORE_MODULES)
+
+
+@pytest.mark.parametrize("source, minified", [
+    # Comment markers inside strings are kept, comments are dropped
+    ('var s = "a // not a comment";  // comment\nvar t = \'/* nor this */\';\n',
+     'var s="a // not a comment";\nvar t=\'/* nor this */\';\n'),
+    # A slash after an operand is a division, otherwise a regular expression which is copied as is
+    ('var re = /ab+c\\/[/"]/gi;\nvar d = a / b / c;\nreturn /x/.test( y );\n',
+     'var re=/ab+c\\/[/"]/gi;\nvar d=a/b/c;\nreturn/x/.test(y);\n'),
+    # Template literals keep their text, their substitutions are minified
+    ('var t = `line ${ { a: "}" }.a } // kept\n  ${ `nested ${ x }` } /* kept */`;\n',
+     'var t=`line ${{a:"}"}.a} // kept\n  ${`nested ${x}`} /* kept */`;\n'),
+    # Spaces are only kept where dropping them would join two tokens
+    ('/* header\n comment */\nfunction f ( a ) {\n\n    return a + +b - -c;\n}\nvar n = 1 .toString();\n',
+     'function f(a){\nreturn a+ +b- -c;\n}\nvar n=1 .toString();\n'),
+    # Line breaks are kept so automatic semicolon insertion still applies
+    ('let a = b\n(c)\nx = y\n++z\n', 'let a=b\n(c)\nx=y\n++z\n'),
+])
+def test_minify_js(source, minified):
+    assert minify_js(source) == minified
+
+
+def test_page_modules():
+    # Only the loaders the load string uses are added to the core modules
+    assert page_modules("new OBJLoader( manager )") == list(CORE_MODULES) + ["OBJLoader"]
+    modules = page_modules("new MTLLoader( manager ); new OBJLoader(); manager.addHandler( /dds/, new DDSLoader() );")
+    assert modules == list(CORE_MODULES) + ["OBJLoader", "MTLLoader", "DDSLoader"]
+    assert page_modules("new GLTFLoaderX()") == list(CORE_MODULES)
+
+    imports = module_imports(modules)
+    assert "import { OBJLoader } from '" + module_url("OBJLoader") + "';" in imports
+    assert "OrbitControls" not in imports
+
+
+def vendor(tmp_path):
+    for name, (path, _) in MODULES.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(f"import * as THREE from '../../../build/three.module.js';\n// {name}\nexport const {name} = 1;\n")
+    return str(tmp_path)
+
+
+def decode(url):
+    assert url.startswith("data:text/javascript;base64,")
+    return base64.b64decode(url.split(",", 1)[1]).decode("utf-8")
+
+
+def test_import_map(tmp_path):
+    vendor_dir = vendor(tmp_path)
+    html = import_map(["OBJLoader"], vendor_dir)
+
+    assert html.startswith('<script type="importmap">') and html.endswith("</script>")
+    imports = json.loads(html[len('<script type="importmap">'):-len("</script>")])["imports"]
+
+    # three.js is always mapped as the example modules import it by its CDN URL
+    assert set(imports) == {module_url("OBJLoader"), module_url("THREE")}
+    loader = decode(imports[module_url("OBJLoader")])
+    assert loader == f"import*as THREE from'{module_url('THREE')}';\nexport const OBJLoader=1;\n"
+
+
+def test_missing_vendor(tmp_path):
+    assert len(missing_vendor(vendor_dir=str(tmp_path))) == len(MODULES)
+    with pytest.raises(FileNotFoundError):
+        import_map(["OBJLoader"], str(tmp_path))
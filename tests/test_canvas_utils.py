@@ -0,0 +1,50 @@
+import pytest
+from benchmarks.mock_canvas import MockCanvasServer
+from obj2html.utils.canvas_utils import UploadSession, file_to_link, autoconvert_files
+from obj2html.utils.upload_cache import UploadCache
+
+
+@pytest.fixture
+def server():
+    with MockCanvasServer() as server:
+        yield server
+
+
+def write_files(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"chunk_{i}.bin"
+        path.write_bytes(bytes([i]) * (i + 1))
+        paths.append(str(path))
+    return paths
+
+
+def test_cached_upload(tmp_path, server):
+    path, = write_files(tmp_path, 1)
+    cache = UploadCache(str(tmp_path / "cache.json"))
+    link = file_to_link(path, "token", "models", server.url, cache=cache)
+
+    # The same contents are not uploaded again, without a session one is made for the call
+    assert file_to_link(path, "token", "models", server.url, cache=cache) == link
+    assert server.requests == 3
+
+
+def test_autoconvert_files(tmp_path, server):
+    obj_file, texture_file = write_files(tmp_path, 2)
+    mtl_file = tmp_path / "model.mtl"
+    mtl_file.write_text(f"newmtl a\nmap_Kd {texture_file}\n")
+
+    with UploadSession(max_workers=2) as session:
+        obj_url, texture_url, mtl_url = autoconvert_files(obj_file, None, str(mtl_file), "token", "models", server.url,
+                                                          session=session, output_dir=str(tmp_path))
+
+    assert obj_url != mtl_url and texture_url is None
+    # The MTL is uploaded with the link of its texture
+    online_mtl = (tmp_path / "model_online.mtl").read_text()
+    assert server.url in online_mtl and texture_file not in online_mtl
+    assert server.requests == 9
+    assert len(session.timings) == 3
+
+    # The pool is closed with the session
+    with pytest.raises(RuntimeError):
+        session.submit(print)
@@ -0,0 +1,54 @@
+import argparse
+import pytest
+from obj2html.utils.cli_utils import add_conversion_arguments, validate_conversion_args
+from obj2html.utils.bundle_utils import MODULES
+
+
+def parse(argv, batch=False):
+    parser = argparse.ArgumentParser()
+    add_conversion_arguments(parser, batch=batch)
+    args = parser.parse_args(argv)
+    validate_conversion_args(parser, args)
+    return args
+
+
+def test_bundle_needs_vendored_modules(monkeypatch, tmp_path):
+    monkeypatch.setattr("obj2html.utils.bundle_utils.get_vendor_dir", lambda: str(tmp_path))
+    with pytest.raises(SystemExit):
+        parse(["--bundle"])
+
+    for path, _ in MODULES.values():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("export {};")
+    assert parse(["--bundle"]).bundle
+
+    # The import map would be repeated in every shared viewer page
+    with pytest.raises(SystemExit):
+        parse(["--bundle", "--shared_viewer"])
+
+
+def test_defaults():
+    args = parse([])
+    # The camera is framed from the model unless it is given
+    assert (args.min_camera, args.max_camera, args.z_pos) == (None, None, None)
+    assert args.output_format == "obj" and args.texture is None and args.trace is None
+
+
+def test_batch_arguments():
+    # Texture and MTL files are given per job and there are no diagnostics
+    args = parse(["-f", "bin", "--quantize"], batch=True)
+    assert args.quantize and not hasattr(args, "texture") and not hasattr(args, "trace")
+
+
+@pytest.mark.parametrize("argv", [["--quantize"],
+                                  ["--vertex_cache"],
+                                  ["--auto_convert"],
+                                  ["--auto_convert", "--access_token", "token", "--inline_geometry"],
+                                  ["--shared_viewer", "--inline_geometry"],
+                                  ["--position_bits", "0"],
+                                  ["--normal_bits", "1"],
+                                  ["--uv_bits", "17"],
+                                  ["--upload_workers", "0"]])
+def test_invalid_combinations(argv):
+    with pytest.raises(SystemExit):
+        parse(argv)
@@ -0,0 +1,68 @@
+import json
+import numpy as np
+import pytest
+from obj2html.parser.geometry_export import load_mesh
+from obj2html.parser.geometry_chunks import write_chunks, format_chunks, simplify, Part
+
+
+def grid_obj(size):
+    # A flat grid of quads with many tiny triangles
+    lines = [b"v %d %d 0" % (x, y) for y in range(size + 1) for x in range(size + 1)]
+    for y in range(size):
+        for x in range(size):
+            i = y * (size + 1) + x + 1
+            lines.append(b"f %d %d %d %d" % (i, i + 1, i + size + 2, i + size + 1))
+    return b"\n".join(lines) + b"\n"
+
+
+def write(tmp_path, data, chunk_triangles):
+    obj_file = tmp_path / "model.obj"
+    obj_file.write_bytes(data)
+    return write_chunks(load_mesh(str(obj_file))[0], str(tmp_path / "chunks"), chunk_triangles)
+
+
+def test_write_chunks(tmp_path, capsys):
+    index = write(tmp_path, grid_obj(16), 64)
+    nodes = index["nodes"]
+    leaves = [node for node in nodes if not node["children"]]
+
+    # The leaves hold every triangle once and parents are coarser copies of their children
+    assert sum(node["triangles"] for node in leaves) == index["triangles"] == 512
+    assert all(node["triangles"] <= 64 for node in leaves)
+    assert nodes[index["root"]]["error"] > 0
+    assert json.loads((tmp_path / "chunks" / "index.json").read_text()) == index
+    assert all((tmp_path / "chunks" / node["file"]).exists() for node in nodes)
+
+    # The summary is printed by the entry points
+    assert capsys.readouterr().out == ""
+    assert format_chunks(index).startswith(f"Wrote {len(nodes)} chunks ({len(leaves)} full detail)")
+
+
+def test_collapsed_parent():
+    # Three small triangles which all collapse on the coarsest grid are kept as they are
+    positions = np.array([[0.282, 0.142, 0.026], [0.282, 0.142, 0.026], [0.718, 0.862, 0.428], [0.718, 0.862, 0.428],
+                          [0.358, 0.174, 0.069], [0.358, 0.174, 0.069], [0.663, 0.686, 0.043], [0.518, 0.385, 0.096],
+                          [0.179, 0.109, 0.373]], dtype=np.float32)
+    part = Part(positions, None, None, np.array([[4, 2, 0], [5, 3, 1], [8, 7, 6]], dtype=np.uint32), np.zeros(3, dtype=np.int32))
+
+    simplified, cell_size = simplify(part, 3)
+    assert len(simplified.indices) == 3 and cell_size == 0.0
+
+    # Unless they are too many, then only the largest are kept and the error is the size of the part
+    simplified, cell_size = simplify(part, 2)
+    assert len(simplified.indices) == 2 and cell_size == np.ptp(positions, axis=0).max()
+    assert simplified.positions.tolist() == positions[[0, 2, 4, 6, 7, 8]].tolist()
+
+
+def test_coarse_levels_capped(tmp_path):
+    # Scattered triangles which no grid can merge still give a root no larger than a chunk
+    rng = np.random.default_rng(1)
+    corners = rng.random((300, 3))
+    lines = [b"v %f %f %f" % tuple(corner) for corner in corners] + [b"f %d %d %d" % (i, i + 1, i + 2) for i in range(1, 301, 3)]
+    index = write(tmp_path, b"\n".join(lines) + b"\n", 16)
+    assert all(node["triangles"] <= 16 for node in index["nodes"])
+
+
+def test_no_faces(tmp_path):
+    with pytest.raises(ValueError, match="no triangles"):
+        write(tmp_path, b"v 0 0 0\nv 1 0 0\n", 64)
@@ -0,0 +1,97 @@
+import json
+import struct
+import numpy as np
+import pytest
+from obj2html.parser.geometry_export import load_mesh, write_buffers, BUFFERS_MAGIC, DEFAULT_MATERIAL
+from obj2html.parser.geometry_encoding import Quantization, dequantize_range, decode_octahedral, delta_decode_indices
+
+
+OBJ = b"""v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0 0 1
+vt 0 0
+vt 1 0
+vt 1 1
+vn 0 0 1
+f 1/1/1 2/2/1 3/3/1
+usemtl red
+f 1/1/1 3/3/1 4/3/1
+f 1 2 5
+"""
+
+
+def load(tmp_path, data=OBJ):
+    obj_file = tmp_path / "model.obj"
+    obj_file.write_bytes(data)
+    return load_mesh(str(obj_file))[0]
+
+
+def read_bin(bin_file):
+    # Returns the JSON header and the whole file of the bin format
+    with open(bin_file, 'rb') as f:
+        data = f.read()
+    assert data[:4] == BUFFERS_MAGIC
+    header_length = struct.unpack("<I", data[8:12])[0]
+    return json.loads(data[12:12 + header_length]), data
+
+
+def section(data, header, name, dtype, count):
+    return np.frombuffer(data, dtype=dtype, count=count, offset=header[name]["byteOffset"])
+
+
+def test_write_buffers(tmp_path):
+    mesh = load(tmp_path)
+    header, data = read_bin(write_buffers(mesh, str(tmp_path / "model.bin"))[0])
+
+    vertices = section(data, header, "vertices", "<f4", header["vertexCount"] * header["stride"]).reshape(-1, header["stride"])
+    position = header["attributes"]["position"]
+    assert np.array_equal(vertices[:, position["offset"]:position["offset"] + 3], mesh.positions)
+    index_type = "<u2" if header["index"]["type"] == "uint16" else "<u4"
+    assert np.array_equal(section(data, header, "index", index_type, header["indexCount"]), mesh.indices.reshape(-1))
+
+
+def test_default_material(tmp_path):
+    # Faces before any usemtl are named so the page never creates a material for null
+    header, _ = read_bin(write_buffers(load(tmp_path), str(tmp_path / "model.bin"))[0])
+    assert [group["material"] for group in header["groups"]] == [DEFAULT_MATERIAL, "red"]
+    assert sum(group["count"] for group in header["groups"]) == 3
+
+
+def test_quantized_round_trip(tmp_path, capsys):
+    mesh = load(tmp_path)
+    out_file, errors = write_buffers(mesh, str(tmp_path / "model.bin"), Quantization(10, 8, 12))
+    header, data = read_bin(out_file)
+    count = header["vertexCount"]
+
+    # The decoded attributes are within the error returned for printing
+    position = header["position"]
+    positions = dequantize_range(section(data, header, "position", "<u2", count * 3).reshape(-1, 3),
+                                 np.array(position["min"]), np.array(position["scale"]))
+    assert np.abs(positions - mesh.positions).max() == pytest.approx(errors["position"])
+    assert errors["position"] <= (np.ptp(mesh.positions, axis=0).max() / 1023) / 2 + 1e-6
+
+    normals = decode_octahedral(section(data, header, "normal", "<u1", count * 2).reshape(-1, 2), 8)
+    lengths = np.linalg.norm(mesh.normals, axis=1)
+    valid = lengths > 0
+    cosines = (normals[valid] * (mesh.normals[valid] / lengths[valid, None])).sum(axis=1)
+    assert np.degrees(np.arccos(np.clip(cosines, -1, 1))).max() <= errors["normal_degrees"] + 1e-3
+
+    uv = header["uv"]
+    texcoords = dequantize_range(section(data, header, "uv", "<u2", count * 2).reshape(-1, 2),
+                                 np.array(uv["min"]), np.array(uv["scale"]))
+    assert np.abs(texcoords - mesh.texcoords).max() <= errors["uv"] + 1e-7
+
+    # The delta and zigzag encoded indices are lossless
+    index_type = "<u2" if header["index"]["type"] == "uint16" else "<u4"
+    indices = delta_decode_indices(section(data, header, "index", index_type, header["indexCount"]))
+    assert np.array_equal(indices, mesh.indices.reshape(-1))
+    assert capsys.readouterr().out == ""
+
+
+def test_quantized_empty_mesh(tmp_path):
+    # A file without faces has no range to quantize and writes an empty bin
+    mesh = load(tmp_path, b"o empty\n")
+    header, _ = read_bin(write_buffers(mesh, str(tmp_path / "model.bin"), Quantization(16, 8, 12))[0])
+    assert header["vertexCount"] == 0 and header["indexCount"] == 0
@@ -0,0 +1,39 @@
+import numpy as np
+from obj2html.parser.geometry_export import load_mesh
+from obj2html.parser.geometry_optimize import Optimization, DEFAULT_CACHE_SIZE, format_report
+
+
+# Two materials used twice each, the quad repeats its corners with the same values
+OBJ = b"""v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0 0 0
+v 1 1 0
+usemtl a
+f 1 2 3
+usemtl b
+f 5 6 4
+usemtl a
+f 2 3 4
+usemtl b
+f 1 2 4
+"""
+
+
+def test_optimize_mesh(tmp_path, capsys):
+    obj_file = tmp_path / "model.obj"
+    obj_file.write_bytes(OBJ)
+    plain, _ = load_mesh(str(obj_file))
+    mesh, report = load_mesh(str(obj_file), Optimization(True, DEFAULT_CACHE_SIZE))
+
+    # Identical corners are welded and each material is one draw call
+    assert (report.vertices_before, report.vertices_after) == (plain.vertex_count, 4)
+    assert (report.draw_calls_before, report.draw_calls_after) == (4, 2)
+    assert report.normals_computed == plain.vertex_count and mesh.normals is not None
+    assert np.array_equal(np.sort(mesh.positions[mesh.indices].reshape(-1, 9), axis=0),
+                          np.sort(plain.positions[plain.indices].reshape(-1, 9), axis=0))
+
+    # The report is printed by the entry points
+    assert capsys.readouterr().out == ""
+    assert "draw calls" in format_report(report)
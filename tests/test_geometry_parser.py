@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+from obj2html.parser.geometry_parser import parse_obj, parse_obj_block, parse_obj_parallel, count_obj_block, split_lines, Group, MISSING_INDEX
+
+
+OBJ = b"""mtllib model.mtl
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+vt 0 0
+vt 1 0
+vt 1 1
+vn 0 0 1
+o quad
+f 1/1/1 2/2/1 3/3/1 4/3/1
+usemtl red
+g tri
+f -4 -3 -2
+"""
+
+
+def write_obj(tmp_path, data, name="model.obj"):
+    obj_file = tmp_path / name
+    obj_file.write_bytes(data)
+    return str(obj_file)
+
+
+def test_parse_obj(tmp_path):
+    geometry = parse_obj(write_obj(tmp_path, OBJ))
+
+    assert geometry.positions.tolist() == [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]]
+    assert geometry.texcoords.tolist() == [[0, 0], [1, 0], [1, 1]]
+    assert geometry.normals.tolist() == [[0, 0, 1]]
+    # The quad is fan triangulated and the negative indices count back from the last position
+    assert geometry.position_index.tolist() == [[0, 1, 2], [0, 2, 3], [0, 1, 2]]
+    assert geometry.texcoord_index.tolist() == [[0, 1, 2], [0, 2, 2], [MISSING_INDEX] * 3]
+    assert geometry.normal_index.tolist() == [[0, 0, 0], [0, 0, 0], [MISSING_INDEX] * 3]
+    assert geometry.material_groups == [Group(None, 0, 2), Group("red", 2, 1)]
+    assert geometry.object_groups == [Group("quad", 0, 2), Group("tri", 2, 1)]
+    assert geometry.mtllibs == ["model.mtl"]
+
+
+def assert_same_geometry(a, b):
+    for name in ("positions", "texcoords", "normals", "position_index", "texcoord_index", "normal_index"):
+        assert np.array_equal(getattr(a, name), getattr(b, name)), name
+    assert a.material_groups == b.material_groups
+    assert a.object_groups == b.object_groups
+    assert a.mtllibs == b.mtllibs
+
+
+def test_chunks_match_whole_file(tmp_path):
+    obj_file = write_obj(tmp_path, OBJ)
+    # Chunks smaller than a line are cut at the next newline
+    assert_same_geometry(parse_obj(obj_file), parse_obj(obj_file, chunk_size=7))
+
+
+def grid_obj(size):
+    # A grid of quads with texture coordinates, normals, negative indices and a material per row
+    lines = [b"mtllib grid.mtl"]
+    for y in range(size + 1):
+        for x in range(size + 1):
+            lines += [b"v %d %d %d" % (x, y, (x * y) % 3), b"vt %f %f" % (x / size, y / size), b"vn 0 0 1"]
+    for y in range(size):
+        lines.append(b"usemtl row%d" % y)
+        for x in range(size):
+            i = y * (size + 1) + x + 1
+            corners = (i, i + 1, i + size + 2, i + size + 1)
+            if x % 2:
+                lines.append(b"f " + b" ".join(b"%d/%d/%d" % (c, c, c) for c in corners))
+            else:
+                count = (size + 1) ** 2
+                lines.append(b"f " + b" ".join(b"%d//%d" % (c - count - 1, c) for c in corners))
+    return b"\n".join(lines) + b"\n"
+
+
+def test_split_lines():
+    data = grid_obj(8)
+    ranges = split_lines(data, 100)
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    assert all(data[end - 1:end] == b"\n" for _, end in ranges)
+
+
+def test_parallel_matches_serial(tmp_path):
+    obj_file = write_obj(tmp_path, grid_obj(20))
+    serial = parse_obj(obj_file, workers=1)
+    # Small ranges so every worker parses several, with markers and negative indices across range boundaries
+    parallel = parse_obj_parallel(obj_file, workers=2, range_size=512)
+
+    assert serial.triangle_count == 800
+    assert_same_geometry(serial, parallel)
+
+
+def test_no_trailing_newline(tmp_path):
+    geometry = parse_obj(write_obj(tmp_path, b"v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3"))
+    assert geometry.position_index.tolist() == [[0, 1, 2]]
+
+
+def test_indented_lines():
+    # Statements are classified after their indentation like OBJLoader trims lines
+    plain = parse_obj_block(b"v 0 0 0\nv 1 0 0\nv 0 1 0\nusemtl a\nf 1 2 3\n")
+    indented = parse_obj_block(b"  v 0 0 0\n\tv 1 0 0\nv 0 1 0\n  usemtl a\n \t f 1 2 3\n   \n")
+
+    assert indented.positions.tolist() == plain.positions.tolist()
+    assert indented.position_index.tolist() == plain.position_index.tolist()
+    assert indented.markers == plain.markers
+    assert count_obj_block(b"  v 0 0 0\n v 1 0 0\n v 0 1 0\n f 1 2 3\n") == (3, 0, 0, 1)
+
+
+def test_malformed_face():
+    with pytest.raises(ValueError):
+        parse_obj_block(b"v 0 0 0\nv 1 0 0\nf 1 2\n")
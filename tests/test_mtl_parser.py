@@ -0,0 +1,71 @@
+import os
+import pytest
+from obj2html.parser.mtl_parser import tokenize_map, parse_mtl, find_textures, rewrite_mtl, material_colour, material_opacity
+
+MTL = """# Exported model
+newmtl wood
+Ka 0.2 0.2 0.2
+Kd 0.8 0.6 0.4
+d 0.5
+map_Kd -s 1 1 1 -bm 0.5 textures/oak planks.png
+bump -bm 0.2 textures/oak_bump.png
+
+newmtl metal
+Tr 0.25
+map_Kd -o 0.5 0.5 -clamp on ./textures/oak planks.png
+map_Ks https://example.com/metal.png
+map_Ns missing.png
+"""
+
+
+@pytest.mark.parametrize("value, options, texture", [
+    ("texture.png", [], "texture.png"),
+    # File names can have spaces
+    ("my texture.png", [], "my texture.png"),
+    ("-bm 0.5 normal.png", ["-bm", "0.5"], "normal.png"),
+    # -o, -s and -t take one to three numbers
+    ("-s 2 tiled.png", ["-s", "2"], "tiled.png"),
+    ("-o 0.5 0.5 -s 1 1 1 my texture.png", ["-o", "0.5", "0.5", "-s", "1", "1", "1"], "my texture.png"),
+    ("-mm 0 1 -clamp on -imfchan r height map.png", ["-mm", "0", "1", "-clamp", "on", "-imfchan", "r"], "height map.png"),
+    # A file named like a number is still the file
+    ("-s 1 1 2", ["-s", "1", "1"], "2"),
+])
+def test_tokenize_map(value, options, texture):
+    assert tokenize_map(value) == (options, texture)
+
+
+def write_mtl(tmp_path, data=MTL):
+    mtl_file = tmp_path / "model.mtl"
+    mtl_file.write_text(data)
+    return str(mtl_file)
+
+
+def test_parse_mtl(tmp_path):
+    materials = parse_mtl(write_mtl(tmp_path))
+
+    assert set(materials) == {"wood", "metal"}
+    assert materials["wood"]["map_Kd"] == os.path.join(str(tmp_path), "textures/oak planks.png")
+    assert materials["metal"]["map_Ks"] == "https://example.com/metal.png"
+    assert material_colour(materials["wood"]) == (0.8, 0.6, 0.4)
+    assert material_colour(materials["metal"]) == (0.8, 0.8, 0.8)
+    assert (material_opacity(materials["wood"]), material_opacity(materials["metal"])) == (0.5, 0.75)
+
+
+def test_find_textures(tmp_path):
+    # Both paths to the planks are one texture, links and missing files are listed too
+    textures = find_textures(write_mtl(tmp_path))
+    assert textures == [os.path.join(str(tmp_path), "textures/oak planks.png"),
+                        os.path.join(str(tmp_path), "textures/oak_bump.png"),
+                        "https://example.com/metal.png",
+                        os.path.join(str(tmp_path), "missing.png")]
+
+
+def test_rewrite_mtl(tmp_path):
+    mtl_file = write_mtl(tmp_path)
+    planks = os.path.join(str(tmp_path), "textures", "oak planks.png")
+    out_file = rewrite_mtl(mtl_file, {planks: "https://canvas/files/1"}, str(tmp_path / "model_online.mtl"))
+
+    # Only the statements of the linked texture change, with their options kept
+    expected = MTL.replace("map_Kd -s 1 1 1 -bm 0.5 textures/oak planks.png", "map_Kd -s 1 1 1 -bm 0.5 https://canvas/files/1")
+    expected = expected.replace("map_Kd -o 0.5 0.5 -clamp on ./textures/oak planks.png", "map_Kd -o 0.5 0.5 -clamp on https://canvas/files/1")
+    assert open(out_file).read() == expected
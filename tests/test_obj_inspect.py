@@ -0,0 +1,101 @@
+import os
+import math
+import argparse
+import pytest
+from obj2html.parser import obj_inspect
+from obj2html.parser.obj_inspect import inspect_obj, cached_inspect, camera_framing, format_stats, DEFAULT_FRAMING, CAMERA_FOV
+from obj2html.parser.obj_parser import obj_to_html
+from obj2html.utils.cli_utils import add_conversion_arguments
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", "default.html")
+
+OBJ = b"""mtllib model.mtl
+v -1 -1 -1
+v 1 -1 -1
+v 1 1 -1
+v -1 1 1
+vt 0 0
+vn 0 0 1
+f 1 2 3
+usemtl red
+f 1 2 3 4
+usemtl blue
+f -4 -3 -2
+"""
+
+
+def write_obj(tmp_path, data=OBJ):
+    obj_file = tmp_path / "model.obj"
+    obj_file.write_bytes(data)
+    return str(obj_file)
+
+
+def no_parse(*args, **kwargs):
+    raise AssertionError("the OBJ was parsed")
+
+
+def test_inspect_obj(tmp_path, monkeypatch):
+    # The inspection only scans the file, small ranges so the materials continue across them
+    monkeypatch.setattr("obj2html.parser.geometry_parser.parse_obj_block", no_parse)
+    stats = inspect_obj(write_obj(tmp_path), range_size=16)
+
+    assert (stats.vertices, stats.texcoords, stats.normals, stats.faces, stats.triangles) == (4, 1, 1, 3, 4)
+    assert stats.minimum == [-1, -1, -1] and stats.maximum == [1, 1, 1]
+    assert stats.centroid == [0, 0, -0.5]
+    assert stats.materials == [[None, 1], ["red", 2], ["blue", 1]]
+    assert stats.mtllibs == ["model.mtl"]
+    assert "--z_pos" in format_stats("model.obj", stats)
+
+
+def test_inspect_empty(tmp_path):
+    stats = inspect_obj(write_obj(tmp_path, b""))
+    assert stats.vertices == 0 and stats.minimum is None and stats.centroid is None
+    assert camera_framing(stats) == DEFAULT_FRAMING
+
+
+def test_camera_framing(tmp_path):
+    framing = camera_framing(inspect_obj(write_obj(tmp_path)))
+
+    # The sphere around the origin holding the box fits the field of view, with a margin
+    z_pos = math.sqrt(3) / math.sin(math.radians(CAMERA_FOV) / 2) * obj_inspect.FRAMING_MARGIN
+    assert framing.z_pos == pytest.approx(z_pos, rel=1e-2)
+    assert framing.min_camera < framing.z_pos < framing.max_camera
+    assert camera_framing(None) == DEFAULT_FRAMING
+
+
+def test_cached_inspect(tmp_path, monkeypatch):
+    obj_file = write_obj(tmp_path)
+    cache_file = str(tmp_path / "inspect_cache.json")
+    stats = cached_inspect(obj_file, cache_file)
+
+    # The same contents are not scanned again, other contents are
+    monkeypatch.setattr(obj_inspect, "inspect_obj", no_parse)
+    assert cached_inspect(obj_file, cache_file) == stats
+    with open(obj_file, 'ab') as f:
+        f.write(b"v 5 5 5\n")
+    with pytest.raises(AssertionError):
+        cached_inspect(obj_file, cache_file)
+
+
+def test_corrupt_cache(tmp_path, capsys):
+    cache_file = tmp_path / "inspect_cache.json"
+    cache_file.write_text("{not json")
+    assert cached_inspect(write_obj(tmp_path), str(cache_file)).vertices == 4
+    assert "WARNING" in capsys.readouterr().out
+
+
+def test_framed_page(tmp_path, monkeypatch, capsys):
+    # Framing an OBJ page needs the inspection only, the camera is returned for the entry point to print
+    monkeypatch.setattr("obj2html.parser.geometry_export.parse_obj", no_parse)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('obj_file')
+    parser.add_argument('output')
+    parser.add_argument('title')
+    add_conversion_arguments(parser)
+    args = parser.parse_args([write_obj(tmp_path), str(tmp_path / "model.html"), "Model", "--template_file", TEMPLATE_FILE, "-z", "9"])
+
+    reports = obj_to_html(args)
+
+    framing = camera_framing(inspect_obj(args.obj_file))
+    assert reports == [f"Camera: --min_camera {framing.min_camera:g} --max_camera {framing.max_camera:g} --z_pos 9"]
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,68 @@
+import os
+from obj2html.parser.render_engine import RenderEngine, get_engine, get_bytecode_cache_dir
+
+
+def write_template(tmp_path, name, text):
+    template_file = tmp_path / "templates" / name
+    template_file.parent.mkdir(exist_ok=True)
+    template_file.write_text(text)
+    return str(template_file)
+
+
+def test_cache_hits(tmp_path):
+    engine = RenderEngine(bytecode_cache_dir=str(tmp_path / "bytecode"))
+    template_file = write_template(tmp_path, "page.html", "<title>{{ title }}</title>")
+
+    # The same template is compiled once however it is named
+    template = engine.get_template(template_file)
+    assert engine.get_template(os.path.relpath(template_file)) is template
+    assert engine.render({"title": "Tree"}, template_file) == "<title>Tree</title>"
+    assert engine.render({"title": "Tree"}, template_file, encoding="utf-8") == b"<title>Tree</title>"
+
+
+def test_evicts_least_recently_used(tmp_path):
+    engine = RenderEngine(cache_size=2, bytecode_cache_dir=str(tmp_path / "bytecode"))
+    files = [write_template(tmp_path, f"{name}.html", name) for name in ("a", "b", "c")]
+
+    a = engine.get_template(files[0])
+    b = engine.get_template(files[1])
+    engine.get_template(files[0])
+    engine.get_template(files[2])
+
+    # b was used least recently so it is compiled again, a is still held
+    assert len(engine.templates) == 2
+    assert engine.get_template(files[0]) is a
+    assert engine.get_template(files[1]) is not b
+
+
+def test_reloads_changed_template(tmp_path):
+    engine = RenderEngine(bytecode_cache_dir=str(tmp_path / "bytecode"))
+    template_file = write_template(tmp_path, "page.html", "old {{ title }}")
+    assert engine.render({"title": "Tree"}, template_file) == "old Tree"
+
+    # An edit gives the file a new modification time, the old compiled copy is dropped
+    with open(template_file, 'w') as f:
+        f.write("new {{ title }}")
+    mtime = os.path.getmtime(template_file) + 10
+    os.utime(template_file, (mtime, mtime))
+    assert engine.render({"title": "Tree"}, template_file) == "new Tree"
+    assert len(engine.templates) == 1
+
+
+def test_bytecode_cache(tmp_path):
+    bytecode_dir = tmp_path / "bytecode"
+    template_file = write_template(tmp_path, "page.html", "{{ title }}")
+    RenderEngine(bytecode_cache_dir=str(bytecode_dir)).get_template(template_file)
+
+    # The compiled template is written to disk and read back by another engine instead of compiling it
+    assert len(os.listdir(bytecode_dir)) == 1
+    cached = os.path.getmtime(bytecode_dir / os.listdir(bytecode_dir)[0])
+    assert RenderEngine(bytecode_cache_dir=str(bytecode_dir)).render({"title": "Tree"}, template_file) == "Tree"
+    assert os.path.getmtime(bytecode_dir / os.listdir(bytecode_dir)[0]) == cached
+
+
+def test_shared_engine(monkeypatch):
+    # The process wide engine keeps its bytecode in the config directory
+    monkeypatch.setattr("obj2html.parser.render_engine._engine", None)
+    assert get_engine() is get_engine()
+    assert os.path.isdir(get_bytecode_cache_dir())
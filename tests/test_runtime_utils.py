@@ -0,0 +1,85 @@
+import os
+import json
+import argparse
+from obj2html.utils.runtime_utils import split_page, shell_page, write_runtime, hash_file_name, RUNTIME_PRELUDE, CONFIG_ID
+from obj2html.utils.cli_utils import add_conversion_arguments
+from obj2html.parser.obj_parser import obj_to_html
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", "default.html")
+
+HTML = """<html><head><title>Tree</title><style>body { margin: 0; }</style></head>
+<body><div id="info"></div>
+<script type="module">import * as THREE from 'three'; load( viewerConfig.obj_file );</script>
+</body></html>"""
+
+
+def test_split_page():
+    page = split_page(HTML)
+    assert page.css == "body { margin: 0; }"
+    assert page.js.startswith("import * as THREE")
+    assert page.head + "<style>" + page.css + "</style>" + page.body + '<script type="module">' + page.js + "</script>" + page.tail == HTML
+
+    # Without a stylesheet before the module script the page is kept whole
+    assert split_page("<html><script type=\"module\">go();</script></html>") is None
+
+
+def test_shell_page():
+    config = {"obj_file": "model.bin", "annotations": [{"title": "</script><script>alert(1)"}]}
+    html = shell_page(split_page(HTML), "viewer.1.css", "viewer.2.js", config)
+
+    assert '<link rel="stylesheet" href="viewer.1.css">' in html
+    assert '<script type="module" src="viewer.2.js"></script>' in html
+    assert "margin" not in html and "THREE" not in html
+
+    # The config cannot close its script element and reads back unchanged
+    start = html.index(f'id="{CONFIG_ID}">') + len(f'id="{CONFIG_ID}">')
+    config_json = html[start:html.index("</script>", start)]
+    assert json.loads(config_json) == config
+
+
+def test_write_runtime(tmp_path):
+    page = split_page(HTML)
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    css_file, js_file = write_runtime(page, str(out_dir))
+
+    # The same page writes the same content-hashed files once
+    assert write_runtime(page, str(out_dir)) == (css_file, js_file)
+    assert sorted(os.listdir(out_dir)) == sorted([os.path.basename(css_file), os.path.basename(js_file)])
+    with open(js_file) as f:
+        assert f.read() == RUNTIME_PRELUDE + page.js
+
+
+def test_hash_file_name(tmp_path):
+    first = tmp_path / "model.bin"
+    first.write_bytes(b"one")
+    second = tmp_path / "other.bin"
+    second.write_bytes(b"one")
+
+    hashed = hash_file_name(str(first))
+    assert not first.exists() and os.path.exists(hashed)
+    assert hashed.endswith(".bin") and os.path.basename(hashed).startswith("model.")
+    assert os.path.basename(hash_file_name(str(second)))[len("other"):] == os.path.basename(hashed)[len("model"):]
+
+
+def test_pages_share_runtime(tmp_path):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('obj_file')
+    parser.add_argument('output')
+    parser.add_argument('title')
+    add_conversion_arguments(parser)
+
+    for name, offset in (("a", 0), ("b", 5)):
+        obj_file = tmp_path / f"{name}.obj"
+        obj_file.write_text(f"v {offset} 0 0\nv {offset + 1} 0 0\nv {offset} 1 0\nf 1 2 3\n")
+        obj_to_html(parser.parse_args([str(obj_file), str(tmp_path / f"{name}.html"), name, "-f", "bin",
+                                       "--shared_viewer", "--template_file", TEMPLATE_FILE]))
+
+    # Different models of the same kind link one runtime and their own hashed geometry
+    runtimes = sorted(f for f in os.listdir(tmp_path) if f.startswith("viewer."))
+    assert len(runtimes) == 2
+    pages = [(tmp_path / f"{name}.html").read_text() for name in ("a", "b")]
+    for page, name in zip(pages, ("a", "b")):
+        assert all(runtime in page for runtime in runtimes)
+        assert f'"obj_file": "{name}.' in page and "<style>" not in page
+    assert not (tmp_path / "a.bin").exists() and len([f for f in os.listdir(tmp_path) if f.endswith(".bin")]) == 2
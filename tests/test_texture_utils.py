@@ -0,0 +1,118 @@
+import os
+import struct
+import argparse
+import numpy as np
+import pytest
+from obj2html.utils.texture_utils import (target_size, encode_bc1_colours, encode_bc3_alpha, write_dds, optimize_texture,
+                                          TextureSettings, _from_565)
+from obj2html.utils.cli_utils import add_conversion_arguments
+from obj2html.parser.obj_parser import obj_to_html
+
+Image = pytest.importorskip("PIL.Image")
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", "default.html")
+
+
+def bc1_palette(encoded):
+    # The (N, 4, 3) colours of (N, 8) BC1 blocks in four colour mode
+    c0 = encoded[:, 0:2].copy().view("<u2").reshape(-1)
+    c1 = encoded[:, 2:4].copy().view("<u2").reshape(-1)
+    p0, p1 = _from_565(c0), _from_565(c1)
+    return np.stack((p0, p1, (2 * p0 + p1) / 3, (p0 + 2 * p1) / 3), axis=1)
+
+
+def decode_bc1(encoded):
+    indices = (encoded[:, 4:8].copy().view("<u4") >> (2 * np.arange(16, dtype=np.uint32))) & 3
+    return np.take_along_axis(bc1_palette(encoded), indices[:, :, None].astype(np.int64), axis=1)
+
+
+def decode_bc3_alpha(encoded):
+    a0, a1 = encoded[:, 0].astype(np.float32), encoded[:, 1].astype(np.float32)
+    steps = np.arange(1, 7, dtype=np.float32)
+    palette = np.concatenate((a0[:, None], a1[:, None], ((7 - steps) * a0[:, None] + steps * a1[:, None]) / 7), axis=1)
+    packed = np.concatenate((encoded[:, 2:8], np.zeros((len(encoded), 2), dtype=np.uint8)), axis=1).view("<u8")
+    indices = (packed >> (3 * np.arange(16, dtype=np.uint64))) & 7
+    return np.take_along_axis(palette, indices.astype(np.int64), axis=1)
+
+
+def test_target_size():
+    settings = TextureSettings(2048, True, None)
+    assert target_size(8192, 4096, settings) == (2048, 1024)
+    assert target_size(1000, 600, settings) == (1024, 512)
+    assert target_size(1000, 600, TextureSettings(2048, False, None)) == (1000, 600)
+    assert target_size(3000, 1000, TextureSettings(2048, False, None)) == (2048, 683)
+    # DDS is always power-of-two
+    assert target_size(1000, 600, TextureSettings(2048, False, "dds")) == (1024, 512)
+
+
+def test_encode_bc1():
+    rng = np.random.default_rng(0)
+    blocks = rng.integers(0, 256, (32, 16, 3), dtype=np.uint8)
+    # A flat block, one of two colours and a gradient along the diagonal are exact up to the precision of 565 colours
+    blocks[0] = [200, 100, 50]
+    blocks[1, :8], blocks[1, 8:] = [40, 40, 40], [250, 250, 250]
+    blocks[2] = np.repeat(np.arange(0, 256, 85), 4)[:, None]
+
+    encoded = encode_bc1_colours(blocks)
+    decoded = decode_bc1(encoded)
+    assert np.abs(decoded[:3] - blocks[:3]).max() <= 8
+
+    # Every pixel takes the nearest colour of its block's palette
+    distances = ((blocks[:, :, None, :].astype(np.float32) - bc1_palette(encoded)[:, None, :, :]) ** 2).sum(axis=3)
+    assert np.allclose(((decoded - blocks) ** 2).sum(axis=2), distances.min(axis=2))
+
+
+def test_encode_bc3_alpha():
+    alpha = np.tile(np.arange(0, 256, 17, dtype=np.uint8)[:16], (3, 1))
+    alpha[1] = 128
+    decoded = decode_bc3_alpha(encode_bc3_alpha(alpha))
+    assert (decoded[1] == 128).all()
+    # The eight levels between the bounds are at most half a step from each value
+    assert np.abs(decoded - alpha).max() <= 255 / 7 / 2 + 1
+
+
+@pytest.mark.parametrize("mode, fourcc, block_bytes", [("RGB", b"DXT1", 8), ("RGBA", b"DXT5", 16)])
+def test_write_dds(tmp_path, mode, fourcc, block_bytes):
+    image = Image.new(mode, (8, 4), (10, 20, 30, 40)[:len(mode)])
+    out_file = write_dds(image, str(tmp_path / "texture.dds"))
+    data = open(out_file, 'rb').read()
+
+    magic, size, flags, height, width, linear_size, depth, mipmaps = struct.unpack("<4s7I", data[:32])
+    assert (magic, size, height, width, mipmaps) == (b"DDS ", 124, 4, 8, 4)
+    assert linear_size == 2 * block_bytes
+    assert data[84:88] == fourcc
+    # The mipmaps are 8x4, 4x2, 2x1 and 1x1, each level is at least one block
+    assert len(data) == 128 + (2 + 1 + 1 + 1) * block_bytes
+
+
+def test_optimize_texture(tmp_path, monkeypatch):
+    texture = tmp_path / "texture.png"
+    Image.new("RGB", (300, 100), (255, 0, 0)).save(texture)
+    cache_dir = str(tmp_path / "cache")
+
+    out_file = optimize_texture(str(texture), TextureSettings(128, True, None), cache_dir)
+    with Image.open(out_file) as image:
+        assert image.size == (128, 32) and image.format == "PNG"
+
+    # Unchanged textures are taken from the cache, other settings are processed again
+    monkeypatch.setattr(Image, "open", None)
+    assert optimize_texture(str(texture), TextureSettings(128, True, None), cache_dir) == out_file
+    with pytest.raises(TypeError):
+        optimize_texture(str(texture), TextureSettings(64, True, None), cache_dir)
+
+
+def test_linked_texture(tmp_path):
+    # A texture given as a link is loaded as it is
+    obj_file = tmp_path / "model.obj"
+    obj_file.write_text("v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n")
+    parser = argparse.ArgumentParser()
+    parser.add_argument('obj_file')
+    parser.add_argument('output')
+    parser.add_argument('title')
+    add_conversion_arguments(parser)
+    texture = "https://example.com/texture.png"
+    args = parser.parse_args([str(obj_file), str(tmp_path / "model.html"), "Model", "--template_file", TEMPLATE_FILE,
+                              "-T", texture, "--optimize_textures", "-z", "5", "--min_camera", "1", "--max_camera", "10"])
+
+    assert obj_to_html(args) == [f"WARNING: Texture {texture} is a link and is not optimized."]
+    assert texture in (tmp_path / "model.html").read_text()
@@ -0,0 +1,68 @@
+import os
+import json
+import argparse
+import pytest
+from obj2html.utils.trace_utils import enable_tracing, disable_tracing, write_trace, span, traced
+from obj2html.utils.cli_utils import add_conversion_arguments
+from obj2html.parser.obj_parser import obj_to_html
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", "default.html")
+
+
+@pytest.fixture
+def tracer():
+    tracer = enable_tracing()
+    yield tracer
+    disable_tracing()
+
+
+def test_conversion_trace(tmp_path, tracer, capsys):
+    obj_file = tmp_path / "model.obj"
+    obj_file.write_text("v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n")
+    parser = argparse.ArgumentParser()
+    parser.add_argument('obj_file')
+    parser.add_argument('output')
+    parser.add_argument('title')
+    add_conversion_arguments(parser)
+    obj_to_html(parser.parse_args([str(obj_file), str(tmp_path / "model.html"), "Model", "-f", "bin", "--template_file", TEMPLATE_FILE]))
+
+    trace_file = tmp_path / "trace.json"
+    write_trace(tracer, str(trace_file))
+    assert f"Wrote the trace to {trace_file}" in capsys.readouterr().out
+    events = json.loads(trace_file.read_text())["traceEvents"]
+
+    # The threads are named and every span is a complete event in microseconds
+    assert any(event["ph"] == "M" and event["name"] == "thread_name" for event in events)
+    spans = {event["name"]: event for event in events if event["ph"] == "X"}
+    assert {"obj_to_html", "template_load", "convert_geometry", "render", "write"} <= set(spans)
+    assert all(event["ts"] >= 0 and event["dur"] >= 0 for event in spans.values())
+    assert spans["write"]["args"]["bytes_written"] == (tmp_path / "model.html").stat().st_size
+
+    # Every stage is nested in the conversion and the stages follow each other
+    outer = spans["obj_to_html"]
+    for name in ("template_load", "convert_geometry", "render", "write"):
+        assert outer["ts"] <= spans[name]["ts"] and spans[name]["ts"] + spans[name]["dur"] <= outer["ts"] + outer["dur"]
+    assert spans["template_load"]["ts"] + spans["template_load"]["dur"] <= spans["render"]["ts"]
+    assert spans["render"]["ts"] + spans["render"]["dur"] <= spans["write"]["ts"]
+
+
+def test_failed_span(tracer):
+    @traced("step")
+    def step():
+        with span("inner", bytes_read=3):
+            raise ValueError("bad")
+
+    with pytest.raises(ValueError):
+        step()
+
+    # The error is recorded on the spans it passed through
+    inner, outer = tracer.events
+    assert inner["args"] == {"bytes_read": 3, "error": "ValueError: bad"}
+    assert outer["name"] == "step" and outer["args"] == {"error": "ValueError: bad"}
+
+
+def test_disabled():
+    disable_tracing()
+    with span("render") as s:
+        assert s.set(bytes_written=1) is s
+    assert disable_tracing() is None
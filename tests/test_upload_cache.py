@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import argparse
+import pytest
+from benchmarks.mock_canvas import MockCanvasServer
+from obj2html.utils.upload_cache import UploadCache, get_cache_file
+from obj2html.utils.cli_utils import add_conversion_arguments
+from obj2html.parser.obj_parser import obj_to_html
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", "default.html")
+
+
+def test_round_trip(tmp_path):
+    cache_file = str(tmp_path / "cache.json")
+    model = tmp_path / "model.obj"
+    model.write_text("v 0 0 0\n")
+
+    cache = UploadCache(cache_file)
+    key = cache.key(str(model), "canvas", None, "models")
+    cache.put(key, "https://canvas/files/1")
+    cache.save()
+
+    # The key is the contents and where they were uploaded to
+    assert UploadCache(cache_file).get(key) == "https://canvas/files/1"
+    assert cache.key(str(model), "canvas", 7, "models") != key
+    model.write_text("v 1 0 0\n")
+    assert cache.key(str(model), "canvas", None, "models") != key
+
+
+def test_expiry(tmp_path):
+    cache_file = tmp_path / "cache.json"
+    now = time.time()
+    cache_file.write_text(json.dumps({"old": {"url": "a", "created": now - 100, "last_used": now - 100},
+                                      "new": {"url": "b", "created": now, "last_used": now}}))
+
+    cache = UploadCache(str(cache_file), max_age=50)
+    assert cache.get("old") is None and cache.get("new") == "b"
+
+    # Expired entries are dropped when the cache is written
+    cache.save()
+    assert set(json.loads(cache_file.read_text())) == {"new"}
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = UploadCache(str(tmp_path / "cache.json"), max_entries=2)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, key)
+        cache.entries[key]["last_used"] = i
+    cache.save()
+    assert set(cache.entries) == {"b", "c"}
+
+
+def test_merge(tmp_path):
+    cache_file = str(tmp_path / "cache.json")
+    UploadCache(cache_file).save()
+    first = UploadCache(cache_file)
+    second = UploadCache(cache_file)
+    first.put("shared", "old")
+    first.put("first", "1")
+    first.save()
+
+    # A process which read the cache earlier keeps the entries written since, its own win
+    second.put("shared", "new")
+    second.put("second", "2")
+    second.save()
+
+    merged = UploadCache(cache_file)
+    assert {key: merged.get(key) for key in ("first", "second", "shared")} == {"first": "1", "second": "2", "shared": "new"}
+
+
+def test_corrupt_cache(tmp_path):
+    cache_file = tmp_path / "cache.json"
+    cache_file.write_text("{not json")
+    assert UploadCache(str(cache_file)).entries == {}
+
+
+def test_saved_after_failed_upload(tmp_path, monkeypatch):
+    obj_file = tmp_path / "model.obj"
+    obj_file.write_text("v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n")
+    parser = argparse.ArgumentParser()
+    parser.add_argument('obj_file')
+    parser.add_argument('output')
+    parser.add_argument('title')
+    add_conversion_arguments(parser)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("upload failed")
+    monkeypatch.setattr("obj2html.parser.obj_parser.autoconvert_files", fail)
+
+    # The chunk uploads finish before the OBJ upload fails and their links are kept
+    with MockCanvasServer() as server:
+        args = parser.parse_args([str(obj_file), str(tmp_path / "model.html"), "Model", "--template_file", TEMPLATE_FILE,
+                                  "-f", "chunks", "--auto_convert", "--access_token", "token", "-p", server.url])
+        with pytest.raises(RuntimeError):
+            obj_to_html(args)
+        assert server.requests == 3
+    assert len(UploadCache(get_cache_file()).entries) == 1
@@ -0,0 +1,88 @@
+import os
+from types import SimpleNamespace
+import pytest
+from obj2html.utils import watch_utils
+from obj2html.utils.watch_utils import DependencyGraph, FileWatcher, job_inputs, watch
+
+
+@pytest.fixture
+def models(tmp_path):
+    # Two models sharing a template, each with its own MTL and texture
+    (tmp_path / "template.html").write_text("{{ title }}")
+    all_args = []
+    for name in ("a", "b"):
+        (tmp_path / f"{name}.obj").write_text("v 0 0 0\n")
+        (tmp_path / f"{name}.png").write_bytes(b"png")
+        (tmp_path / f"{name}.mtl").write_text(f"newmtl {name}\nmap_Kd {name}.png\n")
+        all_args.append(SimpleNamespace(obj_file=str(tmp_path / f"{name}.obj"), texture=None, mtl_file=str(tmp_path / f"{name}.mtl"),
+                                        annotations=None, template_file=str(tmp_path / "template.html"),
+                                        output=str(tmp_path / f"{name}.html")))
+    return all_args
+
+
+def test_job_inputs(tmp_path, models):
+    assert sorted(job_inputs(models[0])) == sorted(str(tmp_path / name) for name in ("a.obj", "a.mtl", "a.png", "template.html"))
+
+
+def test_dependency_graph(tmp_path, models):
+    graph = DependencyGraph()
+    for args in models:
+        graph.add(args)
+
+    # A texture or MTL change only affects the pages using it, the template affects every page
+    a, b = str(tmp_path / "a.html"), str(tmp_path / "b.html")
+    assert graph.affected([str(tmp_path / "a.png")]) == [a]
+    assert graph.affected([str(tmp_path / "b.mtl")]) == [b]
+    assert graph.affected([str(tmp_path / "template.html")]) == [a, b]
+
+    # The MTL is read again on refresh, the old texture is no longer watched
+    (tmp_path / "a.mtl").write_text("newmtl a\nmap_Kd b.png\n")
+    graph.add(models[0])
+    assert graph.affected([str(tmp_path / "b.png")]) == [a, b]
+    assert str(tmp_path / "a.png") not in graph.watched()
+
+
+def test_file_watcher(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"png")
+    watcher = FileWatcher()
+    watcher.track([str(path)])
+    assert watcher.poll() == set()
+
+    # Saving the same contents is touched but not changed
+    os.utime(path, ns=(0, 0))
+    assert watcher.poll() == {str(path)} and watcher.changed({str(path)}) == set()
+    path.write_bytes(b"jpeg")
+    assert watcher.poll() == {str(path)} and watcher.changed({str(path)}) == {str(path)}
+
+
+def run_watch(monkeypatch, models, edits):
+    # Each poll first makes the next edit, the outputs passed to each build are returned
+    builds = []
+    monkeypatch.setattr(watch_utils, "build", lambda graph, outputs: builds.append(list(outputs)))
+    edits = iter(edits)
+    monkeypatch.setattr(watch_utils.time, "sleep", lambda seconds: next(edits, lambda: None)())
+    watch(models, debounce=0, max_polls=8)
+    return builds
+
+
+def test_rebuilds_dependents(tmp_path, monkeypatch, models):
+    builds = run_watch(monkeypatch, models, [lambda: (tmp_path / "b.png").write_bytes(b"new texture"),
+                                             lambda: None,
+                                             lambda: (tmp_path / "a.mtl").write_text("newmtl a\nKd 1 0 0\nmap_Kd a.png\n")])
+
+    # Every page is built at the start, then only the page of each changed file
+    assert builds == [[m.output for m in models], [models[1].output], [models[0].output]]
+
+
+def test_burst_rebuilds_once(tmp_path, monkeypatch, models):
+    builds = run_watch(monkeypatch, models, [lambda: (tmp_path / "a.png").write_bytes(b"1"),
+                                             lambda: (tmp_path / "a.png").write_bytes(b"12"),
+                                             lambda: (tmp_path / "a.mtl").write_text("newmtl a\n"),
+                                             lambda: (tmp_path / "a.png").write_bytes(b"123")])
+    assert builds[1:] == [[models[0].output]]
+
+
+def test_unchanged_save(tmp_path, monkeypatch, models):
+    builds = run_watch(monkeypatch, models, [lambda: os.utime(tmp_path / "template.html", ns=(0, 0))])
+    assert len(builds) == 1